@@ -1,4 +1,6 @@
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,7 +31,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'zakcomapp.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'zakcomapp.assets.StaticFilesMiddleware',
+    'zakcomapp.querybudget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -38,11 +43,81 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# SQL queries a single request may run before a warning is logged
+# (raised instead when QUERY_BUDGET_STRICT is True, e.g. in tests)
+QUERY_BUDGET = 30
+QUERY_BUDGETS = {
+    # One visit write also updates the rollups, target progress, follow-up
+    # queue and search index (and a new prospect's index entry), each behind
+    # a savepoint when run inside a transaction
+    'log_visit': 40,
+    # A fixed set of bulk statements per CHUNK_SIZE (1000) rows: about 20 on
+    # Postgres, more on SQLite, which splits bulk inserts to stay under its
+    # bound-parameter limit
+    'import_visits': 60,
+}
+QUERY_BUDGET_STRICT = False
+
+# Recent requests kept per URL name for the performance_stats percentiles
+INSTRUMENTATION_SAMPLE_SIZE = 1000
+
+# Dashboard contexts are cached until a Sale, Visit or SalesTarget write
+# invalidates them (see zakcomapp.dashboard_cache). The file-based caches are
+# shared by every worker on the host, so invalidations reach all of them.
+# They live outside the source tree, in ZAKCOM_CACHE_DIR if set.
+CACHE_DIR = Path(os.environ.get('ZAKCOM_CACHE_DIR') or Path(tempfile.gettempdir()) / 'zakcom-cache')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'dashboards': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'dashboards',
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR / 'auth',
+    },
+}
+DASHBOARD_CACHE = 'dashboards'
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Sessions are read from the 'auth' cache and the logged-in User from
+# process memory, so a logged-in request doesn't query for them (see
+# zakcomapp.auth_cache). Sessions are written through to the database and
+# survive a cache flush. Users, password hash included, never leave the
+# process; only their version counters are shared through 'auth', and
+# saving or deleting a user bumps its counter.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'auth'
+AUTHENTICATION_BACKENDS = ['zakcomapp.auth_cache.CachedModelBackend']
+USER_CACHE = 'auth'
+USER_LOCAL_CACHE = 'default'
+USER_CACHE_TIMEOUT = 300
+
+# admin_dashboard live feed (zakcomapp.live): seconds between checks of the
+# dashboard cache version, between keepalive comments and before a stream
+# ends and the browser reconnects, plus that reconnect delay, which is the
+# polling interval when served over WSGI. Needs a cache shared by every
+# worker (DASHBOARD_CACHE above) to see other workers' writes.
+LIVE_FEED_POLL_INTERVAL = 2
+LIVE_FEED_KEEPALIVE = 15
+LIVE_FEED_MAX_DURATION = 300
+LIVE_FEED_RETRY = 3
+LIVE_FEED_BATCH_SIZE = 20
+
+# Phone numbers without a country code are local to this one, and national
+# numbers have this many digits after the trunk prefix 0 (see
+# zakcomapp.phones, which keys prospects by number)
+PHONE_COUNTRY_CODE = '256'
+PHONE_NATIONAL_LENGTH = 9
+
 ROOT_URLCONF = 'zakcom.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that also records render time for Server-Timing
+        'BACKEND': 'zakcomapp.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -58,6 +133,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'zakcom.wsgi.application'
 
+# Serve the async variants of the dashboard, team performance and feedback
+# views, which run their independent queries concurrently (see
+# zakcomapp.concurrency). Only worth it under zakcom.asgi, and together with
+# CONN_MAX_AGE so the query threads keep their database connections.
+ASYNC_VIEWS = False
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -113,6 +194,21 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
 
+# `python manage.py build_assets` compiles the Tailwind CSS and collects
+# everything into STATIC_ROOT with hashed names and gzip/brotli variants,
+# which StaticFilesMiddleware serves (see zakcomapp.assets). TAILWIND_CLI is
+# the Tailwind v4 command line it runs, e.g. 'npx @tailwindcss/cli@4'.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'zakcomapp.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+TAILWIND_CLI = 'tailwindcss'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -1,24 +1,40 @@
 from django.contrib import admin
-from .models import InternetPackage, Customer, Sale, SalesTarget, Visit, Prospect
+from .models import (
+    CommissionEntry, CommissionRate, CommissionTier, InternetPackage, Customer, FollowUp, Sale, SalesTarget, Territory,
+    Visit, Prospect,
+)
 
 @admin.register(InternetPackage)
 class InternetPackageAdmin(admin.ModelAdmin):
     list_display = ['name', 'speed', 'monthly_price', 'installation_fee', 'is_active']
     list_filter = ['is_active']
 
+@admin.register(Territory)
+class TerritoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_at']
+    search_fields = ['name', 'aliases']
+
 @admin.register(Prospect)
 class ProspectAdmin(admin.ModelAdmin):
-    list_display = ['full_name', 'phone', 'location', 'interest_level', 'added_by', 'created_at']
-    list_filter = ['interest_level', 'added_by']
+    list_display = ['full_name', 'phone', 'location', 'territory', 'interest_level', 'added_by', 'created_at']
+    list_filter = ['interest_level', 'territory', 'added_by']
     search_fields = ['full_name', 'phone', 'location']
 
 @admin.register(Visit)
 class VisitAdmin(admin.ModelAdmin):
-    list_display = ['sales_person', 'location', 'visit_date', 'outcome', 'prospect']
-    list_filter = ['outcome', 'visit_date', 'price_concern', 'coverage_concern', 'has_existing_provider']
+    list_display = ['sales_person', 'location', 'territory', 'visit_date', 'outcome', 'prospect']
+    list_filter = ['outcome', 'territory', 'visit_date', 'price_concern', 'coverage_concern', 'has_existing_provider']
     search_fields = ['location', 'sales_person__username', 'feedback']
     date_hierarchy = 'visit_date'
 
+@admin.register(FollowUp)
+class FollowUpAdmin(admin.ModelAdmin):
+    list_display = ['visit', 'sales_person', 'due_date', 'state', 'snoozes', 'completed_at']
+    list_filter = ['state', 'due_date']
+    search_fields = ['sales_person__username', 'visit__location']
+    date_hierarchy = 'due_date'
+    raw_id_fields = ['visit', 'resolved_by']
+
 @admin.register(Customer)
 class CustomerAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'phone', 'email', 'created_at']
@@ -31,11 +47,36 @@ class SaleAdmin(admin.ModelAdmin):
     search_fields = ['customer__full_name', 'sales_person__username']
     date_hierarchy = 'sale_date'
 
+class CommissionTierInline(admin.TabularInline):
+    model = CommissionTier
+    extra = 0
+
 @admin.register(SalesTarget)
 class SalesTargetAdmin(admin.ModelAdmin):
+    inlines = [CommissionTierInline]
     list_display = ['sales_person', 'month', 'target_amount', 'target_count', 'target_visits',
                     'achieved_amount', 'achieved_count', 'achieved_visits']
     list_filter = ['month']
+    # Maintained from the sales and visits (see targets.py)
+    readonly_fields = ['achieved_amount', 'achieved_count', 'achieved_visits']
+
+@admin.register(CommissionRate)
+class CommissionRateAdmin(admin.ModelAdmin):
+    list_display = ['package', 'valid_from', 'rate', 'long_contract_months', 'long_contract_rate']
+    list_filter = ['package']
+
+@admin.register(CommissionTier)
+class CommissionTierAdmin(admin.ModelAdmin):
+    list_display = ['target', 'attainment', 'multiplier']
+    raw_id_fields = ['target']
+
+@admin.register(CommissionEntry)
+class CommissionEntryAdmin(admin.ModelAdmin):
+    list_display = ['month', 'sales_person', 'sale', 'kind', 'base', 'rate', 'multiplier', 'amount']
+    list_filter = ['month', 'kind']
+    search_fields = ['sales_person__username']
+    # Written by run_commissions (see commissions.py)
+    readonly_fields = ['month', 'sales_person', 'sale', 'kind', 'base', 'rate', 'multiplier', 'amount', 'computed_at']
 
 
 # ============================================
@@ -0,0 +1,178 @@
+"""Set-based aggregates shared by the dashboards.
+
+Everything in here reads the daily rollup tables (see rollups.py) rather
+than the raw Sale and Visit rows, and runs a fixed number of queries
+regardless of team size, so page cost depends on the days in range instead
+of on total history.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import (
+    Case, DecimalField, F, FloatField, IntegerField, OuterRef, Q, Subquery,
+    Sum, Value, When, Window,
+)
+from django.db.models.functions import Coalesce, Rank, Round
+
+from . import trends
+from .models import DailySalesRollup, DailyVisitRollup
+
+COUNT_FIELD = IntegerField()
+REVENUE_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def date_filters(field, start=None, end=None):
+    """``filter()`` kwargs keeping ``field`` within [start, end], either end open if None"""
+    filters = {}
+    if start:
+        filters[f'{field}__gte'] = start
+    if end:
+        filters[f'{field}__lte'] = end
+    return filters
+
+
+def total(field, output_field, **filters):
+    """SUM(field) with empty sets reported as 0 rather than NULL"""
+    return Coalesce(Sum(field, **filters), Value(0), output_field=output_field)
+
+
+def _rollup_subquery(rollup_model, field, output_field, start=None, end=None):
+    """Correlated SUM of a rollup measure for the outer user"""
+    rows = rollup_model.objects.filter(
+        sales_person=OuterRef('pk'), **date_filters('date', start, end)
+    ).order_by().values('sales_person').annotate(total=Sum(field)).values('total')
+    return Coalesce(Subquery(rows, output_field=output_field), Value(0), output_field=output_field)
+
+
+def conversion_rate(sales, visits):
+    """Expression for sales/visits as a percentage rounded to one decimal"""
+    return Case(
+        When(**{f'{visits}__gt': 0}, then=Round(F(sales) * 100.0 / F(visits), 1)),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def annotate_salesperson_stats(users, start=None, end=None, sales='sales_count',
+                               revenue='revenue', visits='visits_count',
+                               conversion='conversion_rate'):
+    """
+    Annotate ``users`` with sales count, revenue, visits count and conversion
+    rate for days within [start, end]. The annotation names can be changed so
+    several periods fit on the same queryset.
+
+    Subqueries are used instead of joins so sales and visits don't fan out
+    against each other.
+    """
+    return users.annotate(**{
+        sales: _rollup_subquery(DailySalesRollup, 'sales_count', COUNT_FIELD, start, end),
+        revenue: _rollup_subquery(DailySalesRollup, 'revenue', REVENUE_FIELD, start, end),
+        visits: _rollup_subquery(DailyVisitRollup, 'visits_count', COUNT_FIELD, start, end),
+    }).annotate(**{
+        conversion: conversion_rate(sales, visits),
+    })
+
+
+def top_performers(start, end=None, limit=5):
+    """
+    Active sales people with activity in the period, ranked by revenue, then
+    visits, then conversion rate. Ranking and the cut happen in the database.
+    """
+    users = User.objects.filter(is_staff=False, is_active=True)
+    return annotate_salesperson_stats(users, start, end).filter(
+        Q(sales_count__gt=0) | Q(visits_count__gt=0)
+    ).order_by('-revenue', '-visits_count', '-conversion_rate', 'pk')[:limit]
+
+
+def team_stats(start, end=None):
+    """
+    Every active sales person with all-time figures (up to ``end``) and
+    figures for days within [start, end], ranked by period revenue, then
+    visits, then conversion rate. ``rank`` and ``total_rank`` are computed
+    in the same statement with ``RANK() OVER``, so ties share a place.
+    """
+    users = User.objects.filter(is_staff=False, is_active=True)
+    users = annotate_salesperson_stats(
+        users, end=end, sales='total_sales', revenue='total_revenue', visits='total_visits',
+        conversion='total_conversion_rate',
+    )
+    users = annotate_salesperson_stats(
+        users, start, end, sales='period_sales', revenue='period_revenue', visits='period_visits',
+    )
+    return users.annotate(
+        rank=Window(Rank(), order_by=[
+            F('period_revenue').desc(), F('period_visits').desc(), F('conversion_rate').desc(),
+        ]),
+        total_rank=Window(Rank(), order_by=[
+            F('total_revenue').desc(), F('total_visits').desc(), F('total_conversion_rate').desc(),
+        ]),
+    ).order_by('rank', 'pk')
+
+
+def sale_totals(month_start, sales_person=None):
+    """All-time and month-to-date sale count and revenue in one query"""
+    rollups = DailySalesRollup.objects.all()
+    if sales_person is not None:
+        rollups = rollups.filter(sales_person=sales_person)
+    in_month = Q(date__gte=month_start)
+    return rollups.aggregate(
+        total_sales=total('sales_count', COUNT_FIELD),
+        monthly_sales=total('sales_count', COUNT_FIELD, filter=in_month),
+        total_revenue=total('revenue', REVENUE_FIELD),
+        monthly_revenue=total('revenue', REVENUE_FIELD, filter=in_month),
+    )
+
+
+def visit_totals(month_start, sales_person=None):
+    """All-time and month-to-date visit count in one query"""
+    rollups = DailyVisitRollup.objects.all()
+    if sales_person is not None:
+        rollups = rollups.filter(sales_person=sales_person)
+    return rollups.aggregate(
+        total_visits=total('visits_count', COUNT_FIELD),
+        monthly_visits=total('visits_count', COUNT_FIELD, filter=Q(date__gte=month_start)),
+    )
+
+
+def objection_counts(start, end=None):
+    """Price, coverage and existing-provider objection counts in one query"""
+    return DailyVisitRollup.objects.filter(**date_filters('date', start, end)).aggregate(
+        price_concern=total('price_concerns', COUNT_FIELD),
+        coverage_concern=total('coverage_concerns', COUNT_FIELD),
+        has_existing_provider=total('existing_providers', COUNT_FIELD),
+    )
+
+
+def status_breakdown():
+    """All-time sale count per status"""
+    return DailySalesRollup.objects.values('status').annotate(
+        count=Sum('sales_count'),
+    ).order_by('status')
+
+
+def package_stats():
+    """All-time sale count and revenue per package, busiest first"""
+    return DailySalesRollup.objects.values('package__name').annotate(
+        count=Sum('sales_count'),
+        revenue=Sum('revenue'),
+    ).order_by('-count')
+
+
+def outcome_breakdown(start, end=None):
+    """Visit count per outcome for days within [start, end]"""
+    return DailyVisitRollup.objects.filter(**date_filters('date', start, end)).values('outcome').annotate(
+        count=Sum('visits_count'),
+    ).order_by('outcome')
+
+
+def daily_activity(start, days):
+    """Sales and visits per day for ``days`` days from ``start``, gaps included"""
+    end = start + timedelta(days=days - 1)
+    sales = trends.trend('sales', 'day', start, end)
+    visits = trends.trend('visits', 'day', start, end)
+    return [
+        {'date': date, 'sales': sales_count, 'visits': visits_count}
+        for date, sales_count, visits_count in zip(
+            sales['buckets'], sales['series'][0]['values'], visits['series'][0]['values'],
+        )
+    ]
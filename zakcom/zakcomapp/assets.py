@@ -0,0 +1,238 @@
+"""Self-hosted static assets: vendored bundles, prebuilt Tailwind CSS,
+hashed filenames and precompressed variants.
+
+The pages used to pull the Tailwind browser compiler, Chart.js and Font
+Awesome from CDNs. Instead:
+
+* ``VENDOR`` pins the bundles, committed under ``static/vendor``, which
+  ``fetch`` downloads again with ``refresh``;
+* ``build_css`` runs the Tailwind v4 CLI over the templates into
+  ``static/css/app.css`` (also committed), so no CSS is compiled in the
+  browser;
+* ``CompressedManifestStaticFilesStorage`` makes ``collectstatic`` write
+  content-hashed copies (``app.3f2a9c81d0e4.css``) and a gzip, plus a brotli
+  when the ``brotli`` package is installed, next to each text file;
+* ``StaticFilesMiddleware`` serves ``STATIC_ROOT`` with the best variant the
+  browser accepts and caches hashed names for a year.
+
+The ``build_assets`` command runs the whole pipeline. Rebuild and commit
+``static/css/app.css`` whenever the templates' classes change.
+"""
+import gzip
+import mimetypes
+import os
+import shlex
+import subprocess
+import urllib.request
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.4.0'
+VENDOR = {
+    'vendor/chart.umd.js': 'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js',
+    'vendor/fontawesome/css/all.min.css': f'{FONT_AWESOME}/css/all.min.css',
+    **{
+        f'vendor/fontawesome/webfonts/{font}.{ext}': f'{FONT_AWESOME}/webfonts/{font}.{ext}'
+        for font in ['fa-brands-400', 'fa-regular-400', 'fa-solid-900', 'fa-v4compatibility']
+        for ext in ['woff2', 'ttf']
+    },
+}
+
+TAILWIND_INPUT = 'tailwind/input.css'
+TAILWIND_OUTPUT = 'static/css/app.css'
+
+# Worth compressing: text formats, and fonts that aren't compressed already
+COMPRESSIBLE = {'.css', '.js', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ttf', '.eot', '.otf'}
+# Smaller files don't gain enough to pay for the extra lookup
+MIN_COMPRESS_SIZE = 512
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def fetch(refresh=False):
+    """
+    Download the ``VENDOR`` bundles into the first ``STATICFILES_DIRS``
+    directory, skipping those already there unless ``refresh``. Returns
+    the names downloaded.
+    """
+    root = settings.STATICFILES_DIRS[0]
+    fetched = []
+    for name, url in VENDOR.items():
+        path = os.path.join(root, name)
+        if os.path.exists(path) and not refresh:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            content = response.read()
+        with open(path, 'wb') as f:
+            f.write(content)
+        fetched.append(name)
+    return fetched
+
+
+def build_css(cli=None):
+    """
+    Compile ``TAILWIND_OUTPUT`` with only the utility classes the templates
+    use, minified. ``cli`` is the Tailwind v4 command line (``TAILWIND_CLI``
+    by default), e.g. the standalone executable, which ``pip install
+    tailwindcss-bin`` provides, or ``npx @tailwindcss/cli@4``.
+    Raises OSError if it can't be run and CalledProcessError if it fails.
+    """
+    cli = cli or getattr(settings, 'TAILWIND_CLI', 'tailwindcss')
+    subprocess.run(
+        [*shlex.split(cli), '-i', TAILWIND_INPUT, '-o', TAILWIND_OUTPUT, '--minify'],
+        cwd=settings.BASE_DIR, check=True, capture_output=True, text=True,
+    )
+    return os.path.join(settings.BASE_DIR, TAILWIND_OUTPUT)
+
+
+def compress(path):
+    """
+    Write ``path.gz`` (and ``path.br`` with brotli) when worthwhile, and
+    return the variants written.
+    """
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE:
+        return []
+    with open(path, 'rb') as f:
+        content = f.read()
+    if len(content) < MIN_COMPRESS_SIZE:
+        return []
+
+    compressors = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    written = []
+    for suffix, compressor in compressors:
+        compressed = compressor(content)
+        # Not worth a Content-Encoding for a few percent
+        if len(compressed) < len(content) * 0.95:
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            written.append(path + suffix)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ``ManifestStaticFilesStorage`` that also precompresses every collected
+    file. Names missing from the manifest, e.g. before the first
+    ``collectstatic`` or in tests, are linked unhashed instead of failing.
+    """
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        collected = set(paths)
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name:
+                collected.add(hashed_name)
+            yield name, hashed_name, processed
+        if not dry_run:
+            for name in sorted(collected):
+                compress(self.path(name))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+
+async def _read_blocks(file, size):
+    read = sync_to_async(file.read, thread_sensitive=False)
+    while True:
+        block = await read(size)
+        if not block:
+            return
+        yield block
+
+
+class StaticFilesMiddleware:
+    """
+    Serve ``STATIC_ROOT`` before the rest of the stack, picking the brotli or
+    gzip variant when the browser accepts it. Hashed names from the manifest
+    are cached for a year; anything else is revalidated. Requests for files
+    that aren't collected fall through to the URLconf.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = urlparse(settings.STATIC_URL).path
+        self._hashed = None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.is_static(request):
+            response = self.serve(request, request.path[len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_static(request):
+            # The stat() and open() calls block, so off the event loop
+            response = await sync_to_async(self.serve, thread_sensitive=False)(request, request.path[len(self.prefix):])
+            if response is not None:
+                if isinstance(response, FileResponse):
+                    # Or Django reads the whole file into memory to serve it asynchronously
+                    response.streaming_content = _read_blocks(response.file_to_stream, response.block_size)
+                return response
+        return await self.get_response(request)
+
+    def is_static(self, request):
+        return request.method in ('GET', 'HEAD') and request.path.startswith(self.prefix) and bool(settings.STATIC_ROOT)
+
+    def hashed(self):
+        if self._hashed is None:
+            self._hashed = set(getattr(staticfiles_storage, 'hashed_files', {}).values())
+        return self._hashed
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        if not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime):
+            return HttpResponseNotModified()
+
+        accepted = {value.split(';')[0].strip() for value in request.headers.get('Accept-Encoding', '').split(',')}
+        encoding, served = None, path
+        for candidate, suffix in ENCODINGS:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding, served = candidate, path + suffix
+                break
+
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response = FileResponse(open(served, 'rb'), content_type=content_type)
+        # FileResponse names the variant (app.css.gz) as an inline download
+        del response['Content-Disposition']
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Last-Modified'] = http_date(stat.st_mtime)
+        response.headers['Cache-Control'] = IMMUTABLE if name in self.hashed() else 'public, max-age=0, must-revalidate'
+        return response
@@ -0,0 +1,86 @@
+"""Cached authenticated user.
+
+Every logged-in request loads its session and then its ``User``. Sessions
+use Django's ``cached_db`` engine, which reads from the cache and writes
+through to the database, so they survive a cache flush. ``CachedModelBackend``
+does the same for the user: ``get_user`` is served from the cache and only
+falls back to the database on a miss.
+
+A ``User`` carries its password hash, so it is only ever kept in this
+process's memory (the ``USER_LOCAL_CACHE``, ``default`` if unset), never in
+a cache shared through disk or the network. What the workers share, in the
+cache named by ``USER_CACHE``, is a version counter per user, which is
+part of the key the user is stored under, as with the dashboard contexts
+(see dashboard_cache.py).
+
+A user's counter is bumped whenever its row is saved or deleted (see
+signals.py), which covers edit_user, edit_profile, delete_user, password
+changes and the ``last_login`` update on login, so every worker reloads it.
+Writes that skip signals, such as ``QuerySet.update()`` on users, must call
+``invalidate`` themselves.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+
+def cache():
+    return caches[getattr(settings, 'USER_CACHE', 'default')]
+
+
+def local():
+    return caches[getattr(settings, 'USER_LOCAL_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def _version_key(user_id):
+    return f'auth:version:{user_id}'
+
+
+def version(user_id):
+    """Current counter for the user with ``user_id``"""
+    key = _version_key(user_id)
+    value = cache().get(key)
+    if value is None:
+        # From the clock, so an evicted counter can't return to a version
+        # some worker still holds an old user under
+        cache().add(key, time.time_ns(), timeout=None)
+        value = cache().get(key)
+    return value
+
+
+def bump(user_id):
+    key = _version_key(user_id)
+    try:
+        cache().incr(key)
+    except ValueError:
+        cache().set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(user_id):
+    """
+    Bump the user's counter now and again when the surrounding transaction
+    commits, so a request that reloaded the old row in between can't keep it.
+    """
+    bump(user_id)
+    transaction.on_commit(lambda: bump(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` whose per-request user lookup is cached"""
+
+    def get_user(self, user_id):
+        key = f'auth:user:{user_id}:{version(user_id)}'
+        user = local().get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                local().set(key, user, timeout=_timeout())
+            return user
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,149 @@
+"""Monthly commission runs into the CommissionEntry ledger.
+
+A sale earns commission in the month of its sale date once it is installed
+or active: its total value times the package's ``CommissionRate`` in force
+on the sale date (the long-contract rate for long enough contracts), times
+the rep's tier multiplier for the month. The multiplier comes from how much
+of their ``SalesTarget`` they achieved and the ``CommissionTier`` rows for
+it; reps without a target or tiers get 1. A sale cancelled after its
+commission was earned is clawed back, once, in the month of its
+``cancelled_at``, which later edits to the sale don't move.
+
+``run`` replaces a month's ledger lines, so it can be repeated whenever the
+sales or the tables change. Rates and amounts are computed by the database
+for every sale at once; Python only resolves one multiplier per rep.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (
+    Case, DecimalField, Exists, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from .models import CommissionEntry, CommissionRate, CommissionTier, Sale, SalesTarget
+from .targets import next_month
+
+PAYABLE_STATUSES = ['installed', 'active']
+
+RATE_FIELD = DecimalField(max_digits=5, decimal_places=2)
+MULTIPLIER_FIELD = DecimalField(max_digits=4, decimal_places=2)
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def multipliers(month):
+    """
+    ``{sales_person_id: multiplier}`` for the reps with a target in
+    ``month``: the multiplier of the highest tier their attainment reached
+    (1 below the lowest), from the target's own tiers or else the shared ones.
+    """
+    tiers = {}
+    for target_id, attainment, multiplier in CommissionTier.objects.filter(
+        Q(target__isnull=True) | Q(target__month=month),
+    ).order_by('attainment').values_list('target', 'attainment', 'multiplier'):
+        tiers.setdefault(target_id, []).append((attainment, multiplier))
+
+    result = {}
+    for target_id, sales_person_id, target_amount, achieved_amount in SalesTarget.objects.filter(
+        month=month,
+    ).values_list('pk', 'sales_person', 'target_amount', 'achieved_amount'):
+        attainment = achieved_amount * 100 / target_amount if target_amount else Decimal(0)
+        reached = [multiplier for threshold, multiplier in tiers.get(target_id, tiers.get(None, []))
+                   if threshold <= attainment]
+        result[sales_person_id] = reached[-1] if reached else Decimal(1)
+    return result
+
+
+def _rate():
+    """The commission rate (percent) in force for the outer sale, 0 if none"""
+    rates = CommissionRate.objects.filter(
+        package=OuterRef('package'), valid_from__lte=OuterRef('sale_date'),
+    ).order_by('-valid_from').annotate(effective=Case(
+        When(long_contract_rate__isnull=False, long_contract_months__lte=OuterRef('contract_duration'),
+             then=F('long_contract_rate')),
+        default=F('rate'),
+    )).values('effective')[:1]
+    return Coalesce(Subquery(rates, output_field=RATE_FIELD), Value(Decimal(0)), output_field=RATE_FIELD)
+
+
+def earned(month, by_rep=None):
+    """
+    The sales earning commission in ``month``, annotated with rate,
+    multiplier and amount. A sale that earned in an earlier run of the month
+    and was cancelled after it keeps earning there, so the commission
+    already paid stays on record and is clawed back in a later month.
+    """
+    by_rep = multipliers(month) if by_rep is None else by_rep
+    multiplier = Case(
+        *[When(sales_person=pk, then=Value(value)) for pk, value in by_rep.items() if value != 1],
+        default=Value(Decimal(1)),
+        output_field=MULTIPLIER_FIELD,
+    )
+    paid = CommissionEntry.objects.filter(sale=OuterRef('pk'), month=month, kind=CommissionEntry.EARNED)
+    return Sale.objects.alias(paid=Exists(paid)).filter(
+        Q(status__in=PAYABLE_STATUSES) | Q(status='cancelled', cancelled_at__date__gte=next_month(month), paid=True),
+        sale_date__gte=month, sale_date__lt=next_month(month),
+    ).annotate(rate=_rate(), multiplier=multiplier).filter(rate__gt=0).annotate(
+        amount=ExpressionWrapper(F('total_value') * F('rate') * F('multiplier') / 100, output_field=AMOUNT_FIELD),
+    )
+
+
+def clawbacks(month):
+    """
+    Commission to take back in ``month``, per sale: sales cancelled by the
+    end of the month whose commission was earned in an earlier month and
+    hasn't been clawed back in any other month.
+    """
+    clawed_back = CommissionEntry.objects.filter(
+        kind=CommissionEntry.CLAWBACK, sale=OuterRef('sale'),
+    ).exclude(month=month)
+    return CommissionEntry.objects.filter(
+        kind=CommissionEntry.EARNED, month__lt=month,
+        sale__status='cancelled', sale__cancelled_at__date__lt=next_month(month),
+    ).filter(~Exists(clawed_back)).values('sale', 'sales_person').annotate(
+        base=Sum('base'), rate=Max('rate'), multiplier=Max('multiplier'), amount=-Sum('amount'),
+    ).order_by('sale')
+
+
+@transaction.atomic
+def run(month):
+    """
+    Recompute the ledger for the month starting on ``month``. Returns
+    ``{'earned': lines, 'clawbacks': lines, 'total': amount}``.
+    """
+    # Read before the old lines go, since they decide which cancelled sales still count
+    entries = [
+        CommissionEntry(month=month, kind=CommissionEntry.EARNED, sales_person_id=sales_person_id, sale_id=sale_id,
+                        base=base, rate=rate, multiplier=multiplier, amount=amount)
+        for sale_id, sales_person_id, base, rate, multiplier, amount in earned(month).values_list(
+            'pk', 'sales_person', 'total_value', 'rate', 'multiplier', 'amount',
+        ).order_by('pk')
+    ]
+    CommissionEntry.objects.filter(month=month).delete()
+
+    earned_lines = len(entries)
+    entries += [
+        CommissionEntry(month=month, kind=CommissionEntry.CLAWBACK, sales_person_id=row['sales_person'],
+                        sale_id=row['sale'], base=row['base'], rate=row['rate'], multiplier=row['multiplier'],
+                        amount=row['amount'])
+        for row in clawbacks(month)
+    ]
+    CommissionEntry.objects.bulk_create(entries, batch_size=1000)
+    return {
+        'earned': earned_lines,
+        'clawbacks': len(entries) - earned_lines,
+        'total': sum((entry.amount for entry in entries), Decimal(0)),
+    }
+
+
+def payouts(month):
+    """Earned, clawed back and net commission per rep for ``month``, from the ledger"""
+    return CommissionEntry.objects.filter(month=month).values(
+        'sales_person', 'sales_person__username',
+    ).annotate(
+        earned=Coalesce(Sum('amount', filter=Q(kind=CommissionEntry.EARNED)), Value(Decimal(0)),
+                        output_field=AMOUNT_FIELD),
+        clawed_back=Coalesce(Sum('amount', filter=Q(kind=CommissionEntry.CLAWBACK)), Value(Decimal(0)),
+                             output_field=AMOUNT_FIELD),
+        net=Sum('amount'),
+    ).order_by('-net', 'sales_person__username')
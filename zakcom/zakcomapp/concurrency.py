@@ -0,0 +1,50 @@
+"""Running a view's independent queries concurrently under ASGI.
+
+The dashboards describe their queries as a ``{name: callable}`` dict. The
+sync views hand it to ``run``, which calls them one after another; the async
+views hand it to ``gather``, which overlaps them.
+
+Django's own async ORM methods (``acount``, ``aaggregate``, ...) can't do
+that: they all go through ``sync_to_async`` on the one thread-sensitive
+executor, so ``asyncio.gather`` over them still sends the queries one at a
+time. ``gather`` instead runs every call on a pool thread of its own, which
+means a database connection of its own. Set ``CONN_MAX_AGE`` when serving
+async views, or each of those threads reconnects for every call.
+
+Other connections can't see uncommitted writes, so inside a transaction
+(``ATOMIC_REQUESTS``, tests) ``gather`` falls back to running the calls in
+turn on the transaction's connection.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+
+
+def run(calls):
+    """``{name: call()}``, one call after another"""
+    return {name: call() for name, call in calls.items()}
+
+
+def _on_own_connection(call):
+    # What the request_started/request_finished signals do for a request:
+    # drop a connection that is broken or past CONN_MAX_AGE
+    close_old_connections()
+    try:
+        return call()
+    finally:
+        close_old_connections()
+
+
+def _in_transaction():
+    return connection.in_atomic_block
+
+
+async def gather(calls):
+    """``{name: call()}``, with the calls running concurrently"""
+    if await sync_to_async(_in_transaction)():
+        return await sync_to_async(run)(calls)
+    results = await asyncio.gather(*(
+        sync_to_async(_on_own_connection, thread_sensitive=False)(call) for call in calls.values()
+    ))
+    return dict(zip(calls, results))
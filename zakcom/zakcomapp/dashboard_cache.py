@@ -0,0 +1,131 @@
+"""Versioned cache for the computed dashboard contexts.
+
+Contexts are stored under keys that embed a version counter, so nothing is
+ever deleted to invalidate them: writing a ``Sale``, ``Visit`` or
+``SalesTarget`` bumps the counter(s) it affects and the next request misses
+and recomputes. There are two kinds of counter:
+
+* one per salesperson, for that rep's ``sales_dashboard``;
+* one global counter, for the team-wide ``admin_dashboard``.
+
+Counters and contexts live in the cache named by ``DASHBOARD_CACHE`` (the
+``default`` cache if unset). The local-memory backend is enough for a single
+process; use the file-based backend when several workers must see each
+other's invalidations.
+"""
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+GLOBAL = 'all'
+
+
+def cache():
+    return caches[getattr(settings, 'DASHBOARD_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def _version_key(scope):
+    return f'dashboard:version:{scope}'
+
+
+def version(scope):
+    """Current counter for ``scope`` (a user id or ``GLOBAL``)"""
+    key = _version_key(scope)
+    value = cache().get(key)
+    if value is None:
+        # Start from the clock rather than 1, so a counter that was evicted
+        # can't come back at a value that old contexts were stored under.
+        cache().add(key, time.time_ns(), timeout=None)
+        value = cache().get(key)
+    return value
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache().incr(key)
+        except ValueError:
+            cache().set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(*scopes):
+    """
+    Bump ``scopes`` now and again when the surrounding transaction commits.
+
+    The second bump drops any context another request computed from the
+    pre-commit data in between.
+    """
+    bump(*scopes)
+    transaction.on_commit(lambda: bump(*scopes))
+
+
+class Stats:
+    """Process-local hit/miss counts per dashboard"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, name, hit):
+        with self._lock:
+            self._counts[name, 'hits' if hit else 'misses'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+
+    def summary(self):
+        with self._lock:
+            counts = dict(self._counts)
+        report = {}
+        for name in sorted({name for name, _ in counts}):
+            hits, misses = counts.get((name, 'hits'), 0), counts.get((name, 'misses'), 0)
+            report[name] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+        return report
+
+
+stats = Stats()
+
+
+def get_or_build(name, scope, day, build):
+    """
+    The cached context of dashboard ``name`` for ``scope`` on ``day``, or
+    ``build()`` stored for next time. ``build`` must return a picklable dict,
+    so evaluate querysets to lists first.
+    """
+    key = _context_key(name, scope, day, version(scope))
+    context = cache().get(key)
+    stats.record(name, context is not None)
+    if context is None:
+        context = build()
+        cache().set(key, context, timeout=_timeout())
+    return context
+
+
+async def aget_or_build(name, scope, day, build):
+    """``get_or_build`` for async views, where ``build`` is a coroutine function"""
+    key = _context_key(name, scope, day, await sync_to_async(version)(scope))
+    context = await cache().aget(key)
+    stats.record(name, context is not None)
+    if context is None:
+        context = await build()
+        await cache().aset(key, context, timeout=_timeout())
+    return context
+
+
+def _context_key(name, scope, day, current):
+    return f'dashboard:{name}:{scope}:{day.replace(day=1).isoformat()}:{day.isoformat()}:{current}'
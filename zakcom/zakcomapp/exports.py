@@ -0,0 +1,257 @@
+"""Streaming CSV and XLSX extracts of sales, visits and the commission ledger.
+
+Rows are read with ``values_list(...).iterator(chunk_size)``: the joined
+customer, package, prospect and salesperson columns come from the same
+query, no model instances are built, and on PostgreSQL a server-side cursor
+keeps memory flat however many rows there are. Both writers emit bytes as
+they go, so the output can be handed straight to ``StreamingHttpResponse``
+or written to a file.
+
+XLSX is produced with the standard library (a zip of SpreadsheetML parts
+written through a non-seekable stream) to avoid loading a whole workbook.
+"""
+import csv
+import datetime
+import decimal
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+
+SALE_COLUMNS = [
+    ('Sale ID', 'id'),
+    ('Sale Date', 'sale_date'),
+    ('Status', 'status'),
+    ('Customer', 'customer__full_name'),
+    ('Customer Phone', 'customer__phone'),
+    ('Customer ID Number', 'customer__id_number'),
+    ('Package', 'package__name'),
+    ('Speed', 'package__speed'),
+    ('Monthly Price', 'package__monthly_price'),
+    ('Installation Fee', 'package__installation_fee'),
+    ('Contract Months', 'contract_duration'),
+    ('Total Value', 'total_value'),
+    ('Salesperson', 'sales_person__username'),
+    ('Salesperson First Name', 'sales_person__first_name'),
+    ('Salesperson Last Name', 'sales_person__last_name'),
+    ('Installation Date', 'installation_date'),
+    ('Notes', 'notes'),
+    ('Created At', 'created_at'),
+]
+
+VISIT_COLUMNS = [
+    ('Visit ID', 'id'),
+    ('Visit Date', 'visit_date'),
+    ('Visit Time', 'visit_time'),
+    ('Salesperson', 'sales_person__username'),
+    ('Salesperson First Name', 'sales_person__first_name'),
+    ('Salesperson Last Name', 'sales_person__last_name'),
+    ('Location', 'location'),
+    ('Outcome', 'outcome'),
+    ('Feedback', 'feedback'),
+    ('Price Concern', 'price_concern'),
+    ('Coverage Concern', 'coverage_concern'),
+    ('Has Existing Provider', 'has_existing_provider'),
+    ('Existing Provider', 'existing_provider_name'),
+    ('Follow-up Date', 'follow_up_date'),
+    ('Follow-up Notes', 'follow_up_notes'),
+    ('Prospect', 'prospect__full_name'),
+    ('Prospect Phone', 'prospect__phone'),
+    ('Prospect Interest', 'prospect__interest_level'),
+]
+
+COMMISSION_COLUMNS = [
+    ('Month', 'month'),
+    ('Salesperson', 'sales_person__username'),
+    ('Salesperson First Name', 'sales_person__first_name'),
+    ('Salesperson Last Name', 'sales_person__last_name'),
+    ('Sale ID', 'sale_id'),
+    ('Sale Date', 'sale__sale_date'),
+    ('Sale Status', 'sale__status'),
+    ('Package', 'sale__package__name'),
+    ('Contract Months', 'sale__contract_duration'),
+    ('Kind', 'kind'),
+    ('Base', 'base'),
+    ('Rate %', 'rate'),
+    ('Multiplier', 'multiplier'),
+    ('Amount', 'amount'),
+]
+
+FORMATS = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def rows(queryset, columns, chunk_size=CHUNK_SIZE):
+    """Tuples of the ``columns`` values for ``queryset`` in primary key order"""
+    fields = [field for _, field in columns]
+    return queryset.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def stream(fmt, columns, values, sheet_name='Export'):
+    headers = [header for header, _ in columns]
+    if fmt == 'xlsx':
+        return xlsx_stream(headers, values, sheet_name)
+    return csv_stream(headers, values)
+
+
+class _Buffer:
+    """Write-only file object whose contents are collected with ``drain()``"""
+
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._chunks.append(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks, self.size = [], 0
+        return data
+
+
+# Text starting with these is run as a formula when the CSV is opened in a spreadsheet
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def csv_safe(value):
+    """``value`` with a leading quote if spreadsheets would read it as a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(headers, values, flush_size=64 * 1024):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    for row in values:
+        # Names, feedback and locations are typed in by users
+        writer.writerow([csv_safe(value) for value in row])
+        if buffer.size >= flush_size:
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+# ============================================
+# XLSX
+# ============================================
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+
+_SHEET_END = '</sheetData></worksheet>'
+
+# Control characters are not allowed anywhere in XML 1.0
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _cell(ref, value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return f'<c r="{ref}"><v>{value}</v></c>'
+    if isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    # Always an inline string, never a <f> formula, so "=..." shows as typed
+    text = escape(_INVALID_XML.sub('', str(value)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(number, values, letters):
+    cells = ''.join(_cell(f'{letter}{number}', value) for letter, value in zip(letters, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+def xlsx_stream(headers, values, sheet_name='Export', flush_size=64 * 1024):
+    letters = [_column_letter(i) for i in range(len(headers))]
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as book:
+        book.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        book.writestr('_rels/.rels', _ROOT_RELS)
+        book.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name, {'"': '&quot;'})))
+        book.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with book.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(_SHEET_START.encode())
+            sheet.write(_row(1, headers, letters).encode())
+            for number, row in enumerate(values, 2):
+                sheet.write(_row(number, row, letters).encode())
+                if buffer.size >= flush_size:
+                    yield buffer.drain()
+            sheet.write(_SHEET_END.encode())
+    yield buffer.drain()
+
+
+def export_response(queryset, columns, fmt, name):
+    """StreamingHttpResponse of ``queryset`` as a ``name``.csv/.xlsx download"""
+    response = StreamingHttpResponse(
+        stream(fmt, columns, rows(queryset, columns), sheet_name=name.title()),
+        content_type=FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
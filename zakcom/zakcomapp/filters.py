@@ -0,0 +1,50 @@
+"""The row visibility and GET filters shared by the list views and exports."""
+from .models import Sale, Visit
+
+
+def sales_for(user, params):
+    """
+    Sales visible to ``user`` (all of them for staff or ``None``), narrowed by
+    the ``status``, ``date_from`` and ``date_to`` entries of ``params``.
+    """
+    if user is None or user.is_staff:
+        sales = Sale.objects.all()
+    else:
+        sales = Sale.objects.filter(sales_person=user)
+
+    status = params.get('status')
+    if status:
+        sales = sales.filter(status=status)
+
+    date_from = params.get('date_from')
+    if date_from:
+        sales = sales.filter(sale_date__gte=date_from)
+
+    date_to = params.get('date_to')
+    if date_to:
+        sales = sales.filter(sale_date__lte=date_to)
+    return sales
+
+
+def visits_for(user, params):
+    """
+    Visits visible to ``user`` (all of them for staff or ``None``), narrowed
+    by the ``outcome``, ``date_from`` and ``date_to`` entries of ``params``.
+    """
+    if user is None or user.is_staff:
+        visits = Visit.objects.all()
+    else:
+        visits = Visit.objects.filter(sales_person=user)
+
+    outcome = params.get('outcome')
+    if outcome:
+        visits = visits.filter(outcome=outcome)
+
+    date_from = params.get('date_from')
+    if date_from:
+        visits = visits.filter(visit_date__gte=date_from)
+
+    date_to = params.get('date_to')
+    if date_to:
+        visits = visits.filter(visit_date__lte=date_to)
+    return visits
@@ -0,0 +1,208 @@
+"""The follow-up queue.
+
+Every visit with outcome ``follow_up`` and a ``follow_up_date`` has one
+``FollowUp`` row, due on that date. It stays open until the rep marks it
+done, a later visit to the same prospect settles it, or it has been overdue
+for ``EXPIRE_AFTER_DAYS`` and is marked missed by the daily
+``refresh_follow_ups`` job. Snoozing moves the due date.
+
+A rep's queue is the open rows due between ``EXPIRE_AFTER_DAYS`` ago and
+``UPCOMING_DAYS`` ahead: one range read on the (sales_person, state,
+due_date) index, split into overdue, today and upcoming in Python.
+"""
+from datetime import timedelta
+
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from . import dashboard_cache
+from .models import FollowUp, Visit
+
+UPCOMING_DAYS = 7
+EXPIRE_AFTER_DAYS = 30
+SNOOZE_DAYS = [1, 3, 7]
+
+
+def _as_date(value):
+    # Date fields default to timezone.now, so unsaved values may still be datetimes
+    return Visit._meta.get_field('follow_up_date').to_python(value)
+
+
+def wanted(visit):
+    """Whether ``visit`` asks for a follow-up"""
+    return visit.outcome == 'follow_up' and visit.follow_up_date is not None
+
+
+def _settled_by(prospect_field='visit__prospect', date_field='visit__visit_date', pk_field='visit'):
+    """
+    Subquery() of the first visit to the outer row's prospect after the outer
+    visit: the call-back that settles its follow-up, or NULL if none
+    """
+    return Subquery(Visit.objects.filter(
+        prospect=OuterRef(prospect_field),
+    ).filter(
+        Q(visit_date__gt=OuterRef(date_field)) | Q(visit_date=OuterRef(date_field), pk__gt=OuterRef(pk_field)),
+    ).order_by('visit_date', 'pk').values('pk')[:1])
+
+
+def sync(visit, previous=None):
+    """
+    Bring the queue in line with ``visit`` after it is saved (``previous`` is
+    the stored copy from before). Returns the ids of the reps whose queue
+    changed.
+    """
+    changed = set()
+    if not wanted(visit):
+        if previous is not None and wanted(previous):
+            FollowUp.objects.filter(visit=visit).delete()
+            changed.add(previous.sales_person_id)
+    elif (previous is None or not wanted(previous)
+          or (previous.follow_up_date, previous.sales_person_id) != (visit.follow_up_date, visit.sales_person_id)):
+        # New or rescheduled: (re)open it on the date asked for
+        FollowUp.objects.update_or_create(visit=visit, defaults={
+            'sales_person_id': visit.sales_person_id,
+            'due_date': _as_date(visit.follow_up_date),
+            'state': FollowUp.OPEN,
+            'completed_at': None,
+            'resolved_by': None,
+        })
+        changed.add(visit.sales_person_id)
+
+    if visit.prospect_id and (previous is None or previous.prospect_id != visit.prospect_id):
+        changed.update(resolve(visit))
+    return changed
+
+
+def resolve(visit):
+    """
+    Mark open follow-ups from earlier visits to ``visit``'s prospect done,
+    since ``visit`` is the call-back. Returns the ids of their reps.
+    """
+    visit_date = _as_date(visit.visit_date)
+    earlier = FollowUp.objects.filter(
+        Q(visit__visit_date__lt=visit_date) | Q(visit__visit_date=visit_date, visit__pk__lt=visit.pk),
+        visit__prospect_id=visit.prospect_id,
+        state=FollowUp.OPEN,
+    )
+    reps = set(earlier.values_list('sales_person_id', flat=True))
+    if reps:
+        earlier.update(state=FollowUp.DONE, resolved_by=visit, completed_at=timezone.now())
+    return reps
+
+
+def add_many(visits):
+    """
+    Queue follow-ups for many new visits at once, e.g. after ``bulk_create``
+    (which sends no signals), and resolve the earlier ones they settle, as
+    ``resolve`` does for one. Invalidates the dashboards of the reps affected.
+    """
+    queued = [
+        FollowUp(visit=visit, sales_person_id=visit.sales_person_id, due_date=_as_date(visit.follow_up_date))
+        for visit in visits if wanted(visit)
+    ]
+    FollowUp.objects.bulk_create(queued)
+    reps = {follow_up.sales_person_id for follow_up in queued}
+
+    prospects = {visit.prospect_id for visit in visits if visit.prospect_id}
+    if prospects:
+        settled = list(FollowUp.objects.filter(visit__prospect_id__in=prospects, state=FollowUp.OPEN).annotate(
+            settled_by=_settled_by(),
+        ).filter(settled_by__isnull=False).values_list('pk', 'sales_person_id', 'settled_by'))
+        completed_at = timezone.now()
+        FollowUp.objects.bulk_update([
+            FollowUp(pk=pk, state=FollowUp.DONE, resolved_by_id=settled_by, completed_at=completed_at)
+            for pk, _, settled_by in settled
+        ], ['state', 'resolved_by', 'completed_at'])
+        reps.update(sales_person_id for _, sales_person_id, _ in settled)
+
+    if reps:
+        dashboard_cache.invalidate(*reps)
+
+
+def queue(user, today):
+    """
+    ``user``'s open follow-ups in due-date order, as
+    ``{'overdue': [...], 'today': [...], 'upcoming': [...]}``.
+    """
+    rows = FollowUp.objects.filter(
+        sales_person=user,
+        state=FollowUp.OPEN,
+        due_date__gte=today - timedelta(days=EXPIRE_AFTER_DAYS),
+        due_date__lte=today + timedelta(days=UPCOMING_DAYS),
+    ).select_related('visit__prospect').order_by('due_date', 'pk')
+
+    buckets = {'overdue': [], 'today': [], 'upcoming': []}
+    for follow_up in rows:
+        if follow_up.due_date < today:
+            buckets['overdue'].append(follow_up)
+        elif follow_up.due_date == today:
+            buckets['today'].append(follow_up)
+        else:
+            buckets['upcoming'].append(follow_up)
+    return buckets
+
+
+def complete(follow_up):
+    follow_up.state = FollowUp.DONE
+    follow_up.completed_at = timezone.now()
+    follow_up.save(update_fields=['state', 'completed_at', 'updated_at'])
+    dashboard_cache.invalidate(follow_up.sales_person_id)
+
+
+def snooze(follow_up, days, today):
+    """Push ``follow_up`` back to ``days`` after today (or after its due date, if later)"""
+    follow_up.due_date = max(follow_up.due_date, today) + timedelta(days=days)
+    follow_up.snoozes += 1
+    follow_up.save(update_fields=['due_date', 'snoozes', 'updated_at'])
+    dashboard_cache.invalidate(follow_up.sales_person_id)
+
+
+def expire(today):
+    """Mark open follow-ups overdue for more than EXPIRE_AFTER_DAYS missed; returns how many"""
+    stale = FollowUp.objects.filter(state=FollowUp.OPEN, due_date__lt=today - timedelta(days=EXPIRE_AFTER_DAYS))
+    reps = set(stale.values_list('sales_person_id', flat=True))
+    missed = stale.update(state=FollowUp.MISSED)
+    if reps:
+        dashboard_cache.invalidate(*reps)
+    return missed
+
+
+def reconcile(today, chunk_size=1000):
+    """
+    Make the queue match the visits: drop follow-ups whose visit no longer
+    asks for one, and add missing ones (already done when a later visit to
+    the prospect exists, missed when long overdue). Returns ``(added, dropped)``.
+    """
+    stale = FollowUp.objects.filter(~Q(visit__outcome='follow_up') | Q(visit__follow_up_date__isnull=True))
+    reps = set(stale.values_list('sales_person_id', flat=True))
+    dropped, _ = stale.delete()
+
+    missing = Visit.objects.filter(
+        outcome='follow_up', follow_up_date__isnull=False, follow_up__isnull=True,
+    ).annotate(
+        settled_by=_settled_by('prospect', 'visit_date', 'pk'),
+    ).order_by('pk').values_list('pk', 'sales_person_id', 'follow_up_date', 'settled_by')
+
+    expired = today - timedelta(days=EXPIRE_AFTER_DAYS)
+    added, batch = 0, []
+    for pk, sales_person_id, due_date, settled_by in missing.iterator(chunk_size=chunk_size):
+        if settled_by:
+            state = FollowUp.DONE
+        elif due_date < expired:
+            state = FollowUp.MISSED
+        else:
+            state = FollowUp.OPEN
+        batch.append(FollowUp(
+            visit_id=pk, sales_person_id=sales_person_id, due_date=due_date, state=state, resolved_by_id=settled_by,
+        ))
+        reps.add(sales_person_id)
+        if len(batch) == chunk_size:
+            FollowUp.objects.bulk_create(batch)
+            added += len(batch)
+            batch = []
+    FollowUp.objects.bulk_create(batch)
+    added += len(batch)
+
+    if reps:
+        dashboard_cache.invalidate(*reps)
+    return added, dropped
@@ -0,0 +1,263 @@
+"""Bulk import of visits (and the prospects met on them) from CSV.
+
+Each row is validated the way ``log_visit`` validates a single POST: the
+visit against ``VisitForm``, and, when the outcome is a positive one and a
+name and phone are given, the prospect against ``ProspectForm``. Valid rows are then
+written ``chunk_size`` at a time, each chunk in its own transaction with one
+``bulk_create`` for new prospects and one for visits. Prospects are matched
+the way ``log_visit`` matches them (normalized phone number, then name, see
+prospects.py) against the database and the rest of the file, so a
+household visited twice gets one prospect. A prospect already on file is
+updated as ``log_visit`` updates it (``prospects.apply_revisit``), with one
+``bulk_update`` per chunk.
+
+``bulk_create`` sends no signals, so the rollups, target progress,
+follow-up queue, search index and dashboard cache are updated here
+directly.
+"""
+import csv
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import dashboard_cache, followups, phones, prospects, rollups, search, targets, territories
+from .forms import ProspectForm, VisitForm
+from .models import InternetPackage, Prospect, Visit
+
+CHUNK_SIZE = 1000
+
+VISIT_COLUMNS = VisitForm._meta.fields
+PROSPECT_COLUMNS = ['full_name', 'phone', 'email', 'address', 'prospect_location', 'preferred_package']
+COLUMNS = VISIT_COLUMNS + PROSPECT_COLUMNS
+
+BOOLEAN_COLUMNS = ['price_concern', 'coverage_concern', 'has_existing_provider']
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on', 'x'}
+
+# Same mapping log_visit uses when it creates a prospect
+INTEREST_BY_OUTCOME = {
+    'closed_sale': 'converted',
+    'follow_up': 'very_interested',
+    'interested': 'interested',
+}
+
+
+class ImportProspectForm(ProspectForm):
+    """ProspectForm without the package select, which is checked against a preloaded set"""
+
+    class Meta(ProspectForm.Meta):
+        fields = ['full_name', 'phone', 'email', 'address', 'location']
+
+
+class RowValidator:
+    """
+    Validates rows the way ``form_class(data).is_valid()`` does (each form
+    field's ``clean()``, then the model's field validation) but reuses one set
+    of fields, since deep-copying every field for a form per row was most of
+    the cost of a large import. Forms with ``clean_<field>()`` or ``clean()``
+    hooks are not supported.
+    """
+
+    def __init__(self, form_class):
+        self.model = form_class._meta.model
+        # Taken from an instance so __init__ tweaks (like ProspectForm's
+        # all-optional fields) apply
+        self.fields = form_class().fields
+
+    def __call__(self, data):
+        """``(unsaved instance, errors)`` for the ``data`` dict"""
+        cleaned, errors = {}, {}
+        for name, field in self.fields.items():
+            try:
+                cleaned[name] = field.clean(field.widget.value_from_datadict(data, {}, name))
+            except ValidationError as e:
+                errors[name] = e.messages
+        if errors:
+            return None, errors
+
+        instance = self.model(**cleaned)
+        # As ModelForm does: skip model validation of fields that are not on
+        # the form, or optional on the form and left empty
+        exclude = [
+            field.name for field in self.model._meta.fields
+            if field.name not in self.fields
+            or (not self.fields[field.name].required and cleaned[field.name] in field.empty_values)
+        ]
+        try:
+            instance.full_clean(exclude=exclude, validate_unique=False)
+        except ValidationError as e:
+            return None, e.message_dict
+        return instance, {}
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.visits_created = 0
+        self.prospects_created = 0
+        self.prospects_matched = 0
+        self.errors = []
+
+    def add_error(self, row, errors):
+        self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'visits_created': self.visits_created,
+            'prospects_created': self.prospects_created,
+            'prospects_matched': self.prospects_matched,
+            'errors': self.errors,
+        }
+
+
+def import_visits(lines, user, chunk_size=CHUNK_SIZE):
+    """
+    Import the CSV text ``lines`` (with a header row naming ``COLUMNS``) as
+    visits by ``user``. Rows that fail validation are skipped and reported in
+    the result with their line number.
+    """
+    result = ImportResult()
+    packages = set(InternetPackage.objects.values_list('pk', flat=True))
+    validate_visit, validate_prospect = RowValidator(VisitForm), RowValidator(ImportProspectForm)
+    pending = []
+    for line_number, row in enumerate(csv.DictReader(lines), start=2):
+        result.rows += 1
+        parsed, errors = parse_row(row, packages, validate_visit, validate_prospect)
+        if errors:
+            result.add_error(line_number, errors)
+            continue
+        pending.append((line_number, *parsed))
+        if len(pending) >= chunk_size:
+            _save_chunk(pending, user, result)
+            pending = []
+    if pending:
+        _save_chunk(pending, user, result)
+
+    if result.visits_created:
+        dashboard_cache.invalidate(dashboard_cache.GLOBAL, user.pk)
+    return result
+
+
+def parse_row(row, packages, validate_visit=None, validate_prospect=None):
+    """
+    ``((visit, prospect), errors)`` for one CSV row: an unsaved Visit without a
+    sales person, and an unsaved Prospect or None when the row has none.
+    """
+    validate_visit = validate_visit or RowValidator(VisitForm)
+    validate_prospect = validate_prospect or RowValidator(ImportProspectForm)
+
+    data = {key.strip(): (value or '').strip() for key, value in row.items() if key}
+    for column in BOOLEAN_COLUMNS:
+        data[column] = 'on' if data.get(column, '').lower() in TRUE_VALUES else ''
+
+    visit, errors = validate_visit(data)
+
+    prospect = None
+    outcome = data.get('outcome')
+    if outcome in INTEREST_BY_OUTCOME and data.get('full_name') and data.get('phone'):
+        prospect, prospect_errors = validate_prospect({
+            'full_name': data['full_name'],
+            'phone': data['phone'],
+            'email': data.get('email', ''),
+            'address': data.get('address', ''),
+            'location': data.get('prospect_location', ''),
+        })
+        errors.update(prospect_errors)
+
+        package = data.get('preferred_package')
+        if package:
+            if not package.isdigit() or int(package) not in packages:
+                errors['preferred_package'] = [f"No internet package with id {package}."]
+            elif prospect is not None:
+                prospect.preferred_package_id = int(package)
+
+    if errors:
+        return None, errors
+    return (visit, prospect), {}
+
+
+def _save_chunk(rows, user, result):
+    try:
+        with transaction.atomic():
+            created, matched, visits = _insert(rows, user)
+    except DatabaseError as e:
+        for line_number, _, _ in rows:
+            result.add_error(line_number, {'__all__': [f"Not saved, the batch failed: {e}"]})
+        return
+    result.visits_created += len(visits)
+    result.prospects_created += created
+    result.prospects_matched += matched
+
+
+def _insert(rows, user):
+    # bulk_create skips the pre_save signals that set these
+    territory_of = territories.matcher()
+    for _, visit, prospect in rows:
+        visit.territory_id = territory_of(visit.location)
+        if prospect:
+            prospect.phone_key = phones.normalize(prospect.phone)
+    # (name, pk) of the prospects on file with each number, oldest first
+    on_file = {}
+    existing = Prospect.objects.filter(
+        phone_key__in={prospect.phone_key for _, _, prospect in rows if prospect},
+    ).exclude(phone_key='').order_by('created_at', 'pk')
+    for key, name, pk in existing.values_list('phone_key', 'full_name', 'pk'):
+        on_file.setdefault(key, []).append((name, pk))
+
+    new_prospects, visits_of_new, revisits = {}, [], []
+    for _, visit, prospect in rows:
+        visit.sales_person = user
+        if not prospect:
+            continue
+        visit.prospect_id = next((
+            pk for name, pk in on_file.get(prospect.phone_key, [])
+            if prospects.same_person(prospect.full_name, name)
+        ), None)
+        if visit.prospect_id:
+            # Attached to a prospect that was already on file
+            revisits.append((visit, prospect))
+            continue
+        # Rows of the file with the same number and person share one new prospect
+        same_number = new_prospects.setdefault(prospect.phone_key or id(prospect), [])
+        first = next((new for new in same_number if prospects.same_person(prospect.full_name, new.full_name)), None)
+        if first is None:
+            # Same defaults as log_visit
+            prospect.address = prospect.address or prospects.NO_ADDRESS
+            prospect.location = prospect.location or visit.location
+            prospect.territory_id = territory_of(prospect.location)
+            prospect.interest_level = INTEREST_BY_OUTCOME[visit.outcome]
+            prospect.added_by = user
+            same_number.append(prospect)
+            first = prospect
+        visits_of_new.append((visit, first))
+
+    created = [prospect for same_number in new_prospects.values() for prospect in same_number]
+    Prospect.objects.bulk_create(created)
+    search.index_many(created)
+    for visit, prospect in visits_of_new:
+        visit.prospect_id = prospect.pk
+
+    visits = [visit for _, visit, _ in rows]
+    Visit.objects.bulk_create(visits)
+    rollups.record_visits(visits)
+    targets.record_visits(visits)
+    followups.add_many(visits)
+    search.index_many(visits)
+
+    # In file order, so interest only goes up and the first details given win,
+    # then one write for every prospect met again in the chunk
+    matched = Prospect.objects.in_bulk({visit.prospect_id for visit, _ in revisits})
+    for visit, prospect in revisits:
+        prospects.apply_revisit(
+            matched[visit.prospect_id], INTEREST_BY_OUTCOME[visit.outcome],
+            prospect.email, prospect.preferred_package_id,
+        )
+    revisited = list(matched.values())
+    now = timezone.now()
+    for prospect in revisited:
+        # bulk_update doesn't touch auto_now fields
+        prospect.updated_at = now
+    Prospect.objects.bulk_update(revisited, prospects.REVISIT_FIELDS)
+    search.reindex_many(revisited)
+    return len(created), len(revisits), visits
@@ -0,0 +1,203 @@
+"""Per-request timing and SQL instrumentation.
+
+``InstrumentationMiddleware`` measures wall time, SQL count and time,
+duplicate statements and template render time for every request. It adds
+them to the response as a ``Server-Timing`` header (visible in the browser
+dev tools) and keeps a bounded in-process sample per URL name, which the
+staff-only ``performance_stats`` view reports as p50/p95/p99.
+
+Template render time is collected by ``InstrumentedDjangoTemplates``, a
+drop-in for the default template backend.
+
+The middleware works under WSGI and ASGI alike and counts queries the way
+``querybudget`` does, so those run on ``concurrency.gather``'s threads are
+included. The header can only cover the time up to the response; for a
+streamed body the sample is taken when the stream ends and covers it too.
+"""
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+from .querybudget import QueryCounter, count_streamed, counting, streams_queries
+
+SAMPLE_SIZE = getattr(settings, 'INSTRUMENTATION_SAMPLE_SIZE', 1000)
+
+_current = ContextVar('zakcomapp_request_metrics', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_VALUES_LIST = re.compile(r'VALUES (?:\((?:%s, )*%s\), )*\((?:%s, )*%s\)')
+
+
+def fingerprint(sql):
+    """SQL with variable-length parameter lists collapsed, so repeats group together"""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _VALUES_LIST.sub('VALUES (...)', sql)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.template_time = 0.0
+        self.queries = QueryCounter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend that adds render time to the current request's metrics"""
+
+    def get_template(self, template_name):
+        return InstrumentedTemplate(super().get_template(template_name))
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(super().from_string(template_code))
+
+
+class InstrumentedTemplate:
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, name):
+        return getattr(self._template, name)
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.template_time += time.perf_counter() - started
+
+
+class Samples:
+    """Bounded, thread-safe per-URL samples of recent requests"""
+
+    def __init__(self, size=SAMPLE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._requests = defaultdict(lambda: deque(maxlen=self.size))
+        self._duplicates = defaultdict(Counter)
+        self._totals = Counter()
+
+    def add(self, url_name, sample, duplicates):
+        with self._lock:
+            self._requests[url_name].append(sample)
+            self._duplicates[url_name].update(duplicates)
+            self._totals[url_name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._requests.clear()
+            self._duplicates.clear()
+            self._totals.clear()
+
+    def summary(self):
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._requests.items()}
+            duplicates = {name: counts.most_common(5) for name, counts in self._duplicates.items()}
+            totals = dict(self._totals)
+
+        report = {}
+        for name, samples in sorted(snapshot.items()):
+            report[name] = {
+                'requests': totals[name],
+                'sampled': len(samples),
+                'wall_ms': percentiles([s['wall'] for s in samples]),
+                'sql_ms': percentiles([s['sql_time'] for s in samples]),
+                'template_ms': percentiles([s['template'] for s in samples]),
+                'sql_queries': percentiles([s['sql_count'] for s in samples], scale=1),
+                'duplicate_queries': [
+                    {'sql': sql, 'repeats': count} for sql, count in duplicates.get(name, [])
+                ],
+            }
+        return report
+
+
+def percentiles(values, scale=1000):
+    """Nearest-rank p50/p95/p99 and max, seconds scaled to ms by default"""
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def rank(p):
+        return values[min(len(values) - 1, max(0, -(-p * len(values) // 100) - 1))]
+
+    return {
+        key: round(value * scale, 2)
+        for key, value in [('p50', rank(50)), ('p95', rank(95)), ('p99', rank(99)), ('max', values[-1])]
+    }
+
+
+samples = Samples()
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with counting(metrics.queries):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.measured(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with counting(metrics.queries):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.measured(request, response, metrics)
+
+    def measured(self, request, response, metrics):
+        wall, counter = metrics.elapsed(), metrics.queries
+        duplicates = self.duplicates(counter)
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={wall * 1000:.1f}',
+            f'sql;dur={counter.total_time * 1000:.1f};desc="{counter.count} queries"',
+            f'dup;desc="{sum(duplicates.values())} duplicate queries"',
+            f'tpl;dur={metrics.template_time * 1000:.1f}',
+        ])
+        if streams_queries(response):
+            response.streaming_content = count_streamed(
+                response.streaming_content, counter, on_close=lambda: self.sample(request, metrics),
+            )
+        else:
+            self.sample(request, metrics, duplicates)
+        return response
+
+    def duplicates(self, counter):
+        repeated = Counter(fingerprint(sql) for sql, _ in counter.queries)
+        return {sql: count - 1 for sql, count in repeated.items() if count > 1}
+
+    def sample(self, request, metrics, duplicates=None):
+        counter = metrics.queries
+        match = request.resolver_match
+        url_name = match.url_name if match and match.url_name else 'unnamed'
+        samples.add(url_name, {
+            'wall': metrics.elapsed(),
+            'sql_count': counter.count,
+            'sql_time': counter.total_time,
+            'template': metrics.template_time,
+        }, self.duplicates(counter) if duplicates is None else duplicates)
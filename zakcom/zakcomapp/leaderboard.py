@@ -0,0 +1,116 @@
+"""The team leaderboard for a month or quarter.
+
+Live standings come from ``analytics.team_stats``: one statement over the
+daily rollups that ranks the whole team with ``RANK() OVER``. Once a month
+is over, ``close_month`` freezes its standings into ``MonthlyStanding``
+rows, and the month is read back from them with one indexed query, so old
+months cost the same however much history there is and don't shift when a
+late sale is backdated into them. Only the ``close_month`` command writes
+snapshots; a month it hasn't closed, and any quarter, is computed live.
+"""
+import re
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F
+
+from . import analytics
+from .models import MonthlyStanding
+from .targets import next_month
+
+FIGURES = [
+    'rank', 'period_sales', 'period_revenue', 'period_visits', 'conversion_rate',
+    'total_rank', 'total_sales', 'total_revenue', 'total_visits', 'total_conversion_rate',
+]
+PERSON = ['username', 'first_name', 'last_name']
+
+
+def period(value, today):
+    """
+    ``(start, end)`` of the ``YYYY-MM`` month or ``YYYY-Qn`` quarter named by
+    ``value``, or of this month if it names neither.
+    """
+    match = re.fullmatch(r'(\d{4})-(?:(\d{2})|Q([1-4]))', value or '')
+    months = 1
+    if match and match[2] and 1 <= int(match[2]) <= 12:
+        start = date(int(match[1]), int(match[2]), 1)
+    elif match and match[3]:
+        start, months = date(int(match[1]), 3 * int(match[3]) - 2, 1), 3
+    else:
+        start = today.replace(day=1)
+    end = start
+    for _ in range(months):
+        end = next_month(end)
+    return start, end - timedelta(days=1)
+
+
+def is_month(start, end):
+    return start.day == 1 and next_month(start) - timedelta(days=1) == end
+
+
+def value(start, end):
+    """The ``period`` parameter naming [start, end]"""
+    if is_month(start, end):
+        return start.strftime('%Y-%m')
+    return f'{start.year}-Q{(start.month + 2) // 3}'
+
+
+def label(start, end):
+    if is_month(start, end):
+        return start.strftime('%B %Y')
+    return f'Q{(start.month + 2) // 3} {start.year}'
+
+
+def choices(today, months=12, quarters=4):
+    """``(value, label)`` for the recent months and quarters, newest first"""
+    options, start = [], today.replace(day=1)
+    for _ in range(months):
+        options.append((start.strftime('%Y-%m'), start.strftime('%B %Y')))
+        start = (start - timedelta(days=1)).replace(day=1)
+    quarter = today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1)
+    for _ in range(quarters):
+        number = (quarter.month + 2) // 3
+        options.append((f'{quarter.year}-Q{number}', f'Q{number} {quarter.year}'))
+        quarter = (quarter - timedelta(days=1)).replace(day=1)
+        quarter = quarter.replace(month=(quarter.month - 1) // 3 * 3 + 1)
+    return options
+
+
+def live(start, end):
+    """The team's standings for [start, end], computed from the rollups"""
+    return list(analytics.team_stats(start, end).values('id', *PERSON, *FIGURES))
+
+
+def frozen(month):
+    """A closed month's standings from its snapshot, in order (empty if not closed)"""
+    return list(MonthlyStanding.objects.filter(month=month).order_by('rank', 'sales_person').annotate(
+        username=F('sales_person__username'),
+        first_name=F('sales_person__first_name'),
+        last_name=F('sales_person__last_name'),
+    ).values('closed_at', *PERSON, *FIGURES))
+
+
+@transaction.atomic
+def close_month(month):
+    """Freeze the standings of the month starting on ``month``, replacing any earlier snapshot"""
+    end = next_month(month) - timedelta(days=1)
+    rows = live(month, end)
+    MonthlyStanding.objects.filter(month=month).delete()
+    MonthlyStanding.objects.bulk_create([
+        MonthlyStanding(month=month, sales_person_id=row['id'], **{field: row[field] for field in FIGURES})
+        for row in rows
+    ])
+    return len(rows)
+
+
+def standings(start, end, today):
+    """
+    ``(rows, closed_at)`` for the period: a finished month from its snapshot,
+    anything else (including a month not closed yet) live with ``closed_at``
+    None. Never writes, so it is safe to call from a GET.
+    """
+    if is_month(start, end) and end < today.replace(day=1):
+        rows = frozen(start)
+        if rows:
+            return rows, rows[0]['closed_at']
+    return live(start, end), None
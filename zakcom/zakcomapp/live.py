@@ -0,0 +1,166 @@
+"""Server-sent events for the admin dashboard.
+
+Instead of reloading the whole page, ``admin_dashboard`` opens an
+``EventSource`` on ``admin_dashboard_stream`` and patches itself from three
+kinds of event:
+
+* ``sale`` and ``visit`` - one new row each, for the live activity list;
+* ``kpi`` - the counters and chart series, re-read from the daily rollups.
+
+The stream doesn't query the database on a timer. Every poll only reads the
+global dashboard cache version (see ``dashboard_cache``), which each
+Sale/Visit/SalesTarget write bumps, and the database is hit only when it has
+moved. Each event carries a cursor - the version and the last sale and visit
+ids sent - as its SSE id, so a reconnecting browser resumes through
+``Last-Event-ID`` without missing or repeating rows.
+
+Under ASGI one response streams for ``LIVE_FEED_MAX_DURATION`` seconds, then
+ends so long-lived connections are spread over the workers; the browser
+reconnects by itself. Under WSGI a worker can't be held open, so the response
+answers a single poll and the browser's reconnect delay turns the stream into
+cheap polling.
+"""
+import asyncio
+import json
+import time
+from typing import NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.utils import timezone
+
+from . import analytics, dashboard_cache
+from .models import Sale, Visit
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class Cursor(NamedTuple):
+    version: int
+    sale_id: int
+    visit_id: int
+
+    def __str__(self):
+        return f'{self.version}.{self.sale_id}.{self.visit_id}'
+
+    @classmethod
+    def parse(cls, value):
+        """The cursor ``str()`` produced, or None if ``value`` isn't one"""
+        try:
+            return cls(*(int(part) for part in value.split('.')))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+
+def current_cursor():
+    """Cursor for the data as it is now, e.g. when the page is rendered"""
+    last = {
+        'sale_id': Sale.objects.aggregate(last=Max('id'))['last'] or 0,
+        'visit_id': Visit.objects.aggregate(last=Max('id'))['last'] or 0,
+    }
+    return Cursor(dashboard_cache.version(dashboard_cache.GLOBAL), **last)
+
+
+def kpis(today):
+    """Everything on the admin dashboard that a write can change"""
+    month_start = today.replace(day=1)
+    sale_stats = analytics.sale_totals(month_start)
+    visit_stats = analytics.visit_totals(month_start)
+    monthly_visits = visit_stats['monthly_visits']
+    conversion = sale_stats['monthly_sales'] / monthly_visits * 100 if monthly_visits > 0 else 0
+    return {
+        **sale_stats,
+        **visit_stats,
+        'overall_conversion': round(conversion, 1),
+        **analytics.objection_counts(month_start),
+        'day': today,
+        'today': analytics.daily_activity(today, 1)[0],
+        'status_breakdown': list(analytics.status_breakdown()),
+        'outcome_breakdown': list(analytics.outcome_breakdown(month_start)),
+        'package_stats': list(analytics.package_stats()),
+    }
+
+
+def new_sales(after, limit):
+    rows = Sale.objects.filter(id__gt=after).order_by('-id').values(
+        'id', 'sale_date', 'status', 'total_value',
+        'customer__full_name', 'package__name', 'sales_person__username',
+    )[:limit]
+    return list(reversed(rows))
+
+
+def new_visits(after, limit):
+    rows = Visit.objects.filter(id__gt=after).order_by('-id').values(
+        'id', 'visit_date', 'location', 'outcome', 'sales_person__username',
+    )[:limit]
+    return list(reversed(rows))
+
+
+def poll(cursor, today):
+    """
+    ``(events, cursor)``: what changed since ``cursor`` as ``(name, data)``
+    pairs, and the cursor to resume from. No queries unless the version moved.
+    """
+    version = dashboard_cache.version(dashboard_cache.GLOBAL)
+    if version == cursor.version:
+        return [], cursor
+
+    # Only the newest rows are sent after a bulk write; the counters in the
+    # kpi event still cover the rest.
+    limit = _setting('LIVE_FEED_BATCH_SIZE', 20)
+    sales = new_sales(cursor.sale_id, limit)
+    visits = new_visits(cursor.visit_id, limit)
+    events = [('sale', sale) for sale in sales] + [('visit', visit) for visit in visits]
+    events.append(('kpi', kpis(today)))
+    return events, Cursor(
+        version,
+        sales[-1]['id'] if sales else cursor.sale_id,
+        visits[-1]['id'] if visits else cursor.visit_id,
+    )
+
+
+def format_event(name, data, cursor):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f'id: {cursor}\nevent: {name}\ndata: {payload}\n\n'
+
+
+def _retry():
+    return f'retry: {int(_setting("LIVE_FEED_RETRY", 3) * 1000)}\n\n'
+
+
+def _poll_formatted(cursor):
+    events, cursor = poll(cursor, timezone.now().date())
+    return ''.join(format_event(name, data, cursor) for name, data in events), cursor
+
+
+def poll_once(cursor):
+    """The single-poll response body used under WSGI"""
+    yield _retry()
+    chunk, _ = _poll_formatted(cursor)
+    if chunk:
+        yield chunk
+
+
+async def stream(cursor):
+    """The events after ``cursor`` as they happen, for one ASGI response"""
+    interval = _setting('LIVE_FEED_POLL_INTERVAL', 2)
+    keepalive = _setting('LIVE_FEED_KEEPALIVE', 15)
+    deadline = time.monotonic() + _setting('LIVE_FEED_MAX_DURATION', 300)
+    check = sync_to_async(_poll_formatted)
+
+    yield _retry()
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        chunk, cursor = await check(cursor)
+        if chunk:
+            yield chunk
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= keepalive:
+            # A comment keeps proxies from timing out an idle connection
+            yield ': keepalive\n\n'
+            last_sent = time.monotonic()
+        await asyncio.sleep(interval)
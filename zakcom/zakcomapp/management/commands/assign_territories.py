@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from zakcomapp import territories
+from zakcomapp.models import Prospect, Visit
+
+
+class Command(BaseCommand):
+    help = (
+        "Match every visit's and prospect's location to a territory, e.g. after adding "
+        "territories or aliases. Rows are read in primary-key order a chunk at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows read and updated at a time")
+        parser.add_argument('--unassigned', action='store_true', help="Only rows that have no territory yet")
+        parser.add_argument('--show-unmatched', type=int, default=10, metavar='N',
+                            help="List the N commonest visit locations still without a territory")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        matcher = territories.Matcher()
+        if not matcher.keys:
+            raise CommandError("There are no territories to match locations to; add some first")
+
+        for model in (Visit, Prospect):
+            changed = territories.assign(
+                model, matcher, chunk_size=options['chunk_size'], unassigned_only=options['unassigned'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural.capitalize()}: {changed} moved to another territory"
+            ))
+
+        unmatched = territories.unmatched(Visit, limit=options['show_unmatched'])
+        if unmatched:
+            self.stdout.write("Commonest visit locations without a territory:")
+            for location, rows in unmatched:
+                self.stdout.write(f"  {rows:>7}  {location}")
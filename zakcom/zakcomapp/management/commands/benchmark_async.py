@@ -0,0 +1,149 @@
+import asyncio
+import json
+import statistics
+import time
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from zakcomapp import views
+from zakcomapp.instrumentation import percentiles
+
+VIEWS = ['admin_dashboard', 'sales_dashboard', 'team_performance', 'feedback_analysis']
+ADMIN_VIEWS = {'admin_dashboard', 'team_performance', 'feedback_analysis'}
+
+
+def make_request(user):
+    """A GET for ``user`` as the auth middleware would leave it, for calling views directly"""
+    request = RequestFactory().get('/')
+    request.user = user
+
+    async def auser():
+        return user
+
+    request.auser = auser
+    return request
+
+
+async def load(view, user, total, concurrency):
+    """
+    Call ``view`` ``total`` times with at most ``concurrency`` in flight, the
+    way the ASGI handler would, and return each call's latency and the
+    overall wall-clock time.
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limit:
+            # Like the ASGI handler: each request's sync code gets its own thread
+            async with ThreadSensitiveContext():
+                started = time.perf_counter()
+                response = await view(make_request(user))
+                elapsed = time.perf_counter() - started
+                # and its request_finished signal drops that thread's connection
+                await sync_to_async(close_old_connections)()
+        if response.status_code != 200:
+            raise CommandError(f"{view.__name__} answered {response.status_code}")
+        return elapsed
+
+    started = time.perf_counter()
+    timings = await asyncio.gather(*(one() for _ in range(total)))
+    return timings, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare wall-clock latency of the sync and async variants of the dashboard, team "
+        "performance and feedback views under concurrent load. Runs against the current database, "
+        "so seed one first (e.g. benchmark_views --keep); dashboard caching is switched off so "
+        "every request builds its context."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help="Timed requests per view and variant")
+        parser.add_argument('--concurrency', type=int, default=10, help="Requests in flight at once")
+        parser.add_argument('--only', nargs='+', choices=VIEWS, metavar='VIEW', help="Benchmark just these views")
+        parser.add_argument('--rep', help="Username to load sales_dashboard as (default: the rep with most sales)")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be at least 1")
+        if connection.in_atomic_block:
+            raise CommandError("Can't run inside a transaction: the async views' query threads wouldn't see its data")
+
+        rep = self._rep(options['rep'])
+        # Never saved; the admin views only check is_staff
+        admin = User(username='benchmark_admin', is_staff=True)
+        overrides = {
+            'CACHES': {**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            'DASHBOARD_CACHE': 'benchmark',
+        }
+        with override_settings(**overrides):
+            report = asyncio.run(self._measure(
+                options['only'] or VIEWS, rep, admin, options['requests'], options['concurrency'],
+            ))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        self._print(report)
+
+    def _rep(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username!r}")
+        rep = User.objects.filter(is_staff=False, is_active=True).annotate(
+            sales_count=Count('sales'),
+        ).order_by('-sales_count', 'pk').first()
+        if rep is None:
+            raise CommandError("No active salesperson to benchmark as; seed some data first")
+        return rep
+
+    async def _measure(self, names, rep, admin, total, concurrency):
+        report = {'meta': {'requests': total, 'concurrency': concurrency, 'database': connection.vendor}, 'views': {}}
+        for name in names:
+            user = admin if name in ADMIN_VIEWS else rep
+            variants = {
+                'sync': sync_to_async(getattr(views, name)),
+                'async': getattr(views, f'{name}_async'),
+            }
+            results = {}
+            for variant, view in variants.items():
+                # Warm up connections and templates before timing
+                await load(view, user, concurrency, concurrency)
+                timings, wall = await load(view, user, total, concurrency)
+                spread = percentiles(timings)
+                results[variant] = {
+                    'mean_ms': round(statistics.mean(timings) * 1000, 2),
+                    'p50_ms': spread['p50'],
+                    'p95_ms': spread['p95'],
+                    'max_ms': spread['max'],
+                    'requests_per_second': round(total / wall, 1),
+                }
+            results['speedup'] = round(results['sync']['mean_ms'] / results['async']['mean_ms'], 2)
+            report['views'][name] = results
+        return report
+
+    def _print(self, report):
+        meta = report['meta']
+        self.stdout.write(f"{meta['requests']} requests per variant, {meta['concurrency']} at a time, on {meta['database']}")
+        self.stdout.write(
+            f"{'view':<20} {'variant':<7} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9} {'req/s':>8}"
+        )
+        for name, results in report['views'].items():
+            for variant in ('sync', 'async'):
+                row = results[variant]
+                self.stdout.write(
+                    f"{name:<20} {variant:<7} {row['mean_ms']:>7.1f}ms {row['p50_ms']:>7.1f}ms "
+                    f"{row['p95_ms']:>7.1f}ms {row['max_ms']:>7.1f}ms {row['requests_per_second']:>8.1f}"
+                )
+            self.stdout.write(f"{name:<20} async is {results['speedup']}x the sync speed")
@@ -0,0 +1,126 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from zakcomapp.instrumentation import percentiles
+from zakcomapp.querybudget import count_queries
+
+ROUTES = ['dashboard', 'sales_dashboard', 'search', 'edit_profile']
+AUTH_TABLES = ('django_session', 'auth_user')
+
+# Session and user lookups before and after caching them. Both point at a
+# private cache, so benchmark sessions never reach the real one.
+VARIANTS = {
+    'database': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    },
+    'cached': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.cached_db',
+        'SESSION_CACHE_ALIAS': 'benchmark',
+        'AUTHENTICATION_BACKENDS': ['zakcomapp.auth_cache.CachedModelBackend'],
+        'USER_CACHE': 'benchmark',
+        'USER_LOCAL_CACHE': 'benchmark',
+    },
+}
+
+
+def is_auth_query(sql):
+    return any(f'"{table}"' in sql for table in AUTH_TABLES)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the SQL queries and latency per logged-in request with database-backed sessions and "
+        "user lookups against the cached ones. Requests cheap pages as a salesperson through the test "
+        "client, inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help="Timed requests per route and variant")
+        parser.add_argument('--only', nargs='+', choices=ROUTES, metavar='URL_NAME', help="Benchmark just these routes")
+        parser.add_argument('--rep', help="Username to log in as (default: a throwaway salesperson)")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+
+        common = {
+            'CACHES': {**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+        }
+        routes = options['only'] or ROUTES
+        report = {'meta': {'repeat': options['repeat'], 'database': connection.vendor}, 'variants': {}}
+        with override_settings(**common), transaction.atomic():
+            rep = self._rep(options['rep'])
+            for variant, overrides in VARIANTS.items():
+                with override_settings(**overrides):
+                    report['variants'][variant] = self._measure(routes, rep, options['repeat'])
+            transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        self._print(report)
+
+    def _rep(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {username!r}")
+        return User.objects.create(username='benchmark_auth_rep', password='!')
+
+    def _measure(self, routes, rep, repeat):
+        # A new client per variant, so its middleware loads that variant's session engine
+        client = Client()
+        client.force_login(rep)
+
+        results = {}
+        for name in routes:
+            url = reverse(name)
+            # Warm up the session, user and dashboard caches before counting
+            status = client.get(url).status_code
+
+            timings, queries, auth_queries = [], 0, 0
+            for _ in range(repeat):
+                with count_queries() as counter:
+                    started = time.perf_counter()
+                    client.get(url)
+                    timings.append(time.perf_counter() - started)
+                queries += counter.count
+                auth_queries += sum(1 for sql, _ in counter.queries if is_auth_query(sql))
+
+            spread = percentiles(timings)
+            results[name] = {
+                'url': url,
+                'status': status,
+                'queries': round(queries / repeat, 2),
+                'auth_queries': round(auth_queries / repeat, 2),
+                'mean_ms': round(statistics.mean(timings) * 1000, 2),
+                'p50_ms': spread['p50'],
+                'p95_ms': spread['p95'],
+            }
+        return results
+
+    def _print(self, report):
+        before, after = report['variants']['database'], report['variants']['cached']
+        self.stdout.write(
+            f"{'route':<18} {'status':>6} {'queries':>15} {'auth queries':>15} {'p50':>19}"
+        )
+        for name, old in before.items():
+            new = after[name]
+            self.stdout.write(
+                f"{name:<18} {new['status']:>6} {old['queries']:>6.1f} -> {new['queries']:<5.1f} "
+                f"{old['auth_queries']:>6.1f} -> {new['auth_queries']:<5.1f} "
+                f"{old['p50_ms']:>6.1f}ms -> {new['p50_ms']:.1f}ms"
+            )
@@ -0,0 +1,151 @@
+import json
+import statistics
+import time
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from zakcomapp import analytics, synthetic
+from zakcomapp.models import MonthlyStanding, Prospect, Sale, Visit
+
+
+def hot_queries(user, today):
+    """The filters behind each view, as (label, how to run it, queryset)"""
+    month_start = today.replace(day=1)
+    return [
+        ('sales_dashboard: monthly sales', 'count',
+         Sale.objects.filter(sales_person=user, sale_date__gte=month_start)),
+        ('sales_dashboard: monthly visits', 'count',
+         Visit.objects.filter(sales_person=user, visit_date__gte=month_start)),
+        ('sales_dashboard: follow-ups', 'list',
+         Visit.objects.filter(sales_person=user, follow_up_date__gte=today,
+                              outcome='follow_up').order_by('follow_up_date')[:5]),
+        ('visit_list: outcome and date filter', 'list',
+         Visit.objects.filter(visit_date__gte=month_start, outcome='follow_up')[:50]),
+        ('feedback_analysis: price concerns', 'count',
+         Visit.objects.filter(visit_date__gte=month_start, price_concern=True)),
+        ('feedback_analysis: coverage concerns', 'count',
+         Visit.objects.filter(visit_date__gte=month_start, coverage_concern=True)),
+        ('feedback_analysis: existing providers', 'list',
+         Visit.objects.filter(visit_date__gte=month_start, has_existing_provider=True)
+         .exclude(existing_provider_name='').values('existing_provider_name')
+         .annotate(count=Count('id')).order_by('-count')[:5]),
+        ('prospect_list: interest filter', 'list',
+         Prospect.objects.filter(added_by=user, interest_level='very_interested')[:50]),
+        ('team_performance: rollup stats', 'list',
+         analytics.team_stats(month_start)),
+        ('team_performance: closed month', 'list',
+         MonthlyStanding.objects.filter(month=month_start).order_by('rank')),
+    ]
+
+
+def app_indexes():
+    for model in apps.get_app_config('zakcomapp').get_models():
+        for index in model._meta.indexes:
+            yield model, index
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset and report EXPLAIN plans and timings for the hot view "
+        "queries with and without the zakcomapp indexes. Everything is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--prospects', type=int, default=20000)
+        parser.add_argument('--visits', type=int, default=200000)
+        parser.add_argument('--sales', type=int, default=40000)
+        parser.add_argument('--days', type=int, default=730, help="Spread rows over this many past days")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--no-seed', action='store_true', help="Benchmark the existing data only")
+        parser.add_argument('--keep', action='store_true', help="Commit the seeded rows instead of rolling back")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['no_seed']:
+                user = User.objects.annotate(n=Count('visits')).order_by('-n').first()
+            else:
+                started = time.perf_counter()
+                seeded = synthetic.seed(
+                    users=options['users'], prospects=options['prospects'], visits=options['visits'],
+                    sales=options['sales'], days=options['days'],
+                )
+                if not options['json']:
+                    self.stdout.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+                user = User.objects.get(pk=seeded['users'][0])
+            self._analyze()
+
+            today = timezone.now().date()
+            with transaction.atomic():
+                self._drop_indexes()
+                before = self._measure(user, today, options['repeat'])
+                transaction.set_rollback(True)
+            after = self._measure(user, today, options['repeat'])
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        report = [
+            {'query': label, 'before': before[label], 'after': after[label]}
+            for label in before
+        ]
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print(report)
+
+    def _analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _drop_indexes(self):
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, index in app_indexes():
+                cursor.execute(editor.sql_delete_index % {
+                    'name': editor.quote_name(index.name),
+                    'table': editor.quote_name(model._meta.db_table),
+                })
+
+    def _measure(self, user, today, repeat):
+        results = {}
+        for label, mode, queryset in hot_queries(user, today):
+            run = queryset.count if mode == 'count' else lambda qs=queryset: list(qs.all())
+            run()  # warm up
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = {
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+                'plan': queryset.explain(),
+            }
+        return results
+
+    def _print(self, report):
+        for row in report:
+            before, after = row['before'], row['after']
+            speedup = before['median_ms'] / after['median_ms'] if after['median_ms'] else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(row['query']))
+            self.stdout.write(
+                f"  without indexes: {before['median_ms']:.3f} ms median, {before['max_ms']:.3f} ms max"
+            )
+            self.stdout.write(
+                f"  with indexes:    {after['median_ms']:.3f} ms median, {after['max_ms']:.3f} ms max"
+                f"  ({speedup:.1f}x)"
+            )
+            self.stdout.write("  plan without indexes:")
+            self.stdout.write(self._indent(before['plan']))
+            self.stdout.write("  plan with indexes:")
+            self.stdout.write(self._indent(after['plan']))
+
+    def _indent(self, plan):
+        return '\n'.join(f"    {line}" for line in plan.splitlines())
@@ -0,0 +1,227 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from zakcomapp import dashboard_cache, synthetic
+from zakcomapp.instrumentation import percentiles
+from zakcomapp.querybudget import count_queries
+from zakcomapp.urls import urlpatterns
+
+# Routes that change state on GET, so can't be replayed
+SKIPPED = {
+    'logout': "ends the benchmark session",
+    'delete_user': "deletes a user on GET",
+    'complete_follow_up': "POST only",
+    'snooze_follow_up': "POST only",
+}
+ANONYMOUS = {'login'}
+STAFF = {
+    'admin_dashboard', 'admin_dashboard_stream', 'sales_trend', 'team_performance', 'export_commissions',
+    'feedback_analysis', 'revenue_projection',
+    'user_management', 'create_user', 'edit_user', 'performance_stats',
+}
+
+
+def route_kwargs(name, rep):
+    return {'edit_user': {'user_id': rep.pk}}.get(name, {})
+
+
+def fetch(client, url):
+    response = client.get(url)
+    if response.streaming:
+        # The test client closes the response once the stream is consumed
+        for _ in response.streaming_content:
+            pass
+    return response.status_code
+
+
+def regressions(report, baseline, threshold, min_ms, min_kb):
+    """Human-readable list of the ways ``report`` is worse than ``baseline``"""
+    found = []
+    for name, current in report['views'].items():
+        base = baseline.get('views', {}).get(name)
+        if base is None:
+            continue
+        if current['status'] != base['status']:
+            found.append(f"{name}: status {base['status']} -> {current['status']}")
+        if current['queries'] > base['queries']:
+            found.append(f"{name}: {base['queries']} -> {current['queries']} queries")
+        if (current['p95_ms'] > base['p95_ms'] * (1 + threshold)
+                and current['p95_ms'] - base['p95_ms'] > min_ms):
+            found.append(f"{name}: p95 {base['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if (current['peak_kb'] > base['peak_kb'] * (1 + threshold)
+                and current['peak_kb'] - base['peak_kb'] > min_kb):
+            found.append(f"{name}: peak memory {base['peak_kb']:.0f} -> {current['peak_kb']:.0f} KB")
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset, request every named zakcomapp route through the test client "
+        "and report latency percentiles, SQL queries and peak memory per view. With --baseline, "
+        "fail if any view regressed. Everything is rolled back unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--packages', type=int, default=5)
+        parser.add_argument('--prospects', type=int, default=5000)
+        parser.add_argument('--visits', type=int, default=50000)
+        parser.add_argument('--sales', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=730, help="Spread rows over this many past days")
+        parser.add_argument('--repeat', type=int, default=20, help="Timed requests per view")
+        parser.add_argument('--only', nargs='+', metavar='URL_NAME', help="Benchmark just these routes")
+        parser.add_argument('--no-seed', action='store_true', help="Benchmark the existing data only")
+        parser.add_argument('--keep', action='store_true', help="Commit the seeded rows instead of rolling back")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+        parser.add_argument('--baseline', help="JSON report to compare against")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Allowed fractional increase in p95 latency and peak memory")
+        parser.add_argument('--min-ms', type=float, default=5.0,
+                            help="Ignore p95 increases smaller than this, which are noise")
+        parser.add_argument('--min-kb', type=float, default=256.0,
+                            help="Ignore peak memory increases smaller than this")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        names = [pattern.name for pattern in urlpatterns if pattern.name]
+        if options['only']:
+            unknown = set(options['only']) - set(names)
+            if unknown:
+                raise CommandError(f"Unknown routes: {', '.join(sorted(unknown))}")
+            names = [name for name in names if name in options['only']]
+
+        if options['repeat'] < 1:
+            raise CommandError("--repeat must be at least 1")
+
+        overrides = {
+            # A private cache, so benchmark contexts never leak into the real one
+            'CACHES': {**settings.CACHES, 'benchmark': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            'DASHBOARD_CACHE': 'benchmark',
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+        }
+        with override_settings(**overrides), transaction.atomic():
+            volumes = self._seed(options)
+            report = {
+                'meta': {
+                    'volumes': volumes,
+                    'repeat': options['repeat'],
+                    'database': connection.vendor,
+                    'django': django.get_version(),
+                    'python': platform.python_version(),
+                    'debug': settings.DEBUG,
+                },
+                'skipped': {name: reason for name, reason in SKIPPED.items() if name in names},
+                'views': self._measure(names, options['repeat']),
+            }
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        self._print(report)
+
+        if baseline is not None:
+            found = regressions(report, baseline, options['threshold'], options['min_ms'], options['min_kb'])
+            if found:
+                raise CommandError("Performance regressions:\n  " + "\n  ".join(found))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline"))
+
+    def _seed(self, options):
+        if options['no_seed']:
+            rep = User.objects.filter(is_staff=False, is_active=True).first()
+            volumes = {}
+        else:
+            started = time.perf_counter()
+            seeded = synthetic.seed(
+                users=options['users'], packages=options['packages'], prospects=options['prospects'],
+                visits=options['visits'], sales=options['sales'], days=options['days'],
+            )
+            self.stderr.write(f"Seeded in {time.perf_counter() - started:.1f}s")
+            rep = User.objects.get(pk=seeded['users'][0])
+            volumes = {**seeded, 'users': len(seeded['users'])}
+        if rep is None:
+            raise CommandError("No active salesperson to benchmark as; seed some data first")
+        self.rep = rep
+        self.admin, _ = User.objects.update_or_create(username='benchmark_admin', defaults={'is_staff': True})
+        return volumes
+
+    def _measure(self, names, repeat):
+        clients = {'anonymous': Client(), 'rep': Client(), 'staff': Client()}
+        clients['rep'].force_login(self.rep)
+        clients['staff'].force_login(self.admin)
+
+        results = {}
+        for name in names:
+            if name in SKIPPED:
+                continue
+            role = 'anonymous' if name in ANONYMOUS else 'staff' if name in STAFF else 'rep'
+            client = clients[role]
+            url = reverse(name, kwargs=route_kwargs(name, self.rep))
+
+            # First request with nothing cached
+            dashboard_cache.cache().clear()
+            with count_queries() as counter:
+                started = time.perf_counter()
+                status = fetch(client, url)
+                cold = time.perf_counter() - started
+
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                fetch(client, url)
+                timings.append(time.perf_counter() - started)
+
+            # Separate pass, as tracing allocations slows everything down
+            tracemalloc.start()
+            fetch(client, url)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            spread = percentiles(timings)
+            results[name] = {
+                'url': url,
+                'as': role,
+                'status': status,
+                'queries': counter.count,
+                'cold_ms': round(cold * 1000, 2),
+                'mean_ms': round(statistics.mean(timings) * 1000, 2),
+                'p50_ms': spread['p50'],
+                'p95_ms': spread['p95'],
+                'p99_ms': spread['p99'],
+                'max_ms': spread['max'],
+                'peak_kb': round(peak / 1024, 1),
+            }
+        return results
+
+    def _print(self, report):
+        self.stdout.write(
+            f"{'view':<22} {'status':>6} {'queries':>7} {'cold':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'peak':>10}"
+        )
+        for name, view in report['views'].items():
+            self.stdout.write(
+                f"{name:<22} {view['status']:>6} {view['queries']:>7} {view['cold_ms']:>7.1f}ms "
+                f"{view['p50_ms']:>7.1f}ms {view['p95_ms']:>7.1f}ms {view['p99_ms']:>7.1f}ms "
+                f"{view['peak_kb']:>8.0f}KB"
+            )
+        for name, reason in report['skipped'].items():
+            self.stdout.write(f"{name:<22} skipped: {reason}")
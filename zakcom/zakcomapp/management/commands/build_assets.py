@@ -0,0 +1,41 @@
+import subprocess
+from urllib.error import URLError
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from zakcomapp import assets
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the self-hosted static assets: download any missing vendored bundles, compile the "
+        "Tailwind CSS used by the templates, then collectstatic into STATIC_ROOT with hashed names "
+        "and precompressed variants."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh', action='store_true', help="Download the vendored bundles even if present")
+        parser.add_argument('--tailwind', help="Tailwind command line to run (default: the TAILWIND_CLI setting)")
+        parser.add_argument('--skip-css', action='store_true', help="Keep the current static/css/app.css")
+        parser.add_argument('--no-collect', action='store_true', help="Stop before collectstatic")
+
+    def handle(self, *args, **options):
+        try:
+            fetched = assets.fetch(refresh=options['refresh'])
+        except (URLError, OSError) as e:
+            raise CommandError(f"Could not download the vendored bundles: {e}")
+        self.stdout.write(f"Downloaded {len(fetched)} vendored files")
+
+        if not options['skip_css']:
+            try:
+                path = assets.build_css(options['tailwind'])
+            except OSError as e:
+                raise CommandError(f"Could not run the Tailwind CLI ({e}); install it or pass --tailwind")
+            except subprocess.CalledProcessError as e:
+                raise CommandError(f"Tailwind failed:\n{e.stderr}")
+            self.stdout.write(f"Built {path}")
+
+        if not options['no_collect']:
+            call_command('collectstatic', interactive=False, verbosity=options['verbosity'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Static assets are ready"))
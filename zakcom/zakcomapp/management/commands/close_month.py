@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from zakcomapp import leaderboard
+from zakcomapp.models import DailySalesRollup, DailyVisitRollup, MonthlyStanding
+from zakcomapp.targets import next_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Freeze the team leaderboard of a finished month (last month by default) into "
+        "MonthlyStanding rows, which team_performance then reads for that month. Run it on "
+        "the 1st; closing a month again replaces its snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Month to close, as YYYY-MM")
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help="Close every finished month with activity that has no snapshot yet",
+        )
+
+    def handle(self, *args, **options):
+        this_month = timezone.now().date().replace(day=1)
+        if options['backfill']:
+            months = self._unclosed(this_month)
+        elif options['month']:
+            try:
+                year, month = map(int, options['month'].split('-'))
+                months = [date(year, month, 1)]
+            except ValueError:
+                raise CommandError("--month must be YYYY-MM")
+            if months[0] >= this_month:
+                raise CommandError(f"{options['month']} hasn't finished yet")
+        else:
+            months = [(this_month - timedelta(days=1)).replace(day=1)]
+
+        for month in months:
+            people = leaderboard.close_month(month)
+            self.stdout.write(f"{month:%B %Y}: {people} sales people ranked")
+        self.stdout.write(self.style.SUCCESS(f"Closed {len(months)} months"))
+
+    def _unclosed(self, this_month):
+        first = min(filter(None, [
+            DailySalesRollup.objects.order_by('date').values_list('date', flat=True).first(),
+            DailyVisitRollup.objects.order_by('date').values_list('date', flat=True).first(),
+        ]), default=this_month)
+        closed = set(MonthlyStanding.objects.values_list('month', flat=True).distinct())
+        months, month = [], first.replace(day=1)
+        while month < this_month:
+            if month not in closed:
+                months.append(month)
+            month = next_month(month)
+        return months
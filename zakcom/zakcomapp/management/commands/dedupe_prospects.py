@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from zakcomapp import prospects
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge prospects recorded more than once: same phone number in any format and a "
+        "matching name. Visits move to the surviving prospect (the one that became a "
+        "customer, otherwise the oldest)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report the duplicates without merging them")
+        parser.add_argument(
+            '--similarity', type=float, default=prospects.NAME_SIMILARITY,
+            help="How alike two names on one number must be to merge them, from 0 to 1",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Phone numbers loaded per query")
+
+    def handle(self, *args, **options):
+        if not 0 <= options['similarity'] <= 1:
+            raise CommandError("--similarity must be between 0 and 1")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        groups = merged = removed = skipped = 0
+        for group in prospects.duplicate_groups(options['similarity'], options['batch_size']):
+            groups += 1
+            names = ', '.join(f"{prospect.full_name} (#{prospect.pk})" for prospect in group)
+            if options['dry_run']:
+                self.stdout.write(f"{group[0].phone_key}: {names}")
+                continue
+            if prospects.merge(group) is None:
+                skipped += 1
+                self.stdout.write(self.style.WARNING(f"Skipped {names}: more than one became a customer"))
+                continue
+            merged += 1
+            removed += len(group) - 1
+
+        if options['dry_run']:
+            self.stdout.write(f"{groups} groups of duplicates found")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Merged {merged} groups, removing {removed} duplicate prospects ({skipped} skipped)"
+            ))
@@ -0,0 +1,78 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from zakcomapp import exports, filters
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream every sale or visit (optionally filtered like sale_list/visit_list) "
+        "to a CSV or XLSX file with constant memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['sales', 'visits'])
+        parser.add_argument('--format', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help="File to write. Defaults to stdout.")
+        parser.add_argument('--user', help="Only this salesperson's rows (username)")
+        parser.add_argument('--status', help="Sale status (sales only)")
+        parser.add_argument('--outcome', help="Visit outcome (visits only)")
+        parser.add_argument('--date-from', help="First sale/visit date (YYYY-MM-DD)")
+        parser.add_argument('--date-to', help="Last sale/visit date (YYYY-MM-DD)")
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE,
+                            help="Rows fetched from the database at a time")
+
+    def handle(self, *args, **options):
+        params = {
+            'status': options['status'],
+            'outcome': options['outcome'],
+            'date_from': self._parse(options['date_from'], '--date-from'),
+            'date_to': self._parse(options['date_to'], '--date-to'),
+        }
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}")
+
+        if options['kind'] == 'sales':
+            queryset, columns = filters.sales_for(None, params), exports.SALE_COLUMNS
+        else:
+            queryset, columns = filters.visits_for(None, params), exports.VISIT_COLUMNS
+        if user is not None:
+            queryset = queryset.filter(sales_person=user)
+
+        chunks = exports.stream(
+            options['format'], columns,
+            exports.rows(queryset, columns, chunk_size=options['chunk_size']),
+            sheet_name=options['kind'].title(),
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as out:
+                written = self._write(out, chunks)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+        else:
+            self._write(sys.stdout.buffer, chunks)
+
+    def _write(self, out, chunks):
+        written = 0
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+        out.flush()
+        return written
+
+    def _parse(self, value, option):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"{option} must be a date in YYYY-MM-DD format")
+        return parsed
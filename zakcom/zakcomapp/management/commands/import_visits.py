@@ -0,0 +1,48 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from zakcomapp import imports
+
+
+class Command(BaseCommand):
+    help = "Import a CSV file of visits (and their prospects) for one salesperson"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file with a header row")
+        parser.add_argument('--user', required=True, help="Username the visits are recorded for")
+        parser.add_argument('--chunk-size', type=int, default=imports.CHUNK_SIZE,
+                            help="Rows written per transaction")
+        parser.add_argument('--errors', help="Write the per-row error report to this JSON file")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']!r}")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                result = imports.import_visits(lines, user, chunk_size=options['chunk_size'])
+        except OSError as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+
+        if options['errors']:
+            with open(options['errors'], 'w') as out:
+                json.dump(result.errors, out, indent=2)
+        else:
+            for error in result.errors:
+                problems = '; '.join(
+                    f"{field}: {message}" for field, messages in error['errors'].items() for message in messages
+                )
+                self.stderr.write(f"line {error['row']}: {problems}")
+
+        style = self.style.SUCCESS if not result.errors else self.style.WARNING
+        self.stdout.write(style(
+            f"Imported {result.visits_created} of {result.rows} visits in {time.perf_counter() - started:.1f}s "
+            f"({result.prospects_created} new prospects, {result.prospects_matched} matched, "
+            f"{len(result.errors)} rows rejected)"
+        ))
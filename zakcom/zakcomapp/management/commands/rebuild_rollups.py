@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from zakcomapp import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales, visit and objection rollup tables from the raw Sale and Visit rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First date to rebuild (YYYY-MM-DD). Defaults to the beginning of time.")
+        parser.add_argument('--until', help="Last date to rebuild (YYYY-MM-DD). Defaults to today and beyond.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        since = self._parse(options['since'], '--since')
+        until = self._parse(options['until'], '--until')
+        if since and until and since > until:
+            raise CommandError("--since must not be after --until")
+
+        sales, visits, objections = rollups.rebuild(since, until, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {sales} sales buckets, {visits} visit buckets and {objections} objection buckets"
+        ))
+
+    def _parse(self, value, option):
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError(f"{option} must be a date in YYYY-MM-DD format")
+        return parsed
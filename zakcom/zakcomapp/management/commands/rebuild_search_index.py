@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from zakcomapp import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index from the Visit, Prospect and Customer rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        written = search.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} documents"))
@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils.dateparse import parse_date
+
+from zakcomapp.models import Sale, SalesTarget, Visit
+from zakcomapp.targets import next_month
+
+FIELDS = ['achieved_count', 'achieved_amount', 'achieved_visits']
+
+
+def expected_progress(targets):
+    """
+    ``{(sales_person_id, year, month): {field: value}}`` recomputed from the
+    raw Sale and Visit rows for the months ``targets`` cover, in two
+    grouped queries.
+    """
+    months = [target.month for target in targets]
+    people = {target.sales_person_id for target in targets}
+    if not months:
+        return {}
+    start, end = min(months), next_month(max(months))
+
+    progress = {}
+    sales = Sale.objects.filter(
+        sales_person__in=people, sale_date__gte=start, sale_date__lt=end,
+    ).exclude(status='cancelled').annotate(
+        year=ExtractYear('sale_date'), month=ExtractMonth('sale_date'),
+    ).order_by().values('sales_person', 'year', 'month').annotate(
+        count=Count('id'), amount=Sum('total_value'),
+    )
+    for row in sales:
+        progress.setdefault((row['sales_person'], row['year'], row['month']), {}).update(
+            achieved_count=row['count'], achieved_amount=row['amount'] or 0,
+        )
+
+    visits = Visit.objects.filter(
+        sales_person__in=people, visit_date__gte=start, visit_date__lt=end,
+    ).annotate(
+        year=ExtractYear('visit_date'), month=ExtractMonth('visit_date'),
+    ).order_by().values('sales_person', 'year', 'month').annotate(count=Count('id'))
+    for row in visits:
+        progress.setdefault((row['sales_person'], row['year'], row['month']), {}).update(
+            achieved_visits=row['count'],
+        )
+    return progress
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare every SalesTarget's achieved figures with the raw sales and visits "
+        "and repair any that drifted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="Only targets for this month (YYYY-MM)")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without repairing it")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            targets = SalesTarget.objects.select_related('sales_person').select_for_update(of=('self',))
+            if options['month']:
+                targets = targets.filter(month=self._parse_month(options['month']))
+            targets = list(targets.order_by('month', 'sales_person__username'))
+            expected = expected_progress(targets)
+
+            drifted = []
+            for target in targets:
+                correct = expected.get((target.sales_person_id, target.month.year, target.month.month), {})
+                changes = {
+                    field: (getattr(target, field), correct.get(field, 0))
+                    for field in FIELDS if getattr(target, field) != correct.get(field, 0)
+                }
+                if not changes:
+                    continue
+                drifted.append(target)
+                self.stdout.write(f"{target}: " + ", ".join(
+                    f"{field} {stored} -> {value}" for field, (stored, value) in changes.items()
+                ))
+                for field, (_, value) in changes.items():
+                    setattr(target, field, value)
+
+            if drifted and not options['dry_run']:
+                SalesTarget.objects.bulk_update(drifted, FIELDS)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f"All {len(targets)} targets are in sync"))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} of {len(targets)} targets have drifted"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} of {len(targets)} targets"))
+
+    def _parse_month(self, value):
+        try:
+            parsed = parse_date(f'{value}-01')
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise CommandError("--month must be in YYYY-MM format")
+        return parsed
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from zakcomapp import followups, views
+from zakcomapp.models import FollowUp
+
+
+class Command(BaseCommand):
+    help = (
+        "Daily follow-up queue job: queue any follow-up visits that are missing from it, mark "
+        "long-overdue follow-ups missed, then precompute each rep's sales dashboard (with "
+        "their queue) so the first visit of the day is a cache hit. Run it shortly after midnight."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Visits read and queued at a time")
+        parser.add_argument('--no-warm', action='store_true', help="Skip precomputing the dashboards")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+        today = timezone.now().date()
+
+        added, dropped = followups.reconcile(today, chunk_size=options['chunk_size'])
+        missed = followups.expire(today)
+        self.stdout.write(f"Queued {added} follow-ups, dropped {dropped}, marked {missed} missed")
+
+        if options['no_warm']:
+            return
+        reps = User.objects.filter(
+            is_active=True, is_staff=False, follow_ups__state=FollowUp.OPEN,
+        ).distinct().order_by('pk')
+        warmed = 0
+        for rep in reps.iterator():
+            views.cached_sales_dashboard(rep, today)
+            warmed += 1
+        self.stdout.write(self.style.SUCCESS(f"Precomputed the dashboards of {warmed} reps with open follow-ups"))
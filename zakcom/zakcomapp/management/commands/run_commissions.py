@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from zakcomapp import commissions
+from zakcomapp.targets import next_month
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute a month's commission ledger (last month by default) for the whole team, "
+        "replacing any earlier run of that month. Safe to repeat after sales, rates or "
+        "tiers change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help="First month to run, as YYYY-MM")
+        parser.add_argument('--through', help="Last month to run, as YYYY-MM (defaults to --month)")
+
+    def handle(self, *args, **options):
+        first = self._month(options['month'], '--month')
+        if first is None:
+            first = (timezone.now().date().replace(day=1) - timedelta(days=1)).replace(day=1)
+        last = self._month(options['through'], '--through') or first
+        if last < first:
+            raise CommandError("--through is before --month")
+
+        # In order, so each month's clawbacks see the earlier months' commission
+        month = first
+        while month <= last:
+            result = commissions.run(month)
+            self.stdout.write(
+                f"{month:%B %Y}: {result['earned']} sales earned, {result['clawbacks']} clawed back, "
+                f"net UGX {result['total']:,.2f}"
+            )
+            month = next_month(month)
+        self.stdout.write(self.style.SUCCESS("Commission ledger updated"))
+
+    def _month(self, value, option):
+        if not value:
+            return None
+        try:
+            year, month = map(int, value.split('-'))
+            return date(year, month, 1)
+        except ValueError:
+            raise CommandError(f"{option} must be YYYY-MM")
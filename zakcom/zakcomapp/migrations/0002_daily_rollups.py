@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rollups(apps, schema_editor):
+    Sale = apps.get_model('zakcomapp', 'Sale')
+    Visit = apps.get_model('zakcomapp', 'Visit')
+    DailySalesRollup = apps.get_model('zakcomapp', 'DailySalesRollup')
+    DailyVisitRollup = apps.get_model('zakcomapp', 'DailyVisitRollup')
+
+    sale_rows = Sale.objects.order_by().values('sale_date', 'sales_person', 'package', 'status').annotate(
+        sales_count=Count('id'),
+        revenue=Sum('total_value'),
+    )
+    DailySalesRollup.objects.bulk_create([
+        DailySalesRollup(
+            date=row['sale_date'],
+            sales_person_id=row['sales_person'],
+            package_id=row['package'],
+            status=row['status'],
+            sales_count=row['sales_count'],
+            revenue=row['revenue'] or 0,
+        )
+        for row in sale_rows.iterator()
+    ], batch_size=1000)
+
+    visit_rows = Visit.objects.order_by().values('visit_date', 'sales_person', 'outcome').annotate(
+        visits_count=Count('id'),
+        price_concerns=Count('id', filter=Q(price_concern=True)),
+        coverage_concerns=Count('id', filter=Q(coverage_concern=True)),
+        existing_providers=Count('id', filter=Q(has_existing_provider=True)),
+    )
+    DailyVisitRollup.objects.bulk_create([
+        DailyVisitRollup(
+            date=row['visit_date'],
+            sales_person_id=row['sales_person'],
+            outcome=row['outcome'],
+            visits_count=row['visits_count'],
+            price_concerns=row['price_concerns'],
+            coverage_concerns=row['coverage_concerns'],
+            existing_providers=row['existing_providers'],
+        )
+        for row in visit_rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('installed', 'Installed'), ('active', 'Active'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='zakcomapp.internetpackage')),
+                ('sales_person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('date', 'sales_person', 'package', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyVisitRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('outcome', models.CharField(choices=[('interested', 'Showed Interest'), ('not_interested', 'Not Interested'), ('follow_up', 'Needs Follow-up'), ('closed_sale', 'Closed Sale'), ('not_home', 'Not Home'), ('wrong_location', 'Wrong Location')], max_length=20)),
+                ('visits_count', models.IntegerField(default=0)),
+                ('price_concerns', models.IntegerField(default=0)),
+                ('coverage_concerns', models.IntegerField(default=0)),
+                ('existing_providers', models.IntegerField(default=0)),
+                ('sales_person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visit_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('date', 'sales_person', 'outcome')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
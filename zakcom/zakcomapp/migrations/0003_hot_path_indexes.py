@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0002_daily_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailysalesrollup',
+            index=models.Index(fields=['sales_person', 'date'], name='sales_rollup_person_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyvisitrollup',
+            index=models.Index(fields=['sales_person', 'date'], name='visit_rollup_person_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(fields=['added_by', 'interest_level'], name='prospect_owner_interest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sales_person', 'sale_date'], name='sale_person_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['sales_person', 'visit_date'], name='visit_person_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['visit_date', 'outcome'], name='visit_date_outcome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(condition=models.Q(('outcome', 'follow_up')), fields=['sales_person', 'follow_up_date'], name='visit_follow_up_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(condition=models.Q(('price_concern', True)), fields=['visit_date'], name='visit_price_concern_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(condition=models.Q(('coverage_concern', True)), fields=['visit_date'], name='visit_coverage_concern_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(condition=models.Q(('has_existing_provider', True)), fields=['visit_date'], name='visit_existing_provider_idx'),
+        ),
+    ]
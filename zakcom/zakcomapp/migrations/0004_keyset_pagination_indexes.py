@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0003_hot_path_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(fields=['-created_at', '-id'], name='prospect_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-created_at', '-id'], name='sale_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['sales_person', '-created_at', '-id'], name='sale_person_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['-visit_date', '-visit_time', '-id'], name='visit_keyset_idx'),
+        ),
+    ]
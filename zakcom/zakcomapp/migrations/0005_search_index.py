@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Postgres only: a tsvector kept in sync by the database itself, title
+# weighted above body, and the GIN index that makes matching it fast. Other
+# databases use the SearchTerm postings instead.
+SEARCH_VECTOR_SQL = [
+    """
+    ALTER TABLE zakcomapp_searchdocument ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', body), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX search_doc_vector_idx ON zakcomapp_searchdocument USING gin (search_vector)",
+]
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in SEARCH_VECTOR_SQL:
+            schema_editor.execute(sql)
+
+
+def remove_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Drops the index with it
+        schema_editor.execute("ALTER TABLE zakcomapp_searchdocument DROP COLUMN search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0004_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('visit', 'Visit'), ('prospect', 'Prospect'), ('customer', 'Customer')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('date', models.DateField(blank=True, null=True)),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.IntegerField()),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='zakcomapp.searchdocument')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchdocument',
+            index=models.Index(fields=['owner', 'kind'], name='search_doc_owner_kind_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchdocument',
+            unique_together={('kind', 'object_id')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchterm',
+            unique_together={('term', 'document')},
+        ),
+        migrations.RunPython(add_search_vector, remove_search_vector),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:23
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+MEASURES = ['visits_count', 'price_concerns', 'coverage_concerns', 'existing_providers']
+
+# objections.normalize_provider and normalize_location when this migration was written
+COMPANY_SUFFIXES = {'uganda', 'ug', 'ltd', 'limited', 'plc', 'inc', 'co', 'company'}
+PROVIDER_LENGTH = 100
+LOCATION_LENGTH = 200
+
+
+def normalize_provider(name):
+    words = re.sub(r'[^\w&+]+', ' ', name or '').casefold().split()
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    label = ' '.join(words)
+    label = label.upper() if len(words) == 1 and len(label) <= 3 else label.title()
+    return label[:PROVIDER_LENGTH]
+
+
+def normalize_location(location):
+    return ' '.join((location or '').split()).title()[:LOCATION_LENGTH]
+
+
+def backfill_objection_rollups(apps, schema_editor):
+    Visit = apps.get_model('zakcomapp', 'Visit')
+    DailyObjectionRollup = apps.get_model('zakcomapp', 'DailyObjectionRollup')
+
+    rows = Visit.objects.order_by().values(
+        'visit_date', 'location', 'has_existing_provider', 'existing_provider_name',
+    ).annotate(
+        visits_count=Count('id'),
+        price_concerns=Count('id', filter=Q(price_concern=True)),
+        coverage_concerns=Count('id', filter=Q(coverage_concern=True)),
+        existing_providers=Count('id', filter=Q(has_existing_provider=True)),
+    )
+    buckets = {}
+    for row in rows.iterator():
+        key = (
+            row['visit_date'],
+            normalize_location(row['location']),
+            normalize_provider(row['existing_provider_name']) if row['has_existing_provider'] else '',
+        )
+        totals = buckets.setdefault(key, dict.fromkeys(MEASURES, 0))
+        for field in MEASURES:
+            totals[field] += row[field]
+    DailyObjectionRollup.objects.bulk_create([
+        DailyObjectionRollup(date=date, location=location, provider=provider, **measures)
+        for (date, location, provider), measures in buckets.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyObjectionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('location', models.CharField(max_length=200)),
+                ('provider', models.CharField(blank=True, max_length=100)),
+                ('visits_count', models.IntegerField(default=0)),
+                ('price_concerns', models.IntegerField(default=0)),
+                ('coverage_concerns', models.IntegerField(default=0)),
+                ('existing_providers', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'location', 'provider')},
+            },
+        ),
+        migrations.RunPython(backfill_objection_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:30
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+MAX_DIGITS = 19
+
+
+# phones.normalize when this migration was written
+def normalize(phone):
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return ''
+
+    country = settings.PHONE_COUNTRY_CODE
+    if phone.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        digits = country + digits[1:]
+    elif len(digits) <= settings.PHONE_NATIONAL_LENGTH:
+        digits = country + digits
+    if digits.startswith(country + '0'):
+        digits = country + digits[len(country) + 1:]
+    return '+' + digits[:MAX_DIGITS]
+
+
+def backfill_phone_keys(apps, schema_editor):
+    Prospect = apps.get_model('zakcomapp', 'Prospect')
+    batch = []
+    for prospect in Prospect.objects.only('pk', 'phone').iterator(chunk_size=1000):
+        prospect.phone_key = normalize(prospect.phone)
+        batch.append(prospect)
+        if len(batch) == 1000:
+            Prospect.objects.bulk_update(batch, ['phone_key'])
+            batch = []
+    Prospect.objects.bulk_update(batch, ['phone_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0006_objection_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prospect',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        # Filled in before the index is built
+        migrations.RunPython(backfill_phone_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='prospect',
+            index=models.Index(fields=['phone_key'], name='prospect_phone_key_idx'),
+        ),
+    ]
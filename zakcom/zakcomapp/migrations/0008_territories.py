@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0007_prospect_phone_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Territory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('aliases', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='prospect',
+            name='territory',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='prospects', to='zakcomapp.territory'),
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='territory',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='visits', to='zakcomapp.territory'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['territory', 'visit_date'], name='visit_territory_date_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:38
+
+import datetime
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+# followups.EXPIRE_AFTER_DAYS when this migration was written
+EXPIRE_AFTER_DAYS = 30
+
+
+def backfill_follow_ups(apps, schema_editor):
+    Visit = apps.get_model('zakcomapp', 'Visit')
+    FollowUp = apps.get_model('zakcomapp', 'FollowUp')
+    later = Visit.objects.filter(prospect=OuterRef('prospect')).filter(
+        Q(visit_date__gt=OuterRef('visit_date')) | Q(visit_date=OuterRef('visit_date'), pk__gt=OuterRef('pk')),
+    )
+    visits = Visit.objects.filter(outcome='follow_up', follow_up_date__isnull=False).annotate(
+        settled=Exists(later),
+    ).order_by('pk').values_list('pk', 'sales_person_id', 'follow_up_date', 'settled')
+
+    expired = timezone.now().date() - datetime.timedelta(days=EXPIRE_AFTER_DAYS)
+    batch = []
+    for pk, sales_person_id, due_date, settled in visits.iterator(chunk_size=1000):
+        state = 'done' if settled else 'missed' if due_date < expired else 'open'
+        batch.append(FollowUp(visit_id=pk, sales_person_id=sales_person_id, due_date=due_date, state=state))
+        if len(batch) == 1000:
+            FollowUp.objects.bulk_create(batch)
+            batch = []
+    FollowUp.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0008_territories'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowUp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField()),
+                ('state', models.CharField(choices=[('open', 'Open'), ('done', 'Done'), ('missed', 'Missed')], default='open', max_length=10)),
+                ('snoozes', models.PositiveIntegerField(default=0)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('resolved_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='zakcomapp.visit')),
+                ('sales_person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follow_ups', to=settings.AUTH_USER_MODEL)),
+                ('visit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='follow_up', to='zakcomapp.visit')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sales_person', 'state', 'due_date'], name='follow_up_queue_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_follow_ups, migrations.RunPython.noop),
+    ]
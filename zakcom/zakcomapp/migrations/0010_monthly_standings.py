@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0009_follow_up_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStanding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('rank', models.PositiveIntegerField()),
+                ('period_sales', models.IntegerField(default=0)),
+                ('period_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('period_visits', models.IntegerField(default=0)),
+                ('conversion_rate', models.FloatField(default=0)),
+                ('total_rank', models.PositiveIntegerField()),
+                ('total_sales', models.IntegerField(default=0)),
+                ('total_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_visits', models.IntegerField(default=0)),
+                ('total_conversion_rate', models.FloatField(default=0)),
+                ('closed_at', models.DateTimeField(auto_now_add=True)),
+                ('sales_person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'rank'], name='standing_month_rank_idx')],
+                'unique_together': {('month', 'sales_person')},
+            },
+        ),
+    ]
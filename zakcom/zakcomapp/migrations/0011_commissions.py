@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0010_monthly_standings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommissionEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('kind', models.CharField(choices=[('earned', 'Earned'), ('clawback', 'Clawback')], max_length=10)),
+                ('base', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('multiplier', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('computed_at', models.DateTimeField(auto_now_add=True)),
+                ('sale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commission_entries', to='zakcomapp.sale')),
+                ('sales_person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commission_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'commission entries',
+                'indexes': [models.Index(fields=['month', 'sales_person'], name='commission_month_person_idx')],
+                'unique_together': {('month', 'sale', 'kind')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CommissionRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valid_from', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('long_contract_months', models.PositiveIntegerField(default=24)),
+                ('long_contract_rate', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='commission_rates', to='zakcomapp.internetpackage')),
+            ],
+            options={
+                'ordering': ['package', '-valid_from'],
+                'unique_together': {('package', 'valid_from')},
+            },
+        ),
+        migrations.CreateModel(
+            name='CommissionTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attainment', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('multiplier', models.DecimalField(decimal_places=2, max_digits=4)),
+                ('target', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='commission_tiers', to='zakcomapp.salestarget')),
+            ],
+            options={
+                'ordering': ['target', 'attainment'],
+                'unique_together': {('target', 'attainment')},
+            },
+        ),
+    ]
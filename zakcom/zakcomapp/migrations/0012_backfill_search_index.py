@@ -0,0 +1,108 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+# search.tokenize and its settings when this migration was written
+TITLE_WEIGHT = 4
+BODY_WEIGHT = 1
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'has', 'have', 'he', 'her',
+    'his', 'i', 'in', 'is', 'it', 'its', 'no', 'not', 'of', 'on', 'or', 'she', 'so', 'that', 'the',
+    'their', 'they', 'this', 'to', 'was', 'we', 'were', 'with', 'you',
+}
+MAX_TERM_LENGTH = 64
+
+
+def tokenize(text):
+    terms = []
+    for word in re.findall(r'\w+', text.lower()):
+        if word in STOP_WORDS or (len(word) < 2 and not word.isdigit()):
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word[:MAX_TERM_LENGTH])
+    return terms
+
+
+# search.document_fields when this migration was written
+def _digits(phone):
+    return re.sub(r'\D', '', phone or '')
+
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+FIELDS = {
+    'visit': ('Visit', lambda visit: {
+        'owner_id': visit.sales_person_id,
+        'date': visit.visit_date,
+        'title': visit.location,
+        'body': _join(visit.feedback, visit.follow_up_notes, visit.existing_provider_name),
+    }),
+    'prospect': ('Prospect', lambda prospect: {
+        'owner_id': prospect.added_by_id,
+        'date': prospect.created_at.date() if prospect.created_at else None,
+        'title': prospect.full_name,
+        'body': _join(prospect.phone, _digits(prospect.phone), prospect.email, prospect.address, prospect.location),
+    }),
+    'customer': ('Customer', lambda customer: {
+        'owner_id': None,
+        'date': None,
+        'title': customer.full_name,
+        'body': _join(customer.phone, _digits(customer.phone), customer.email, customer.address, customer.id_number),
+    }),
+}
+
+
+def backfill_search_documents(apps, schema_editor):
+    """
+    Index the visits, prospects and customers saved before 0005 added the
+    search index, which its signals only fill for rows written since. Rows
+    that already have a document are left alone, so this is safe to re-run.
+    """
+    SearchDocument = apps.get_model('zakcomapp', 'SearchDocument')
+    SearchTerm = apps.get_model('zakcomapp', 'SearchTerm')
+    using = schema_editor.connection.alias
+    # Postgres generates the search_vector column itself
+    postings = schema_editor.connection.vendor != 'postgresql'
+
+    def write(batch):
+        documents = SearchDocument.objects.using(using).bulk_create(batch)
+        if not postings:
+            return
+        terms = []
+        for document in documents:
+            # Tokenized exactly as search.find() tokenizes queries, or they wouldn't match
+            weights = {}
+            for term in tokenize(document.title):
+                weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+            for term in tokenize(document.body):
+                weights[term] = weights.get(term, 0) + BODY_WEIGHT
+            terms.extend(SearchTerm(term=term, document=document, weight=weight) for term, weight in weights.items())
+        SearchTerm.objects.using(using).bulk_create(terms, batch_size=BATCH_SIZE)
+
+    for kind, (model_name, fields) in FIELDS.items():
+        model = apps.get_model('zakcomapp', model_name)
+        indexed = SearchDocument.objects.using(using).filter(kind=kind).values('object_id')
+        batch = []
+        for instance in model.objects.using(using).exclude(pk__in=indexed).order_by('pk').iterator(chunk_size=BATCH_SIZE):
+            batch.append(SearchDocument(kind=kind, object_id=instance.pk, **fields(instance)))
+            if len(batch) == BATCH_SIZE:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0011_commissions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:26
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_cancelled_at(apps, schema_editor):
+    # The last edit is the best record of when sales cancelled before now were cancelled
+    Sale = apps.get_model('zakcomapp', 'Sale')
+    Sale.objects.filter(status='cancelled', cancelled_at__isnull=True).update(cancelled_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zakcomapp', '0012_backfill_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='cancelled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_cancelled_at, migrations.RunPython.noop),
+    ]
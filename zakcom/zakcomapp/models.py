@@ -16,6 +16,24 @@ class InternetPackage(models.Model):
         return f"{self.name} - {self.speed}"
 
 
+class Territory(models.Model):
+    """
+    A named area that free-text visit and prospect locations are mapped to
+    (see territories.py), so they can be grouped by an indexed foreign key.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    # Other spellings and estates within it, one per line. Existing rows
+    # pick up changes when ``manage.py assign_territories`` runs.
+    aliases = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
 class Prospect(models.Model):
     """Potential customers that have been visited"""
     INTEREST_LEVEL_CHOICES = [
@@ -28,9 +46,14 @@ class Prospect(models.Model):
 
     full_name = models.CharField(max_length=200)
     phone = models.CharField(max_length=20)
+    # phones.normalize(phone), set on save; repeat visits find the prospect by it
+    phone_key = models.CharField(max_length=20, blank=True, editable=False)
     email = models.EmailField(blank=True, null=True)
     address = models.TextField()
     location = models.CharField(max_length=200, help_text="Area/Estate/Building")
+    # Matched from location on save
+    territory = models.ForeignKey(Territory, on_delete=models.SET_NULL, null=True, blank=True,
+                                  editable=False, related_name='prospects')
 
     interest_level = models.CharField(max_length=20, choices=INTEREST_LEVEL_CHOICES, default='neutral')
     preferred_package = models.ForeignKey(InternetPackage, on_delete=models.SET_NULL, null=True, blank=True)
@@ -39,6 +62,14 @@ class Prospect(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['added_by', 'interest_level'], name='prospect_owner_interest_idx'),
+            # Keyset pagination on prospect_list
+            models.Index(fields=['-created_at', '-id'], name='prospect_keyset_idx'),
+            models.Index(fields=['phone_key'], name='prospect_phone_key_idx'),
+        ]
+
     def __str__(self):
         return f"{self.full_name} - {self.location}"
 
@@ -60,6 +91,9 @@ class Visit(models.Model):
     visit_date = models.DateField(default=timezone.now)
     visit_time = models.TimeField(default=timezone.now)
     location = models.CharField(max_length=200, help_text="Area/Estate/Building visited")
+    # Matched from location on save
+    territory = models.ForeignKey(Territory, on_delete=models.SET_NULL, null=True, blank=True,
+                                  editable=False, related_name='visits')
 
     outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
     feedback = models.TextField(help_text="Customer feedback and comments")
@@ -78,11 +112,68 @@ class Visit(models.Model):
 
     class Meta:
         ordering = ['-visit_date', '-visit_time']
+        indexes = [
+            models.Index(fields=['sales_person', 'visit_date'], name='visit_person_date_idx'),
+            models.Index(fields=['visit_date', 'outcome'], name='visit_date_outcome_idx'),
+            # Follow-up queue on the sales dashboard
+            models.Index(fields=['sales_person', 'follow_up_date'], name='visit_follow_up_idx',
+                         condition=models.Q(outcome='follow_up')),
+            # Objection counts and competitor breakdowns only touch flagged visits
+            models.Index(fields=['visit_date'], name='visit_price_concern_idx',
+                         condition=models.Q(price_concern=True)),
+            models.Index(fields=['visit_date'], name='visit_coverage_concern_idx',
+                         condition=models.Q(coverage_concern=True)),
+            models.Index(fields=['visit_date'], name='visit_existing_provider_idx',
+                         condition=models.Q(has_existing_provider=True)),
+            # Keyset pagination on visit_list
+            models.Index(fields=['-visit_date', '-visit_time', '-id'], name='visit_keyset_idx'),
+            # Per-territory aggregates over a date range
+            models.Index(fields=['territory', 'visit_date'], name='visit_territory_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sales_person.username} - {self.location} - {self.visit_date}"
 
 
+class FollowUp(models.Model):
+    """
+    An open call-back from a visit that needs one, queued for its sales
+    person by due date (see followups.py). Kept in step with
+    ``Visit.follow_up_date`` on save and refreshed daily by
+    ``manage.py refresh_follow_ups``.
+    """
+    OPEN = 'open'
+    DONE = 'done'
+    MISSED = 'missed'
+    STATE_CHOICES = [
+        (OPEN, 'Open'),
+        (DONE, 'Done'),
+        (MISSED, 'Missed'),
+    ]
+
+    visit = models.OneToOneField(Visit, on_delete=models.CASCADE, related_name='follow_up')
+    sales_person = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_ups')
+    due_date = models.DateField()
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=OPEN)
+    snoozes = models.PositiveIntegerField(default=0)
+
+    # The later visit to the same prospect that settled it, if any
+    resolved_by = models.ForeignKey(Visit, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # A rep's queue is one range read: equality columns first
+            models.Index(fields=['sales_person', 'state', 'due_date'], name='follow_up_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sales_person.username} - {self.visit.location} - {self.due_date} ({self.state})"
+
+
 class Customer(models.Model):
     full_name = models.CharField(max_length=200)
     phone = models.CharField(max_length=20)
@@ -123,9 +214,17 @@ class Sale(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # When the status became cancelled; clawbacks are dated by it
+    cancelled_at = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['sales_person', 'sale_date'], name='sale_person_date_idx'),
+            # Keyset pagination on sale_list
+            models.Index(fields=['-created_at', '-id'], name='sale_keyset_idx'),
+            models.Index(fields=['sales_person', '-created_at', '-id'], name='sale_person_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"{self.customer.full_name} - {self.package.name}"
@@ -133,6 +232,11 @@ class Sale(models.Model):
     def save(self, *args, **kwargs):
         if not self.total_value:
             self.total_value = (self.package.monthly_price * self.contract_duration) + self.package.installation_fee
+        # Stamped by the save that cancels the sale and kept by later edits
+        if self.status == 'cancelled':
+            self.cancelled_at = self.cancelled_at or timezone.now()
+        else:
+            self.cancelled_at = None
         super().save(*args, **kwargs)
 
 
@@ -151,3 +255,233 @@ class SalesTarget(models.Model):
 
     def __str__(self):
         return f"{self.sales_person.username} - {self.month.strftime('%B %Y')}"
+
+
+class CommissionRate(models.Model):
+    """Commission on a package's sales, as a percentage of the sale's total value.
+
+    The rate in force for a sale is the one with the latest ``valid_from`` on
+    or before its sale date. Contracts of at least ``long_contract_months``
+    earn ``long_contract_rate`` instead, when one is set.
+    """
+    package = models.ForeignKey(InternetPackage, on_delete=models.CASCADE, related_name='commission_rates')
+    valid_from = models.DateField()
+    rate = models.DecimalField(max_digits=5, decimal_places=2)
+    long_contract_months = models.PositiveIntegerField(default=24)
+    long_contract_rate = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        unique_together = ['package', 'valid_from']
+        ordering = ['package', '-valid_from']
+
+    def __str__(self):
+        return f"{self.package.name} from {self.valid_from}: {self.rate}%"
+
+
+class CommissionTier(models.Model):
+    """A multiplier on a rep's commission for reaching a share of their monthly target.
+
+    Tiers without a target apply to every target that has none of its own.
+    """
+    target = models.ForeignKey(SalesTarget, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='commission_tiers')
+    # Percentage of the target amount achieved
+    attainment = models.DecimalField(max_digits=6, decimal_places=2)
+    multiplier = models.DecimalField(max_digits=4, decimal_places=2)
+
+    class Meta:
+        unique_together = ['target', 'attainment']
+        ordering = ['target', 'attainment']
+
+    def __str__(self):
+        return f"{self.attainment}% of {self.target or 'any target'}: x{self.multiplier}"
+
+
+class CommissionEntry(models.Model):
+    """One line of the commission ledger: a sale's commission earned or clawed back in a month.
+
+    Written by ``manage.py run_commissions`` (see commissions.py), which
+    replaces a month's lines each time it runs.
+    """
+    EARNED = 'earned'
+    CLAWBACK = 'clawback'
+    KIND_CHOICES = [
+        (EARNED, 'Earned'),
+        (CLAWBACK, 'Clawback'),
+    ]
+
+    month = models.DateField()
+    sales_person = models.ForeignKey(User, on_delete=models.CASCADE, related_name='commission_entries')
+    sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='commission_entries')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+
+    base = models.DecimalField(max_digits=14, decimal_places=2)
+    rate = models.DecimalField(max_digits=5, decimal_places=2)
+    multiplier = models.DecimalField(max_digits=4, decimal_places=2)
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['month', 'sale', 'kind']
+        indexes = [
+            models.Index(fields=['month', 'sales_person'], name='commission_month_person_idx'),
+        ]
+        verbose_name_plural = 'commission entries'
+
+    def __str__(self):
+        return f"{self.month.strftime('%B %Y')} - {self.sale_id} - {self.kind}: {self.amount}"
+
+
+class MonthlyStanding(models.Model):
+    """A sales person's figures and place on the team leaderboard for a month.
+
+    Frozen when the month is closed (see leaderboard.py), so past months are
+    reviewed as they stood rather than recomputed. The total_* figures are
+    all-time up to the end of the month.
+    """
+    month = models.DateField()
+    sales_person = models.ForeignKey(User, on_delete=models.CASCADE, related_name='standings')
+
+    rank = models.PositiveIntegerField()
+    period_sales = models.IntegerField(default=0)
+    period_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    period_visits = models.IntegerField(default=0)
+    conversion_rate = models.FloatField(default=0)
+
+    total_rank = models.PositiveIntegerField()
+    total_sales = models.IntegerField(default=0)
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_visits = models.IntegerField(default=0)
+    total_conversion_rate = models.FloatField(default=0)
+
+    closed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['month', 'sales_person']
+        indexes = [
+            # A closed month's leaderboard, in order
+            models.Index(fields=['month', 'rank'], name='standing_month_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.month.strftime('%B %Y')} - #{self.rank} {self.sales_person_id}"
+
+
+class DailySalesRollup(models.Model):
+    """Pre-aggregated sales per day, sales person, package and status.
+
+    Kept up to date from Sale save/delete signals (see rollups.py) and
+    rebuilt with ``manage.py rebuild_rollups``.
+    """
+    date = models.DateField()
+    sales_person = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sales_rollups')
+    package = models.ForeignKey(InternetPackage, on_delete=models.CASCADE, related_name='sales_rollups')
+    status = models.CharField(max_length=20, choices=Sale.STATUS_CHOICES)
+
+    sales_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ['date', 'sales_person', 'package', 'status']
+        indexes = [
+            models.Index(fields=['sales_person', 'date'], name='sales_rollup_person_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.sales_person_id} - {self.package_id} - {self.status}"
+
+
+class DailyVisitRollup(models.Model):
+    """Pre-aggregated visits per day, sales person and outcome.
+
+    Kept up to date from Visit save/delete signals (see rollups.py) and
+    rebuilt with ``manage.py rebuild_rollups``.
+    """
+    date = models.DateField()
+    sales_person = models.ForeignKey(User, on_delete=models.CASCADE, related_name='visit_rollups')
+    outcome = models.CharField(max_length=20, choices=Visit.OUTCOME_CHOICES)
+
+    visits_count = models.IntegerField(default=0)
+    price_concerns = models.IntegerField(default=0)
+    coverage_concerns = models.IntegerField(default=0)
+    existing_providers = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['date', 'sales_person', 'outcome']
+        indexes = [
+            models.Index(fields=['sales_person', 'date'], name='visit_rollup_person_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.sales_person_id} - {self.outcome}"
+
+
+class SearchDocument(models.Model):
+    """The searchable text of one Visit, Prospect or Customer.
+
+    Kept up to date from save/delete signals (see search.py) and rebuilt with
+    ``manage.py rebuild_search_index``. On Postgres the table also has a
+    generated ``search_vector`` tsvector column with a GIN index (added in
+    migration 0005, outside the model); elsewhere ``SearchTerm`` rows index it.
+    """
+    KIND_CHOICES = [
+        ('visit', 'Visit'),
+        ('prospect', 'Prospect'),
+        ('customer', 'Customer'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    # Who may find it besides staff; customers are reached through their sales
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    date = models.DateField(null=True, blank=True)
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ['kind', 'object_id']
+        indexes = [
+            models.Index(fields=['owner', 'kind'], name='search_doc_owner_kind_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} - {self.title}"
+
+
+class SearchTerm(models.Model):
+    """One posting of the portable inverted index used where Postgres full-text search isn't"""
+    term = models.CharField(max_length=64)
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='terms')
+    weight = models.IntegerField()
+
+    class Meta:
+        unique_together = ['term', 'document']
+
+    def __str__(self):
+        return f"{self.term} - {self.document_id}"
+
+
+class DailyObjectionRollup(models.Model):
+    """Pre-aggregated visits and objections per day, location and competitor.
+
+    Locations and provider names are normalized first (see objections.py),
+    so "MTN" and " mtn" share a bucket. Kept up to date from Visit
+    save/delete signals (see rollups.py) and rebuilt with
+    ``manage.py rebuild_rollups``.
+    """
+    date = models.DateField()
+    location = models.CharField(max_length=200)
+    # Blank when the visit named no existing provider
+    provider = models.CharField(max_length=100, blank=True)
+
+    visits_count = models.IntegerField(default=0)
+    price_concerns = models.IntegerField(default=0)
+    coverage_concerns = models.IntegerField(default=0)
+    existing_providers = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['date', 'location', 'provider']
+
+    def __str__(self):
+        return f"{self.date} - {self.location} - {self.provider or 'no provider'}"
@@ -0,0 +1,124 @@
+"""Objection and competitor analytics.
+
+Everything here reads the rollup tables: concern totals, the competitors
+named and the per-location breakdown come from ``DailyObjectionRollup``
+(one grouped query each), the per-rep breakdown and weekly trend from
+``DailyVisitRollup``. Free-text locations and provider names are
+normalized before they are rolled up, so "MTN", "mtn " and "MTN Uganda Ltd"
+count as one competitor.
+"""
+import re
+
+from django.db.models.functions import TruncWeek
+
+from .analytics import COUNT_FIELD, date_filters, total
+from .models import DailyObjectionRollup, DailyVisitRollup
+
+# Measures of both rollups, named as in the feedback_analysis template
+MEASURES = {
+    'visits': 'visits_count',
+    'price_concern': 'price_concerns',
+    'coverage_concern': 'coverage_concerns',
+    'has_existing_provider': 'existing_providers',
+}
+CONCERNS = ['price_concern', 'coverage_concern', 'has_existing_provider']
+# Dropped from the end of provider names: "MTN Uganda Ltd" is MTN
+COMPANY_SUFFIXES = {'uganda', 'ug', 'ltd', 'limited', 'plc', 'inc', 'co', 'company'}
+PROVIDER_LENGTH = DailyObjectionRollup._meta.get_field('provider').max_length
+LOCATION_LENGTH = DailyObjectionRollup._meta.get_field('location').max_length
+
+
+def normalize_provider(name):
+    """Canonical spelling of a competitor's name, or '' for none"""
+    words = re.sub(r'[^\w&+]+', ' ', name or '').casefold().split()
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    label = ' '.join(words)
+    # Short single words are acronyms: MTN, UTL
+    label = label.upper() if len(words) == 1 and len(label) <= 3 else label.title()
+    return label[:PROVIDER_LENGTH]
+
+
+def normalize_location(location):
+    """Location with its whitespace collapsed and case evened out"""
+    return ' '.join((location or '').split()).title()[:LOCATION_LENGTH]
+
+
+def _sums():
+    return {name: total(field, COUNT_FIELD) for name, field in MEASURES.items()}
+
+
+def _rates(row):
+    visits = row['visits']
+    return {concern: round(row[concern] / visits * 100, 1) if visits else 0 for concern in CONCERNS}
+
+
+def by_provider(start=None, end=None):
+    """Measures per normalized provider ('' for none named), most visits first"""
+    return list(DailyObjectionRollup.objects.filter(**date_filters('date', start, end)).values(
+        'provider',
+    ).annotate(**_sums()).order_by('-visits', 'provider'))
+
+
+def summary(start=None, end=None):
+    """
+    Concern totals and the competitors named, both from one grouped query:
+    ``{'totals': {...}, 'rates': {...}, 'competitors': [{'provider', 'mentions', 'share'}]}``
+    """
+    rows = by_provider(start, end)
+    totals = {name: sum(row[name] for row in rows) for name in MEASURES}
+    named = sum(row['has_existing_provider'] for row in rows if row['provider'])
+    competitors = sorted((
+        {
+            'provider': row['provider'],
+            'mentions': row['has_existing_provider'],
+            'share': round(row['has_existing_provider'] / named * 100, 1),
+        }
+        for row in rows if row['provider'] and row['has_existing_provider']
+    ), key=lambda competitor: (-competitor['mentions'], competitor['provider']))
+    return {'totals': totals, 'rates': _rates(totals), 'competitors': competitors}
+
+
+def by_location(start=None, end=None, limit=None):
+    """Measures and concern rates per normalized location (as ``name``), busiest first"""
+    rows = DailyObjectionRollup.objects.filter(**date_filters('date', start, end)).values(
+        'location',
+    ).annotate(**_sums()).order_by('-visits', 'location')
+    if limit:
+        rows = rows[:limit]
+    return [{**row, 'name': row['location'], 'rates': _rates(row)} for row in rows]
+
+
+def by_rep(start=None, end=None):
+    """Measures and concern rates per sales person (username as ``name``), busiest first"""
+    rows = DailyVisitRollup.objects.filter(**date_filters('date', start, end)).values(
+        'sales_person', 'sales_person__username',
+    ).annotate(**_sums()).order_by('-visits', 'sales_person__username')
+    return [{**row, 'name': row['sales_person__username'], 'rates': _rates(row)} for row in rows]
+
+
+def weekly_trend(start=None, end=None):
+    """
+    Measures and concern rates per week (starting Monday), oldest first, with
+    each rate's change in percentage points from the week before (``changes``,
+    None for the first week) and both paired up in ``trend`` for templates.
+    """
+    rows = DailyVisitRollup.objects.filter(**date_filters('date', start, end)).annotate(
+        week=TruncWeek('date'),
+    ).values('week').annotate(**_sums()).order_by('week')
+
+    weeks, previous = [], None
+    for row in rows:
+        rates = _rates(row)
+        changes = {
+            concern: round(rates[concern] - previous[concern], 1) if previous else None
+            for concern in CONCERNS
+        }
+        weeks.append({
+            **row,
+            'rates': rates,
+            'changes': changes,
+            'trend': [(rates[concern], changes[concern]) for concern in CONCERNS],
+        })
+        previous = rates
+    return weeks
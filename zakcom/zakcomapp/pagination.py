@@ -0,0 +1,161 @@
+"""Keyset (cursor) pagination for the list views.
+
+Pages are located by seeking past the ordering values of the last row seen
+rather than with OFFSET, so page 5000 costs the same as page 1 when the
+ordering is backed by an index. Ordering fields must be non-nullable and
+end in a unique field (normally ``id``) so every row has a distinct key.
+"""
+import base64
+import json
+
+from django.core.paginator import InvalidPage
+from django.db import connections
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+COUNT_CAP = 10000
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None,
+                 count=None, count_is_exact=True):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+        self.count_is_exact = count_is_exact
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by ``ordering`` (e.g. ``('-visit_date', '-id')``).
+
+    ``count`` can be ``None`` (no total), ``'exact'`` or ``'approximate'``
+    (see ``approximate_count``).
+    """
+
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PAGE_SIZE, count=None):
+        self.queryset = queryset
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        self.fields = [queryset.model._meta.get_field(name) for name, _ in self.ordering]
+        self.per_page = per_page
+        self.count_mode = count
+
+    def page(self, after=None, before=None):
+        if after and before:
+            raise InvalidCursor("Pass either 'after' or 'before', not both")
+        if before:
+            rows, more = self._fetch(self.decode(before), forward=False)
+            rows.reverse()
+            next_cursor = self.encode(rows[-1]) if rows else None
+            previous_cursor = self.encode(rows[0]) if more else None
+        else:
+            rows, more = self._fetch(self.decode(after) if after else None, forward=True)
+            next_cursor = self.encode(rows[-1]) if more else None
+            previous_cursor = self.encode(rows[0]) if after and rows else None
+
+        count, exact = None, True
+        if self.count_mode == 'exact':
+            count = self.queryset.count()
+        elif self.count_mode == 'approximate':
+            count, exact = approximate_count(self.queryset)
+        return KeysetPage(rows, next_cursor, previous_cursor, count, exact)
+
+    def page_from_request(self, request):
+        """Page for the ``after``/``before`` GET parameters, first page if they are bad"""
+        try:
+            return self.page(after=request.GET.get('after'), before=request.GET.get('before'))
+        except InvalidCursor:
+            return self.page()
+
+    def encode(self, obj):
+        values = [field.value_to_string(obj) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [field.to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor("Invalid page cursor")
+
+    def _fetch(self, values, forward):
+        order_by = [
+            f'-{name}' if descending == forward else name
+            for name, descending in self.ordering
+        ]
+        queryset = self.queryset.order_by(*order_by)
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def _seek(self, values, forward):
+        """
+        WHERE clause for rows strictly past ``values`` in the walk direction:
+        (a > x) OR (a = x AND b > y) OR ... with a leading a >= x bound so
+        the database can range-scan the index.
+        """
+        def lookup(name, descending, strict):
+            op = 'lt' if descending == forward else 'gt'
+            return f'{name}__{op}' if strict else f'{name}__{op}e'
+
+        (first, first_desc), first_value = self.ordering[0], values[0]
+        seek = Q()
+        for i, ((name, descending), value) in enumerate(zip(self.ordering, values)):
+            equal = {prev: prev_value for (prev, _), prev_value in zip(self.ordering[:i], values[:i])}
+            seek |= Q(**equal, **{lookup(name, descending, strict=True): value})
+        return Q(**{lookup(first, first_desc, strict=False): first_value}) & seek
+
+
+def approximate_count(queryset, cap=COUNT_CAP):
+    """
+    Cheap row count as ``(count, is_exact)``.
+
+    Counts exactly up to ``cap`` rows, which is bounded work. Past that,
+    PostgreSQL's planner estimate is used; other databases report ``cap``.
+    """
+    bounded = queryset.order_by()[:cap + 1].count()
+    if bounded <= cap:
+        return bounded, True
+
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]['Plan']['Plan Rows']), cap), False
+    return cap, False
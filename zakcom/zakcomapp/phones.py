@@ -0,0 +1,38 @@
+"""Phone number normalization.
+
+Numbers are typed every which way ("0700 123456", "+256-700-123-456",
+"256700123456"), so prospects are matched on a canonical E.164-style key
+instead: "+", the country code and the subscriber number, digits only.
+Numbers without a country code are taken to be local to
+``settings.PHONE_COUNTRY_CODE``.
+"""
+import re
+
+from django.conf import settings
+
+# E.164 allows at most 15 digits; a little slack for extensions typed inline
+MAX_DIGITS = 19
+
+
+def normalize(phone):
+    """The E.164-style key for ``phone``, or '' when it has no digits"""
+    phone = (phone or '').strip()
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return ''
+
+    country = settings.PHONE_COUNTRY_CODE
+    if phone.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        # International dialling prefix
+        digits = digits[2:]
+    elif digits.startswith('0'):
+        # Trunk prefix of a local number
+        digits = country + digits[1:]
+    elif len(digits) <= settings.PHONE_NATIONAL_LENGTH:
+        digits = country + digits
+    if digits.startswith(country + '0'):
+        # "+256 (0)700 ..." keeps the trunk prefix after the country code
+        digits = country + digits[len(country) + 1:]
+    return '+' + digits[:MAX_DIGITS]
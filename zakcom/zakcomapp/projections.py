@@ -0,0 +1,95 @@
+"""Monthly recurring revenue projected from the active contracts.
+
+A sale stores its whole contract as ``total_value``; its monthly revenue is
+that less the package's installation fee, spread over ``contract_duration``
+months starting from the installation date (the sale date until installed).
+``project`` turns every installed or active contract into three curves
+over the coming months:
+
+* ``mrr``: revenue billed each month by contracts still running;
+* ``expiring``: the part of it in its contract's last month, i.e. what is
+  lost the month after unless renewed;
+* ``renewals_due``: contracts entering their last ``RENEWAL_LEAD_MONTHS``
+  months, i.e. the renewal calls to make each month.
+
+Contracts are first grouped in SQL by start month and duration, so the
+arrays are a few hundred rows however many sales there are. The curves are
+then built from them with difference arrays.
+"""
+from datetime import date
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear, Greatest
+
+from .models import Sale
+
+ACTIVE_STATUSES = ['installed', 'active']
+HORIZON_MONTHS = 24
+MAX_HORIZON_MONTHS = 60
+RENEWAL_LEAD_MONTHS = 2
+
+MONTHLY_FIELD = DecimalField(max_digits=14, decimal_places=2)
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def month_of(index):
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def contract_groups(first_month):
+    """
+    ``(start, end, monthly, contracts)`` per start month and duration for the
+    active contracts still running in or after ``first_month`` (a month
+    index); ``end`` is the index of the first month no longer billed.
+    """
+    start = Coalesce('installation_date', 'sale_date')
+    rows = Sale.objects.filter(status__in=ACTIVE_STATUSES, contract_duration__gt=0).annotate(
+        start_index=ExtractYear(start) * 12 + ExtractMonth(start) - 1,
+    ).annotate(
+        end_index=F('start_index') + F('contract_duration'),
+        monthly=ExpressionWrapper(
+            Greatest(F('total_value') - F('package__installation_fee'), Value(0)) / F('contract_duration'),
+            output_field=MONTHLY_FIELD,
+        ),
+    ).filter(end_index__gt=first_month).values('start_index', 'end_index').annotate(
+        revenue=Sum('monthly'), contracts=Count('id'),
+    ).order_by().values_list('start_index', 'end_index', 'revenue', 'contracts')
+    return [(start, end, float(revenue or 0), contracts) for start, end, revenue, contracts in rows]
+
+
+def _curves(groups, first, months):
+    """``(mrr, expiring, renewals_due)`` for ``months`` months from ``first`` (a month index)"""
+    mrr, expiring, renewals = [0.0] * (months + 1), [0.0] * months, [0] * months
+    for start, end, revenue, contracts in groups:
+        mrr[min(max(start - first, 0), months)] += revenue
+        mrr[min(max(end - first, 0), months)] -= revenue
+        last = end - 1 - first
+        if 0 <= last < months:
+            expiring[last] += revenue
+        due = last - RENEWAL_LEAD_MONTHS + 1
+        if 0 <= due < months:
+            renewals[due] += contracts
+    running = 0.0
+    for i in range(months):
+        running += mrr[i]
+        mrr[i] = running
+    return mrr[:months], expiring, renewals
+
+
+def project(today, months=HORIZON_MONTHS):
+    """
+    ``{'months': [first day, ...], 'mrr': [...], 'expiring': [...],
+    'renewals_due': [...]}`` for ``months`` months from the one ``today``
+    is in, amounts rounded to whole shillings.
+    """
+    first = month_index(today)
+    mrr, expiring, renewals = _curves(contract_groups(first), first, months)
+    return {
+        'months': [month_of(first + i) for i in range(months)],
+        'mrr': [round(value) for value in mrr],
+        'expiring': [round(value) for value in expiring],
+        'renewals_due': renewals,
+    }
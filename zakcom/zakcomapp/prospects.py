@@ -0,0 +1,140 @@
+"""Matching visits to existing prospects, and merging duplicate prospects.
+
+Prospects are identified by their normalized phone number (``phone_key``,
+see phones.py), which is indexed, so a repeat visit finds the household's
+prospect with one lookup. Duplicates recorded before that are found by
+``duplicate_groups``: rows are blocked by ``phone_key`` and, within a block,
+clustered by how alike the names are, so two people sharing a household
+phone are not merged into one.
+"""
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import phones
+from .models import Customer, Prospect, Visit
+
+# Lowest to highest; a merged prospect keeps the highest of its rows
+INTEREST_RANK = ['not_interested', 'neutral', 'interested', 'very_interested', 'converted']
+# Names at least this alike (difflib ratio) are taken to be one person
+NAME_SIMILARITY = 0.8
+# log_visit's stand-in for an address that wasn't given
+NO_ADDRESS = 'Not provided'
+# What a repeat visit can change
+REVISIT_FIELDS = ['interest_level', 'email', 'preferred_package', 'updated_at']
+
+
+def find(phone, full_name=None):
+    """
+    The prospect with ``phone`` in any format (the oldest, if duplicated),
+    or None. Given ``full_name``, only a prospect that is the same person
+    counts, since a household can share a number.
+    """
+    key = phones.normalize(phone)
+    if not key:
+        return None
+    for prospect in Prospect.objects.filter(phone_key=key).order_by('created_at', 'pk'):
+        if full_name is None or same_person(full_name, prospect.full_name):
+            return prospect
+    return None
+
+
+def higher_interest(*levels):
+    return max(levels, key=INTEREST_RANK.index)
+
+
+def apply_revisit(prospect, interest_level, email='', preferred_package_id=None):
+    """
+    Update an existing prospect from a repeat visit, without saving it:
+    interest only ever goes up, and details given now fill in ones left
+    blank before.
+    """
+    prospect.interest_level = higher_interest(prospect.interest_level, interest_level)
+    prospect.email = prospect.email or email or None
+    prospect.preferred_package_id = prospect.preferred_package_id or preferred_package_id
+
+
+def revisit(prospect, interest_level, email='', preferred_package_id=None):
+    """``apply_revisit`` and save the prospect"""
+    apply_revisit(prospect, interest_level, email, preferred_package_id)
+    prospect.save(update_fields=REVISIT_FIELDS)
+
+
+def _name(full_name):
+    return ' '.join(full_name.casefold().split())
+
+
+def same_person(a, b, threshold=NAME_SIMILARITY):
+    """
+    Whether two names on one phone number belong to the same person: all of
+    one's words are in the other ("Okello", "Joseph Okello") or they are
+    spelt alike ("Jospeh Okelo").
+    """
+    a, b = _name(a), _name(b)
+    words_a, words_b = set(a.split()), set(b.split())
+    if words_a and words_b and (words_a <= words_b or words_b <= words_a):
+        return True
+    return SequenceMatcher(None, a, b).ratio() >= threshold
+
+
+def cluster(prospects, threshold=NAME_SIMILARITY):
+    """Split prospects sharing a phone number into groups of the same person, oldest first"""
+    groups = []
+    for prospect in sorted(prospects, key=lambda prospect: (prospect.created_at, prospect.pk)):
+        for group in groups:
+            if any(same_person(prospect.full_name, member.full_name, threshold) for member in group):
+                group.append(prospect)
+                break
+        else:
+            groups.append([prospect])
+    return [group for group in groups if len(group) > 1]
+
+
+def duplicate_groups(threshold=NAME_SIMILARITY, batch_size=1000):
+    """
+    Yield lists of prospects that are one person, oldest first. Only phone
+    numbers held by more than one prospect are looked at, found with one
+    grouped query; their prospects are then loaded ``batch_size`` numbers at
+    a time.
+    """
+    keys = Prospect.objects.exclude(phone_key='').values('phone_key').annotate(
+        rows=Count('id'),
+    ).filter(rows__gt=1).order_by('phone_key').values_list('phone_key', flat=True)
+
+    keys = list(keys)
+    for i in range(0, len(keys), batch_size):
+        blocks = {}
+        for prospect in Prospect.objects.filter(phone_key__in=keys[i:i + batch_size]):
+            blocks.setdefault(prospect.phone_key, []).append(prospect)
+        for block in blocks.values():
+            yield from cluster(block, threshold)
+
+
+@transaction.atomic
+def merge(group):
+    """
+    Fold a group of duplicate prospects into one and return it. The one that
+    became a customer survives (otherwise the oldest); the others' visits
+    move to it and their details fill in its blanks before they are deleted.
+    A group with more than one customer is left alone and None is returned.
+    """
+    converted = set(Customer.objects.filter(prospect__in=group).values_list('prospect_id', flat=True))
+    if len(converted) > 1:
+        return None
+    keep = next((prospect for prospect in group if prospect.pk in converted), group[0])
+    duplicates = [prospect for prospect in group if prospect is not keep]
+
+    for duplicate in duplicates:
+        keep.interest_level = higher_interest(keep.interest_level, duplicate.interest_level)
+        keep.email = keep.email or duplicate.email
+        keep.preferred_package_id = keep.preferred_package_id or duplicate.preferred_package_id
+        if keep.address in ('', NO_ADDRESS):
+            keep.address = duplicate.address
+        keep.location = keep.location or duplicate.location
+
+    ids = [duplicate.pk for duplicate in duplicates]
+    Visit.objects.filter(prospect_id__in=ids).update(prospect=keep)
+    Prospect.objects.filter(pk__in=ids).delete()
+    keep.save()
+    return keep
@@ -0,0 +1,219 @@
+"""Per-request SQL query budgets.
+
+``QueryBudgetMiddleware`` counts the statements each request runs and logs a
+warning when a view goes over its budget (or raises, with
+``QUERY_BUDGET_STRICT = True``, so test runs fail loudly). Budgets come from
+settings::
+
+    QUERY_BUDGET = 30                          # default for every view
+    QUERY_BUDGETS = {'admin_dashboard': 40}    # per URL name overrides
+
+``assert_max_queries`` is the equivalent for tests that call code directly.
+
+Statements are counted per context rather than per connection: every
+connection gets one execute wrapper when it is created, which records into
+whichever counters are active in the calling context. Threads started with
+``sync_to_async`` inherit that context, so the queries ``concurrency.gather``
+runs on its pool threads count towards the request that started them. A
+streamed body runs after the view has returned; the middleware counts each
+of its chunks against the budget on its own, since a stream's total grows
+with how long it stays open.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import FileResponse
+
+logger = logging.getLogger(__name__)
+
+_active = ContextVar('zakcomapp_query_counters', default=())
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryCounter:
+    """The statements run while the counter is active, with their durations"""
+
+    def __init__(self):
+        self.queries = []
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+
+def _record(execute, sql, params, many, context):
+    counters = _active.get()
+    if not counters:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for counter in counters:
+            counter.queries.append((sql, duration))
+
+
+def _install(connection, **kwargs):
+    # First, so an execute_wrapper() block open on the connection still pops its own
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record)
+
+
+connection_created.connect(_install)
+
+
+@contextmanager
+def counting(*counters):
+    """Record the statements run in this context into ``counters`` inside the block"""
+    for connection in connections.all():
+        _install(connection)
+    token = _active.set(_active.get() + counters)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+@contextmanager
+def count_queries():
+    """
+    Record every statement run on any database inside the block, including
+    in threads it starts through ``sync_to_async``
+    """
+    counter = QueryCounter()
+    with counting(counter):
+        yield counter
+
+
+def streams_queries(response):
+    """
+    Whether ``response`` has a streamed body that may run queries. A
+    ``FileResponse`` doesn't, and is left alone so WSGI servers can still
+    send its file with ``wsgi.file_wrapper``.
+    """
+    return response.streaming and not isinstance(response, FileResponse)
+
+
+def count_streamed(content, counter, on_chunk=None, on_close=None):
+    """
+    Streaming response ``content``, recording the statements run to produce
+    each chunk in ``counter``. ``on_chunk`` is called with how many there
+    were after every chunk, ``on_close`` once the stream ends or is closed.
+    """
+    def produced(seen):
+        if on_chunk is not None:
+            on_chunk(counter.count - seen)
+
+    def closed():
+        if on_close is not None:
+            on_close()
+
+    if hasattr(content, '__aiter__'):
+        async def chunks():
+            iterator = aiter(content)
+            try:
+                while True:
+                    seen = counter.count
+                    with counting(counter):
+                        try:
+                            chunk = await anext(iterator)
+                        except StopAsyncIteration:
+                            return
+                    produced(seen)
+                    yield chunk
+            finally:
+                closed()
+    else:
+        def chunks():
+            iterator = iter(content)
+            try:
+                while True:
+                    seen = counter.count
+                    with counting(counter):
+                        try:
+                            chunk = next(iterator)
+                        except StopIteration:
+                            return
+                    produced(seen)
+                    yield chunk
+            finally:
+                closed()
+    return chunks()
+
+
+@contextmanager
+def assert_max_queries(budget):
+    """Fail if the block runs more than ``budget`` SQL statements"""
+    with count_queries() as counter:
+        yield counter
+    if counter.count > budget:
+        statements = '\n'.join(f'{i}. {sql}' for i, (sql, _) in enumerate(counter.queries, 1))
+        raise AssertionError(
+            f"{counter.count} queries executed, budget is {budget}:\n{statements}"
+        )
+
+
+def budget_for(url_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    return budgets.get(url_name, getattr(settings, 'QUERY_BUDGET', None))
+
+
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with count_queries() as counter:
+            response = self.get_response(request)
+        return self.check(request, response, counter.count)
+
+    async def __acall__(self, request):
+        with count_queries() as counter:
+            response = await self.get_response(request)
+        return self.check(request, response, counter.count)
+
+    def check(self, request, response, count):
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        budget = budget_for(url_name)
+        if budget is None:
+            return response
+
+        def enforce(count, what=''):
+            if count > budget:
+                message = (
+                    f"{request.method} {request.path} ({url_name or 'unnamed'}) ran "
+                    f"{count} SQL queries{what}, budget is {budget}"
+                )
+                if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+
+        enforce(count)
+        if streams_queries(response):
+            response.streaming_content = count_streamed(
+                response.streaming_content, QueryCounter(),
+                on_chunk=lambda queries: enforce(queries, ' for one chunk of its body'),
+            )
+        return response
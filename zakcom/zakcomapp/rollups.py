@@ -0,0 +1,275 @@
+"""Incremental maintenance of the daily rollup tables.
+
+Every Sale/Visit save moves its contribution from the bucket it used to
+count towards (if any) into the bucket it belongs to now, using atomic
+``F()`` updates so concurrent writers never lose increments. ``rebuild``
+recomputes a date range from scratch for backfills and repairs.
+"""
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+
+from .models import DailyObjectionRollup, DailySalesRollup, DailyVisitRollup, Sale, Visit
+from .objections import normalize_location, normalize_provider
+
+
+def _as_date(model, field, value):
+    # Date fields default to timezone.now, so unsaved values may still be datetimes
+    return model._meta.get_field(field).to_python(value)
+
+
+def _date_range(field, start=None, end=None):
+    filters = {}
+    if start:
+        filters[f'{field}__gte'] = start
+    if end:
+        filters[f'{field}__lte'] = end
+    return filters
+
+
+def sale_contribution(sale):
+    """Rollup key and measures one sale adds to DailySalesRollup"""
+    key = {
+        'date': _as_date(Sale, 'sale_date', sale.sale_date),
+        'sales_person_id': sale.sales_person_id,
+        'package_id': sale.package_id,
+        'status': sale.status,
+    }
+    measures = {
+        'sales_count': 1,
+        'revenue': sale.total_value or 0,
+    }
+    return key, measures
+
+
+def visit_contribution(visit):
+    """Rollup key and measures one visit adds to DailyVisitRollup"""
+    key = {
+        'date': _as_date(Visit, 'visit_date', visit.visit_date),
+        'sales_person_id': visit.sales_person_id,
+        'outcome': visit.outcome,
+    }
+    measures = {
+        'visits_count': 1,
+        'price_concerns': int(visit.price_concern),
+        'coverage_concerns': int(visit.coverage_concern),
+        'existing_providers': int(visit.has_existing_provider),
+    }
+    return key, measures
+
+
+def objection_contribution(visit):
+    """Rollup key and measures one visit adds to DailyObjectionRollup"""
+    _, measures = visit_contribution(visit)
+    key = {
+        'date': _as_date(Visit, 'visit_date', visit.visit_date),
+        'location': normalize_location(visit.location),
+        # A name left over from unticking the box doesn't count
+        'provider': normalize_provider(visit.existing_provider_name) if visit.has_existing_provider else '',
+    }
+    return key, measures
+
+
+# The measure counting rows in each bucket; a bucket at zero counts nothing
+COUNT_FIELDS = {
+    DailySalesRollup: 'sales_count',
+    DailyVisitRollup: 'visits_count',
+    DailyObjectionRollup: 'visits_count',
+}
+
+
+def _apply(rollup_model, key, measures, sign):
+    changes = {field: F(field) + sign * value for field, value in measures.items()}
+    if sign < 0:
+        # Nothing to create when removing: the bucket may already be gone
+        # because its sales person is being deleted. Emptied buckets are
+        # dropped so readers only see the rows ``rebuild`` would write.
+        if rollup_model.objects.filter(**key).update(**changes):
+            rollup_model.objects.filter(**key, **{f'{COUNT_FIELDS[rollup_model]}__lte': 0}).delete()
+        return
+    if rollup_model.objects.filter(**key).update(**changes):
+        return
+    with transaction.atomic():
+        bucket, created = rollup_model.objects.get_or_create(**key, defaults=measures)
+    if not created:
+        rollup_model.objects.filter(pk=bucket.pk).update(**changes)
+
+
+def _move(rollup_model, contribution, instance, previous):
+    key, measures = contribution(instance)
+    if previous is not None:
+        old_key, old_measures = contribution(previous)
+        if (old_key, old_measures) == (key, measures):
+            return
+        _apply(rollup_model, old_key, old_measures, -1)
+    _apply(rollup_model, key, measures, 1)
+
+
+def previous_state(instance):
+    """The stored copy of ``instance`` before it is saved, or None if new"""
+    if instance.pk is None or instance._state.adding:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).first()
+
+
+def record_sale(sale, previous=None):
+    _move(DailySalesRollup, sale_contribution, sale, previous)
+
+
+def discard_sale(sale):
+    key, measures = sale_contribution(sale)
+    _apply(DailySalesRollup, key, measures, -1)
+
+
+def record_visit(visit, previous=None):
+    _move(DailyVisitRollup, visit_contribution, visit, previous)
+    _move(DailyObjectionRollup, objection_contribution, visit, previous)
+
+
+def discard_visit(visit):
+    for rollup_model, contribution in ((DailyVisitRollup, visit_contribution),
+                                       (DailyObjectionRollup, objection_contribution)):
+        key, measures = contribution(visit)
+        _apply(rollup_model, key, measures, -1)
+
+
+def record_visits(visits):
+    """
+    Add many new visits at once, e.g. after ``bulk_create`` (which sends no
+    signals), with a fixed number of statements however many buckets they
+    fall in.
+    """
+    _apply_many(DailyVisitRollup, visit_contribution, visits)
+    _apply_many(DailyObjectionRollup, objection_contribution, visits)
+
+
+# Buckets incremented per UPDATE statement by _apply_many
+UPDATE_BATCH_SIZE = 500
+
+
+def _apply_many(rollup_model, contribution, instances):
+    buckets = {}
+    for instance in instances:
+        key, measures = contribution(instance)
+        totals = buckets.setdefault(tuple(key.items()), dict.fromkeys(measures, 0))
+        for field, value in measures.items():
+            totals[field] += value
+    if not buckets:
+        return
+    # Create the missing buckets empty in one insert (existing ones conflict
+    # and are skipped), then look up every bucket's id in one query
+    rollup_model.objects.bulk_create([rollup_model(**dict(key)) for key in buckets], ignore_conflicts=True)
+    fields = [field for field, _ in next(iter(buckets))]
+    candidates = rollup_model.objects.filter(**{
+        f'{field}__in': {dict(key)[field] for key in buckets} for field in fields
+    }).values_list('pk', *fields)
+    ids = {tuple(zip(fields, row[1:])): row[0] for row in candidates}
+
+    # Still atomic F() increments, with each bucket's amounts picked by id
+    measures = list(next(iter(buckets.values())))
+    for batch in _batched(buckets.items(), UPDATE_BATCH_SIZE):
+        rollup_model.objects.filter(pk__in=[ids[key] for key, _ in batch]).update(**{
+            field: F(field) + Case(
+                *[When(pk=ids[key], then=Value(totals[field])) for key, totals in batch],
+                default=Value(0), output_field=rollup_model._meta.get_field(field),
+            )
+            for field in measures
+        })
+
+
+OBJECTION_MEASURES = ['visits_count', 'price_concerns', 'coverage_concerns', 'existing_providers']
+
+
+def _batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+@transaction.atomic
+def rebuild(start=None, end=None, batch_size=1000):
+    """
+    Recompute the rollup tables for dates within [start, end] (everything
+    when no bounds are given). Returns the number of (sales, visit,
+    objection) buckets written.
+    """
+    DailySalesRollup.objects.filter(**_date_range('date', start, end)).delete()
+    DailyVisitRollup.objects.filter(**_date_range('date', start, end)).delete()
+    DailyObjectionRollup.objects.filter(**_date_range('date', start, end)).delete()
+
+    sale_rows = Sale.objects.filter(
+        **_date_range('sale_date', start, end)
+    ).order_by().values('sale_date', 'sales_person', 'package', 'status').annotate(
+        sales_count=Count('id'),
+        revenue=Sum('total_value'),
+    )
+    visit_rows = Visit.objects.filter(
+        **_date_range('visit_date', start, end)
+    ).order_by().values('visit_date', 'sales_person', 'outcome').annotate(
+        visits_count=Count('id'),
+        price_concerns=Count('id', filter=Q(price_concern=True)),
+        coverage_concerns=Count('id', filter=Q(coverage_concern=True)),
+        existing_providers=Count('id', filter=Q(has_existing_provider=True)),
+    )
+
+    sales_written = 0
+    for batch in _batched(sale_rows.iterator(chunk_size=batch_size), batch_size):
+        DailySalesRollup.objects.bulk_create([
+            DailySalesRollup(
+                date=row['sale_date'],
+                sales_person_id=row['sales_person'],
+                package_id=row['package'],
+                status=row['status'],
+                sales_count=row['sales_count'],
+                revenue=row['revenue'] or 0,
+            )
+            for row in batch
+        ])
+        sales_written += len(batch)
+
+    visits_written = 0
+    for batch in _batched(visit_rows.iterator(chunk_size=batch_size), batch_size):
+        DailyVisitRollup.objects.bulk_create([
+            DailyVisitRollup(
+                date=row['visit_date'],
+                sales_person_id=row['sales_person'],
+                outcome=row['outcome'],
+                visits_count=row['visits_count'],
+                price_concerns=row['price_concerns'],
+                coverage_concerns=row['coverage_concerns'],
+                existing_providers=row['existing_providers'],
+            )
+            for row in batch
+        ])
+        visits_written += len(batch)
+
+    objection_rows = Visit.objects.filter(
+        **_date_range('visit_date', start, end)
+    ).order_by().values('visit_date', 'location', 'has_existing_provider', 'existing_provider_name').annotate(
+        visits_count=Count('id'),
+        price_concerns=Count('id', filter=Q(price_concern=True)),
+        coverage_concerns=Count('id', filter=Q(coverage_concern=True)),
+        existing_providers=Count('id', filter=Q(has_existing_provider=True)),
+    )
+    # Spellings that normalize alike land in one bucket, so merge them here
+    buckets = {}
+    for row in objection_rows.iterator(chunk_size=batch_size):
+        key = (
+            row['visit_date'],
+            normalize_location(row['location']),
+            normalize_provider(row['existing_provider_name']) if row['has_existing_provider'] else '',
+        )
+        totals = buckets.setdefault(key, dict.fromkeys(OBJECTION_MEASURES, 0))
+        for field in OBJECTION_MEASURES:
+            totals[field] += row[field]
+
+    objections_written = 0
+    for batch in _batched(buckets.items(), batch_size):
+        DailyObjectionRollup.objects.bulk_create([
+            DailyObjectionRollup(date=date, location=location, provider=provider, **measures)
+            for (date, location, provider), measures in batch
+        ])
+        objections_written += len(batch)
+
+    return sales_written, visits_written, objections_written
@@ -0,0 +1,185 @@
+"""Full-text search over visit feedback, prospects and customers.
+
+Every Visit, Prospect and Customer has one ``SearchDocument`` holding its
+searchable text, kept current from save/delete signals and rebuilt with
+``manage.py rebuild_search_index``. Searching never touches the source
+tables.
+
+On Postgres the documents are matched against their generated
+``search_vector`` column through its GIN index with ``websearch_to_tsquery``
+(so ``"exact phrase"``, ``or`` and ``-word`` work) and ranked by
+``ts_rank_cd``. Other databases, e.g. SQLite in local development, use an
+inverted index of ``SearchTerm`` postings written alongside each document:
+every query word must match, ranked by how often and where (title or body)
+the words appear, with only a crude plural stemmer standing in for
+Postgres's.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, Count, FloatField, Q, Sum
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Prospect, Sale, SearchDocument, SearchTerm, Visit
+
+KINDS = {'visit': Visit, 'prospect': Prospect, 'customer': Customer}
+TITLE_WEIGHT = 4
+BODY_WEIGHT = 1
+# Postgres's english configuration drops these too
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'from', 'has', 'have', 'he', 'her',
+    'his', 'i', 'in', 'is', 'it', 'its', 'no', 'not', 'of', 'on', 'or', 'she', 'so', 'that', 'the',
+    'their', 'they', 'this', 'to', 'was', 'we', 'were', 'with', 'you',
+}
+MAX_TERM_LENGTH = SearchTerm._meta.get_field('term').max_length
+
+
+def native():
+    """Whether the database does the full-text search itself"""
+    return connection.vendor == 'postgresql'
+
+
+def tokenize(text):
+    """Lowercased, plural-stripped words of ``text`` minus stop words"""
+    terms = []
+    for word in re.findall(r'\w+', text.lower()):
+        if word in STOP_WORDS or (len(word) < 2 and not word.isdigit()):
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word[:MAX_TERM_LENGTH])
+    return terms
+
+
+def _digits(phone):
+    # "0700 123-456" is found by searching 0700123456 too
+    return re.sub(r'\D', '', phone or '')
+
+
+def _join(*parts):
+    return '\n'.join(part for part in parts if part)
+
+
+def document_fields(instance):
+    """The SearchDocument field values for a Visit, Prospect or Customer"""
+    if isinstance(instance, Visit):
+        return {
+            'owner_id': instance.sales_person_id,
+            'date': Visit._meta.get_field('visit_date').to_python(instance.visit_date),
+            'title': instance.location,
+            'body': _join(instance.feedback, instance.follow_up_notes, instance.existing_provider_name),
+        }
+    if isinstance(instance, Prospect):
+        return {
+            'owner_id': instance.added_by_id,
+            'date': instance.created_at.date() if instance.created_at else None,
+            'title': instance.full_name,
+            'body': _join(instance.phone, _digits(instance.phone), instance.email, instance.address, instance.location),
+        }
+    return {
+        'owner_id': None,
+        'date': None,
+        'title': instance.full_name,
+        'body': _join(instance.phone, _digits(instance.phone), instance.email, instance.address, instance.id_number),
+    }
+
+
+def _kind(instance):
+    return instance._meta.model_name
+
+
+def _write_terms(documents):
+    postings = []
+    for document in documents:
+        weights = {}
+        for term in tokenize(document.title):
+            weights[term] = weights.get(term, 0) + TITLE_WEIGHT
+        for term in tokenize(document.body):
+            weights[term] = weights.get(term, 0) + BODY_WEIGHT
+        postings.extend(SearchTerm(term=term, document=document, weight=weight) for term, weight in weights.items())
+    SearchTerm.objects.bulk_create(postings)
+
+
+def index(instance):
+    """Add or refresh ``instance``'s document"""
+    document, _ = SearchDocument.objects.update_or_create(
+        kind=_kind(instance), object_id=instance.pk, defaults=document_fields(instance),
+    )
+    if not native():
+        document.terms.all().delete()
+        _write_terms([document])
+
+
+def index_many(instances):
+    """Add documents for many new instances of one model, e.g. after ``bulk_create``"""
+    if not instances:
+        return
+    kind = _kind(instances[0])
+    documents = SearchDocument.objects.bulk_create([
+        SearchDocument(kind=kind, object_id=instance.pk, **document_fields(instance)) for instance in instances
+    ])
+    if not native():
+        _write_terms(documents)
+
+
+def reindex_many(instances):
+    """Replace the documents of many existing instances of one model, e.g. after ``bulk_update``"""
+    if not instances:
+        return
+    SearchDocument.objects.filter(
+        kind=_kind(instances[0]), object_id__in=[instance.pk for instance in instances],
+    ).delete()
+    index_many(instances)
+
+
+def unindex(instance):
+    SearchDocument.objects.filter(kind=_kind(instance), object_id=instance.pk).delete()
+
+
+def rebuild(batch_size=1000):
+    """Recreate every document from the source tables; returns how many were written"""
+    SearchDocument.objects.all().delete()
+    written = 0
+    for model in KINDS.values():
+        batch = []
+        for instance in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(instance)
+            if len(batch) == batch_size:
+                index_many(batch)
+                written += len(batch)
+                batch = []
+        index_many(batch)
+        written += len(batch)
+    return written
+
+
+def visible_to(user):
+    """Documents ``user`` may find: everything for staff, otherwise their own"""
+    documents = SearchDocument.objects.all()
+    if user.is_staff:
+        return documents
+    own_customers = Sale.objects.filter(sales_person=user).values('customer_id')
+    return documents.filter(Q(owner=user) | Q(kind='customer', object_id__in=own_customers))
+
+
+def find(user, text, kinds=None):
+    """``user``'s documents matching ``text``, best first, as an annotated queryset"""
+    documents = visible_to(user).select_related('owner')
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+
+    if native():
+        query = "websearch_to_tsquery('english', %s)"
+        return documents.filter(
+            RawSQL(f"search_vector @@ {query}", [text], output_field=BooleanField()),
+        ).annotate(
+            rank=RawSQL(f"ts_rank_cd(search_vector, {query})", [text], output_field=FloatField()),
+        ).order_by('-rank', '-date', '-id')
+
+    terms = set(tokenize(text))
+    if not terms:
+        return documents.none()
+    # One posting per (term, document), so counting them counts the words matched
+    return documents.filter(terms__term__in=terms).annotate(
+        matched=Count('terms'), rank=Sum('terms__weight'),
+    ).filter(matched=len(terms)).order_by('-rank', '-date', '-id')
@@ -0,0 +1,176 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import auth_cache, dashboard_cache, followups, phones, rollups, search, targets, territories
+from .models import Customer, Prospect, Sale, SalesTarget, Territory, Visit
+
+
+# ============================================
+# DAILY ROLLUPS
+# ============================================
+
+# Prospects have no rollups; match_territory uses theirs to keep an unchanged location's territory
+@receiver(pre_save, sender=Sale)
+@receiver(pre_save, sender=Visit)
+@receiver(pre_save, sender=Prospect)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance._previous_state = rollups.previous_state(instance)
+
+
+@receiver(post_save, sender=Sale)
+def roll_up_sale(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.record_sale(instance, getattr(instance, '_previous_state', None))
+
+
+@receiver(post_save, sender=Visit)
+def roll_up_visit(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rollups.record_visit(instance, getattr(instance, '_previous_state', None))
+
+
+@receiver(post_delete, sender=Sale)
+def roll_down_sale(sender, instance, **kwargs):
+    rollups.discard_sale(instance)
+
+
+@receiver(post_delete, sender=Visit)
+def roll_down_visit(sender, instance, **kwargs):
+    rollups.discard_visit(instance)
+
+
+# ============================================
+# SALES TARGET PROGRESS
+# ============================================
+
+@receiver(post_save, sender=Sale)
+def track_sale_target(sender, instance, raw=False, **kwargs):
+    if not raw:
+        targets.record_sale(instance, getattr(instance, '_previous_state', None))
+
+
+@receiver(post_save, sender=Visit)
+def track_visit_target(sender, instance, raw=False, **kwargs):
+    if not raw:
+        targets.record_visit(instance, getattr(instance, '_previous_state', None))
+
+
+@receiver(post_delete, sender=Sale)
+def untrack_sale_target(sender, instance, **kwargs):
+    targets.discard_sale(instance)
+
+
+@receiver(post_delete, sender=Visit)
+def untrack_visit_target(sender, instance, **kwargs):
+    targets.discard_visit(instance)
+
+
+@receiver(pre_save, sender=SalesTarget)
+def start_target_progress(sender, instance, raw=False, **kwargs):
+    # New targets (or ones moved to another person or month) start from the
+    # activity already recorded for that month
+    if raw:
+        return
+    previous = rollups.previous_state(instance)
+    if previous is None or (previous.sales_person_id, previous.month) != (instance.sales_person_id, instance.month):
+        targets.fill_achievement(instance)
+
+
+# ============================================
+# FOLLOW-UP QUEUE
+# ============================================
+
+@receiver(post_save, sender=Visit)
+def queue_follow_up(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # The visit's own rep is invalidated with the dashboards below; this
+    # covers reps whose follow-ups it settled
+    reps = followups.sync(instance, getattr(instance, '_previous_state', None))
+    if reps:
+        dashboard_cache.invalidate(*reps)
+
+
+# ============================================
+# PROSPECT PHONE KEY
+# ============================================
+
+@receiver(pre_save, sender=Prospect)
+def key_prospect_phone(sender, instance, **kwargs):
+    # Derived from the row itself, so fixtures (raw saves) get it too
+    instance.phone_key = phones.normalize(instance.phone)
+
+
+# ============================================
+# TERRITORIES
+# ============================================
+
+@receiver(pre_save, sender=Visit)
+@receiver(pre_save, sender=Prospect)
+def match_territory(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None and previous.location == instance.location:
+        # Unchanged; assign_territories rematches rows after alias edits
+        instance.territory_id = previous.territory_id
+        return
+    instance.territory_id = territories.match(instance.location)
+
+
+@receiver(post_save, sender=Territory)
+@receiver(post_delete, sender=Territory)
+def invalidate_territory_matcher(sender, instance, **kwargs):
+    territories.invalidate()
+
+
+# ============================================
+# SEARCH INDEX
+# ============================================
+
+@receiver(post_save, sender=Visit)
+@receiver(post_save, sender=Prospect)
+@receiver(post_save, sender=Customer)
+def index_for_search(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index(instance)
+
+
+@receiver(post_delete, sender=Visit)
+@receiver(post_delete, sender=Prospect)
+@receiver(post_delete, sender=Customer)
+def unindex_for_search(sender, instance, **kwargs):
+    search.unindex(instance)
+
+
+# ============================================
+# DASHBOARD CACHE
+# ============================================
+
+@receiver(post_save, sender=Sale)
+@receiver(post_delete, sender=Sale)
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+def invalidate_dashboards(sender, instance, **kwargs):
+    # A reassigned row changes both the old and the new owner's dashboard
+    owners = {instance.sales_person_id}
+    previous = getattr(instance, '_previous_state', None)
+    if previous is not None:
+        owners.add(previous.sales_person_id)
+    dashboard_cache.invalidate(dashboard_cache.GLOBAL, *owners)
+
+
+@receiver(post_save, sender=SalesTarget)
+@receiver(post_delete, sender=SalesTarget)
+def invalidate_target_dashboard(sender, instance, **kwargs):
+    dashboard_cache.invalidate(instance.sales_person_id)
+
+
+# ============================================
+# CACHED USER
+# ============================================
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    auth_cache.invalidate(instance.pk)
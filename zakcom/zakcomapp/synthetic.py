@@ -0,0 +1,157 @@
+"""Synthetic data for benchmarks.
+
+Rows are generated in chunks and written with ``bulk_create`` so seeding
+hundreds of thousands of visits takes seconds and flat memory. Because
+bulk inserts skip model signals, phone keys and territories are set on the
+rows directly and the rollup tables, follow-up queue and search index are
+rebuilt afterwards.
+"""
+import random
+import uuid
+from datetime import time, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import followups, phones, rollups, search, territories
+from .models import Customer, InternetPackage, Prospect, Sale, Territory, Visit
+
+AREAS = ['Kololo', 'Ntinda', 'Bukoto', 'Kira', 'Naalya', 'Muyenga', 'Kansanga', 'Najjera', 'Kyanja', 'Bugolobi']
+PROVIDERS = ['MTN', 'Airtel', 'Roke', 'Liquid', 'Starlink']
+FEEDBACK = [
+    'Happy with the price, wants installation next week',
+    'Says the current provider is cheaper',
+    'Worried about coverage in the building',
+    'Will discuss with family and call back',
+    'Not interested at the moment',
+    '',
+]
+
+
+def _chunks(objects, size):
+    objects = iter(objects)
+    while chunk := list(islice(objects, size)):
+        yield chunk
+
+
+def _bulk_create(model, objects, batch_size):
+    created = []
+    for chunk in _chunks(objects, batch_size):
+        created.extend(model.objects.bulk_create(chunk, batch_size=batch_size))
+    return created
+
+
+@transaction.atomic
+def seed(users=50, packages=5, prospects=10000, visits=100000, sales=20000,
+         days=730, batch_size=5000, rng_seed=0):
+    """
+    Insert a synthetic team with its packages, prospects, visits and sales
+    spread over the last ``days`` days. Returns the row counts, with the ids
+    of the generated sales people under ``'users'``.
+    """
+    rng = random.Random(rng_seed)
+    today = timezone.now().date()
+    run = uuid.uuid4().hex[:8]
+
+    def some_day():
+        return today - timedelta(days=rng.randrange(days))
+
+    team = _bulk_create(User, (
+        User(username=f'synthetic_{run}_{i}', first_name='Rep', last_name=str(i), password='!')
+        for i in range(users)
+    ), batch_size)
+    team_ids = [user.pk for user in team]
+
+    offers = _bulk_create(InternetPackage, (
+        InternetPackage(
+            name=f'Synthetic {i + 1}',
+            speed=f'{10 * (i + 1)} Mbps',
+            monthly_price=Decimal(50000 * (i + 1)),
+            installation_fee=Decimal(100000),
+        )
+        for i in range(packages)
+    ), batch_size)
+
+    for area in AREAS:
+        Territory.objects.get_or_create(name=area)
+    territory_of = territories.Matcher()
+
+    prospect_ids = []
+    for chunk in _chunks(range(prospects), batch_size):
+        batch = [
+            Prospect(
+                full_name=f'Prospect {i}',
+                phone=f'+2567{rng.randrange(10 ** 8):08d}',
+                address='Plot %d' % rng.randrange(1, 500),
+                location=rng.choice(AREAS),
+                interest_level=rng.choice(Prospect.INTEREST_LEVEL_CHOICES)[0],
+                preferred_package=rng.choice(offers),
+                added_by_id=rng.choice(team_ids),
+            )
+            for i in chunk
+        ]
+        for prospect in batch:
+            prospect.phone_key = phones.normalize(prospect.phone)
+            prospect.territory_id = territory_of(prospect.location)
+        prospect_ids.extend(prospect.pk for prospect in Prospect.objects.bulk_create(batch))
+
+    outcomes = [choice for choice, _ in Visit.OUTCOME_CHOICES]
+    for chunk in _chunks(range(visits), batch_size):
+        batch = []
+        for _ in chunk:
+            outcome = rng.choice(outcomes)
+            visit_date = some_day()
+            has_provider = rng.random() < 0.3
+            batch.append(Visit(
+                sales_person_id=rng.choice(team_ids),
+                prospect_id=rng.choice(prospect_ids) if prospect_ids and outcome in ('interested', 'follow_up', 'closed_sale') else None,
+                visit_date=visit_date,
+                visit_time=time(rng.randrange(8, 19), rng.randrange(60)),
+                location=rng.choice(AREAS),
+                outcome=outcome,
+                feedback=rng.choice(FEEDBACK),
+                price_concern=rng.random() < 0.25,
+                coverage_concern=rng.random() < 0.15,
+                has_existing_provider=has_provider,
+                existing_provider_name=rng.choice(PROVIDERS) if has_provider else '',
+                follow_up_date=visit_date + timedelta(days=rng.randrange(1, 30)) if outcome == 'follow_up' else None,
+            ))
+        for visit in batch:
+            visit.territory_id = territory_of(visit.location)
+        Visit.objects.bulk_create(batch)
+
+    statuses = [choice for choice, _ in Sale.STATUS_CHOICES]
+    for chunk in _chunks(range(sales), batch_size):
+        customers = Customer.objects.bulk_create([
+            Customer(full_name=f'Customer {i}', phone=f'+2567{rng.randrange(10 ** 8):08d}', address='Plot %d' % i)
+            for i in chunk
+        ])
+        batch = []
+        for customer in customers:
+            package = rng.choice(offers)
+            duration = rng.choice([6, 12, 24])
+            batch.append(Sale(
+                sales_person_id=rng.choice(team_ids),
+                customer=customer,
+                package=package,
+                status=rng.choice(statuses),
+                sale_date=some_day(),
+                contract_duration=duration,
+                total_value=package.monthly_price * duration + package.installation_fee,
+            ))
+        Sale.objects.bulk_create(batch)
+
+    rollups.rebuild()
+    followups.reconcile(today)
+    search.rebuild()
+
+    return {
+        'users': team_ids,
+        'packages': len(offers),
+        'prospects': prospects,
+        'visits': visits,
+        'sales': sales,
+    }
@@ -0,0 +1,103 @@
+"""Incremental maintenance of SalesTarget progress.
+
+``achieved_count``/``achieved_amount`` count a sales person's sales dated in
+the target's month, except cancelled ones; ``achieved_visits`` counts all
+their visits in the month. Each Sale/Visit save moves its contribution from
+the target it used to count towards (if any) to the one it belongs to now
+with atomic ``F()`` updates, as the daily rollups do. A target created for a
+month that already has activity starts from the rollup totals, and the
+``reconcile_targets`` command repairs any drift from the raw rows.
+"""
+from datetime import timedelta
+
+from django.db.models import F, Sum
+
+from .models import DailySalesRollup, DailyVisitRollup, Sale, SalesTarget, Visit
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def sale_achievement(sale):
+    """Target key and progress one sale adds, or None if it doesn't count"""
+    if sale.status == 'cancelled':
+        return None
+    sale_date = Sale._meta.get_field('sale_date').to_python(sale.sale_date)
+    key = {'sales_person_id': sale.sales_person_id, 'month': month_start(sale_date)}
+    measures = {'achieved_count': 1, 'achieved_amount': sale.total_value or 0}
+    return key, measures
+
+
+def visit_achievement(visit):
+    """Target key and progress one visit adds"""
+    visit_date = Visit._meta.get_field('visit_date').to_python(visit.visit_date)
+    key = {'sales_person_id': visit.sales_person_id, 'month': month_start(visit_date)}
+    return key, {'achieved_visits': 1}
+
+
+def _apply(key, measures, sign):
+    # No target for the month means nothing to track
+    SalesTarget.objects.filter(**key).update(**{
+        field: F(field) + sign * value for field, value in measures.items()
+    })
+
+
+def _move(achievement, instance, previous):
+    new = achievement(instance)
+    old = achievement(previous) if previous is not None else None
+    if old == new:
+        return
+    if old is not None:
+        _apply(*old, -1)
+    if new is not None:
+        _apply(*new, 1)
+
+
+def record_sale(sale, previous=None):
+    _move(sale_achievement, sale, previous)
+
+
+def discard_sale(sale):
+    achievement = sale_achievement(sale)
+    if achievement is not None:
+        _apply(*achievement, -1)
+
+
+def record_visit(visit, previous=None):
+    _move(visit_achievement, visit, previous)
+
+
+def discard_visit(visit):
+    _apply(*visit_achievement(visit), -1)
+
+
+def record_visits(visits):
+    """Add many new visits at once, e.g. after ``bulk_create``, with one update per target"""
+    totals = {}
+    for visit in visits:
+        key, measures = visit_achievement(visit)
+        bucket = tuple(key.items())
+        totals[bucket] = totals.get(bucket, 0) + measures['achieved_visits']
+    for key, count in totals.items():
+        _apply(dict(key), {'achieved_visits': count}, 1)
+
+
+def fill_achievement(target):
+    """Set ``target``'s progress from the rollups for its month (doesn't save)"""
+    days = {
+        'sales_person_id': target.sales_person_id,
+        'date__gte': target.month,
+        'date__lt': next_month(target.month),
+    }
+    sales = DailySalesRollup.objects.filter(**days).exclude(status='cancelled').aggregate(
+        count=Sum('sales_count'), amount=Sum('revenue'),
+    )
+    visits = DailyVisitRollup.objects.filter(**days).aggregate(count=Sum('visits_count'))
+    target.achieved_count = sales['count'] or 0
+    target.achieved_amount = sales['amount'] or 0
+    target.achieved_visits = visits['count'] or 0
@@ -0,0 +1,157 @@
+"""Mapping free-text locations to territories, and per-territory analytics.
+
+Visit and prospect locations are typed freely ("Plot 12, Kololo Hill Rd",
+"kololo"), so each is matched to a ``Territory`` when saved and the
+analytics group by that indexed foreign key. Matching normalizes the
+location to its significant words (lowercase, no punctuation, plot numbers
+or words like "road" and "estate") and looks every run of consecutive words,
+longest first, up in a dict of territory names and aliases normalized the
+same way. So "Plot 5 Ntinda Ministers Village" finds a "Ministers Village"
+alias before an "Ntinda" one.
+
+That dict is built once per process and kept until a territory is saved or
+deleted, which bumps a counter in the dashboard cache (see
+dashboard_cache.py), so every worker rebuilds it.
+"""
+import re
+
+from django.db.models import Count, Q
+
+from . import dashboard_cache
+from .analytics import conversion_rate, date_filters
+from .models import Prospect, Territory, Visit
+
+# Words that say what kind of place it is rather than which one
+NOISE_WORDS = {
+    'plot', 'house', 'no', 'road', 'rd', 'street', 'st', 'avenue', 'ave', 'lane', 'drive', 'close',
+    'estate', 'estates', 'building', 'bldg', 'near', 'opposite', 'behind', 'off', 'along', 'the', 'of',
+}
+# Longest run of words tried as a key
+MAX_WORDS = 4
+# The dashboard cache counter that territory writes bump
+VERSION_SCOPE = 'territories'
+
+
+def location_key(text):
+    """The significant words of a location or territory name, normalized"""
+    words = re.sub(r'[^\w\s]+', ' ', (text or '').casefold()).split()
+    return ' '.join(word for word in words if word not in NOISE_WORDS and not word.isdigit())
+
+
+def candidates(location):
+    """Keys a location could match: its runs of consecutive words, longest first"""
+    words = location_key(location).split()
+    for size in range(min(len(words), MAX_WORDS), 0, -1):
+        for start in range(len(words) - size + 1):
+            yield ' '.join(words[start:start + size])
+
+
+class Matcher:
+    """
+    Maps locations to territory ids with one query up front, for matching
+    many locations (backfills, imports); ``match`` does a single one.
+    """
+
+    def __init__(self, territories=None):
+        if territories is None:
+            territories = Territory.objects.order_by('pk').values_list('pk', 'name', 'aliases')
+        self.keys = {}
+        for pk, name, aliases in territories:
+            for spelling in [name, *aliases.splitlines()]:
+                key = location_key(spelling)
+                if key:
+                    # On a clash the older territory keeps the key
+                    self.keys.setdefault(key, pk)
+
+    def __call__(self, location):
+        """The id of the territory ``location`` is in, or None"""
+        return next((self.keys[key] for key in candidates(location) if key in self.keys), None)
+
+
+_cached = (None, None)
+
+
+def matcher():
+    """The ``Matcher`` for the current territories, rebuilt only after they change"""
+    global _cached
+    version = dashboard_cache.version(VERSION_SCOPE)
+    cached_version, cached = _cached
+    if cached is None or cached_version != version:
+        cached = Matcher()
+        _cached = (version, cached)
+    return cached
+
+
+def invalidate():
+    """Make every process rebuild its ``Matcher``, e.g. after a territory is saved"""
+    dashboard_cache.invalidate(VERSION_SCOPE)
+
+
+def match(location):
+    """The id of the territory ``location`` is in, or None"""
+    return matcher()(location)
+
+
+def assign(model, matcher=None, chunk_size=1000, unassigned_only=False):
+    """
+    Set ``territory`` on every row of ``model`` (Visit or Prospect) from its
+    location, walking the table in primary-key order ``chunk_size`` rows at a
+    time and writing each chunk with one UPDATE per territory. Returns the
+    number of rows whose territory changed.
+    """
+    matcher = matcher or Matcher()
+    rows = model.objects.order_by('pk')
+    if unassigned_only:
+        rows = rows.filter(territory__isnull=True)
+
+    changed, last_pk = 0, 0
+    while chunk := list(rows.filter(pk__gt=last_pk).values_list('pk', 'location', 'territory')[:chunk_size]):
+        last_pk = chunk[-1][0]
+        moves = {}
+        for pk, location, current in chunk:
+            territory = matcher(location)
+            if territory != current:
+                moves.setdefault(territory, []).append(pk)
+        for territory, pks in moves.items():
+            changed += model.objects.filter(pk__in=pks).update(territory=territory)
+    return changed
+
+
+def unmatched(model, limit=None, **filters):
+    """``(location, rows)`` for the commonest locations of ``model`` rows without a territory"""
+    rows = model.objects.filter(territory__isnull=True, **filters).values('location').annotate(
+        rows=Count('id'),
+    ).order_by('-rows', 'location').values_list('location', 'rows')
+    return list(rows[:limit] if limit else rows)
+
+
+def performance(start=None, end=None):
+    """
+    Visits, closed sales, conversion rate and concern rates per territory for
+    visits within [start, end], best converting first. One grouped query on
+    the (territory, visit_date) index.
+    """
+    visits = Visit.objects.filter(territory__isnull=False, **date_filters('visit_date', start, end))
+
+    def rate(field):
+        return conversion_rate(field, 'visits_count')
+
+    return list(visits.values('territory', 'territory__name').annotate(
+        visits_count=Count('id'),
+        closed_sales=Count('id', filter=Q(outcome='closed_sale')),
+        price_concerns=Count('id', filter=Q(price_concern=True)),
+        coverage_concerns=Count('id', filter=Q(coverage_concern=True)),
+        existing_providers=Count('id', filter=Q(has_existing_provider=True)),
+    ).annotate(
+        conversion_rate=rate('closed_sales'),
+        price_concern_rate=rate('price_concerns'),
+        coverage_concern_rate=rate('coverage_concerns'),
+        existing_provider_rate=rate('existing_providers'),
+    ).order_by('-conversion_rate', '-visits_count', 'territory__name'))
+
+
+def prospect_counts():
+    """Prospects per territory id"""
+    return dict(Prospect.objects.filter(territory__isnull=False).values('territory').annotate(
+        rows=Count('id'),
+    ).values_list('territory', 'rows'))
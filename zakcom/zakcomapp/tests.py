@@ -1,3 +1,1854 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import importlib
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    analytics, assets, auth_cache, commissions, concurrency, dashboard_cache, followups, imports, leaderboard, live, objections, phones, prospects,
+    projections, rollups, search, territories, trends, views,
+)
+from .management.commands.benchmark_async import make_request
+from .management.commands.benchmark_auth import is_auth_query
+from .instrumentation import InstrumentationMiddleware, fingerprint, samples
+from .models import (
+    CommissionEntry, CommissionRate, CommissionTier, Customer, DailyObjectionRollup, DailySalesRollup,
+    DailyVisitRollup, FollowUp, InternetPackage, MonthlyStanding, Prospect, Sale, SalesTarget, SearchDocument,
+    Territory, Visit,
+)
+from .pagination import InvalidCursor, KeysetPaginator, approximate_count
+from .querybudget import QueryBudgetExceeded, assert_max_queries, count_queries
+from .urls import urlpatterns
+
+# Every cache in settings, in memory, so tests never read or clear the real file caches
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'test-{alias}'}
+    for alias in ['default', 'dashboards', 'auth']
+}
+
+
+def add_activity(user, package, n):
+    """Give ``user`` n prospects, each with a visit and a sale"""
+    for i in range(n):
+        prospect = Prospect.objects.create(
+            full_name=f'Prospect {i}', phone=f'0700{i:06d}', address='Plot 1',
+            location='Kololo', added_by=user, preferred_package=package,
+        )
+        Visit.objects.create(
+            sales_person=user, prospect=prospect, location='Kololo', outcome='follow_up',
+            feedback='Wants a quote', has_existing_provider=True, existing_provider_name='MTN',
+        )
+        customer = Customer.objects.create(full_name=f'Customer {i}', phone=f'0710{i:06d}', address='Plot 2')
+        Sale.objects.create(sales_person=user, customer=customer, package=package)
+
+
+class TeamFixture:
+    """
+    A manager, the ``reps`` (each set as an attribute named after its
+    username) and a Home package, plus ``sell`` for one-off sales.
+    """
+    reps = ['rep', 'other']
+    monthly_price = 100000
+    installation_fee = 50000
+
+    @classmethod
+    def create_team(cls):
+        cls.admin = User.objects.create_user('manager', password='x', is_staff=True)
+        for username in cls.reps:
+            setattr(cls, username, User.objects.create_user(username, password='x'))
+        cls.package = InternetPackage.objects.create(
+            name='Home', speed='10 Mbps', monthly_price=cls.monthly_price, installation_fee=cls.installation_fee,
+        )
+
+    def sell(self, rep=None, package=None, **fields):
+        customer = Customer.objects.create(full_name='C', phone='0700000000', address='Plot 1')
+        return Sale.objects.create(sales_person=rep or self.rep, customer=customer, package=package or self.package,
+                                   **fields)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class TeamTestCase(TeamFixture, TestCase):
+    """The team is created once per class and rolled back to after each test"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_team()
+
+
+class RollupTests(TeamTestCase):
+    rollup_fields = {
+        DailySalesRollup: ['date', 'sales_person', 'package', 'status', 'sales_count', 'revenue'],
+        DailyVisitRollup: ['date', 'sales_person', 'outcome', 'visits_count', 'price_concerns',
+                           'coverage_concerns', 'existing_providers'],
+        DailyObjectionRollup: ['date', 'location', 'provider', 'visits_count', 'price_concerns',
+                               'coverage_concerns', 'existing_providers'],
+    }
+
+    def setUp(self):
+        self.office = InternetPackage.objects.create(
+            name='Office', speed='50 Mbps', monthly_price=500000, installation_fee=0,
+        )
+        self.today = timezone.now().date()
+
+    def visit(self, rep=None, **fields):
+        fields = {'location': 'Kololo', 'outcome': 'interested', 'feedback': 'Ok', **fields}
+        return Visit.objects.create(sales_person=rep or self.rep, **fields)
+
+    def rollups(self):
+        return {
+            model: sorted(model.objects.values_list(*fields))
+            for model, fields in self.rollup_fields.items()
+        }
+
+    def raw(self):
+        """The sales and visit rollups aggregated straight from the raw tables"""
+        sales = Sale.objects.values_list('sale_date', 'sales_person', 'package', 'status').annotate(
+            count=Count('id'), revenue=Sum('total_value'),
+        ).order_by()
+        visits = Visit.objects.values_list('visit_date', 'sales_person', 'outcome').annotate(
+            count=Count('id'),
+            price=Count('id', filter=Q(price_concern=True)),
+            coverage=Count('id', filter=Q(coverage_concern=True)),
+            providers=Count('id', filter=Q(has_existing_provider=True)),
+        ).order_by()
+        return {DailySalesRollup: sorted(sales), DailyVisitRollup: sorted(visits)}
+
+    def assert_consistent(self):
+        """Incremental rollups match the raw aggregates and a full rebuild"""
+        incremental = self.rollups()
+        for model, rows in self.raw().items():
+            self.assertEqual(incremental[model], rows)
+        rollups.rebuild()
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_create_edit_and_delete(self):
+        yesterday = self.today - timedelta(days=1)
+        sale = self.sell(status='pending', total_value=1000)
+        self.sell(status='pending', total_value=500)
+        self.sell(self.other, self.office, status='active', sale_date=yesterday, total_value=2000)
+        visit = self.visit(price_concern=True, has_existing_provider=True, existing_provider_name='MTN')
+        self.visit(location='kololo ', outcome='not_home')
+        self.visit(self.other, visit_date=yesterday, coverage_concern=True)
+        self.assert_consistent()
+
+        # Every part of the key changes, so the old buckets shrink and new ones grow
+        sale.status, sale.package, sale.sale_date, sale.total_value = 'active', self.office, yesterday, 3000
+        sale.sales_person = self.other
+        sale.save()
+        visit.outcome, visit.location, visit.existing_provider_name = 'follow_up', 'Ntinda', 'Airtel'
+        visit.price_concern, visit.sales_person = False, self.other
+        visit.save()
+        self.assert_consistent()
+
+        Sale.objects.filter(sales_person=self.rep).delete()
+        visit.delete()
+        self.assert_consistent()
+
+    def test_emptied_buckets_are_dropped(self):
+        sale = self.sell(status='pending')
+        visit = self.visit()
+        sale.status = 'active'
+        sale.save()
+        visit.delete()
+
+        self.assertEqual(list(DailySalesRollup.objects.values_list('status', 'sales_count')), [('active', 1)])
+        self.assertFalse(DailyVisitRollup.objects.exists())
+        self.assertFalse(DailyObjectionRollup.objects.exists())
+        self.assertEqual(
+            list(analytics.status_breakdown()),
+            list(Sale.objects.values('status').annotate(count=Count('id')).order_by('status')),
+        )
+        self.assertEqual(
+            [(row['package__name'], row['count']) for row in analytics.package_stats()], [('Home', 1)],
+        )
+
+    def test_rebuild_range(self):
+        old = self.today - timedelta(days=10)
+        self.sell(sale_date=old, total_value=100)
+        self.sell(total_value=200)
+        DailySalesRollup.objects.all().delete()
+
+        self.assertEqual(rollups.rebuild(start=self.today), (1, 0, 0))
+        self.assertEqual(list(DailySalesRollup.objects.values_list('date', flat=True)), [self.today])
+        rollups.rebuild()
+        self.assertEqual(self.rollups()[DailySalesRollup], self.raw()[DailySalesRollup])
+
+
+class KeysetPaginationTests(TeamTestCase):
+    reps = ['rep']
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Long runs of equal dates and times, so most page boundaries fall on a tie
+        start = timezone.now().date()
+        Visit.objects.bulk_create([
+            Visit(sales_person=cls.rep, location='Kololo', outcome='interested', feedback='Ok',
+                  visit_date=start - timedelta(days=i % 3), visit_time=time(9 + i % 2))
+            for i in range(23)
+        ])
+
+    def walk(self, ordering, per_page=5):
+        """Every page forwards, then every page back from the last one"""
+        paginator = KeysetPaginator(Visit.objects.all(), ordering, per_page=per_page)
+        forward = [paginator.page()]
+        while forward[-1].has_next:
+            forward.append(paginator.page(after=forward[-1].next_cursor))
+        backward = [forward[-1]]
+        while backward[-1].has_previous:
+            backward.append(paginator.page(before=backward[-1].previous_cursor))
+        return forward, backward
+
+    def test_pages_cover_every_row_once_across_ties(self):
+        for ordering in [['-visit_date', '-visit_time', '-id'], ['visit_date', '-visit_time', 'id']]:
+            expected = list(Visit.objects.order_by(*ordering).values_list('pk', flat=True))
+            forward, backward = self.walk(ordering)
+            pages = [[visit.pk for visit in page] for page in forward]
+            self.assertEqual(sum(pages, []), expected)
+            self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 3])
+            self.assertFalse(forward[0].has_previous)
+            # Walking back visits the same pages in reverse
+            self.assertEqual([[visit.pk for visit in page] for page in reversed(backward)], pages)
+            self.assertTrue(backward[-1].has_next)
+
+    def test_bad_cursors(self):
+        paginator = KeysetPaginator(Visit.objects.all(), ['-visit_date', '-id'])
+        good = paginator.page().object_list[0]
+        for cursor in [
+            'not base64!', 'e30',  # {} rather than a list
+            paginator.encode(good)[:-4],
+            base64.urlsafe_b64encode(json.dumps(['2025-01-01']).encode()).decode(),
+            base64.urlsafe_b64encode(json.dumps(['not a date', 1]).encode()).decode(),
+        ]:
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                paginator.page(after=cursor)
+        with self.assertRaises(InvalidCursor):
+            paginator.page(after=paginator.encode(good), before=paginator.encode(good))
+
+        # Views fall back to the first page
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('visit_list'), {'after': 'tampered'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['visits'].has_previous)
+
+    def test_approximate_count(self):
+        visits = Visit.objects.all()
+        self.assertEqual(approximate_count(visits), (23, True))
+        self.assertEqual(approximate_count(visits.filter(visit_time=time(9))), (12, True))
+        # Past the cap only the cap is known, except on Postgres, which estimates
+        count, exact = approximate_count(visits, cap=10)
+        self.assertFalse(exact)
+        if connection.vendor == 'postgresql':
+            self.assertGreaterEqual(count, 10)
+        else:
+            self.assertEqual(count, 10)
+
+        page = KeysetPaginator(visits, ['-id'], per_page=5, count='approximate').page()
+        self.assertEqual((page.count, page.count_is_exact), (23, True))
+        self.assertEqual(KeysetPaginator(visits, ['-id'], count='exact').page().count, 23)
+
+
+@override_settings(QUERY_BUDGET_STRICT=True)
+class QueryBudgetTests(TeamTestCase):
+    admin_views = ['sale_list', 'visit_list', 'prospect_list', 'feedback_analysis']
+    rep_views = ['sale_list', 'visit_list', 'prospect_list', 'sales_dashboard']
+
+    def setUp(self):
+        dashboard_cache.cache().clear()
+
+    def queries_per_view(self):
+        counts = {}
+        for user, names in [(self.admin, self.admin_views), (self.rep, self.rep_views)]:
+            self.client.force_login(user)
+            for name in names:
+                with count_queries() as counter:
+                    response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                counts[user.username, name] = counter.count
+        return counts
+
+    def test_list_views_do_not_grow_with_rows(self):
+        add_activity(self.rep, self.package, 2)
+        few = self.queries_per_view()
+        add_activity(self.rep, self.package, 20)
+        self.assertEqual(self.queries_per_view(), few)
+
+    def test_middleware_enforces_budget(self):
+        self.client.force_login(self.admin)
+        with self.settings(QUERY_BUDGETS={'sale_list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('sale_list'))
+
+    def test_streamed_body_is_budgeted_per_chunk(self):
+        cursor = live.current_cursor()
+        add_activity(self.rep, self.package, 1)
+        self.client.force_login(self.admin)
+        url = reverse('admin_dashboard_stream')
+        # The view fits in 5 queries, the poll that finds the new rows doesn't
+        with self.settings(QUERY_BUDGETS={'admin_dashboard_stream': 5}):
+            response = self.client.get(url, {'cursor': str(cursor)})
+            self.assertEqual(response.status_code, 200)
+            with self.assertRaises(QueryBudgetExceeded):
+                b''.join(response.streaming_content)
+
+    def test_log_visit_saves_the_visit_once(self):
+        self.client.force_login(self.rep)
+        with count_queries() as counter:
+            response = self.client.post(reverse('log_visit'), {
+                'location': 'Kololo', 'visit_date': '2025-01-10', 'visit_time': '10:00', 'outcome': 'follow_up',
+                'feedback': 'Ok', 'full_name': 'Jane Doe', 'phone': '0700123456',
+            })
+        self.assertEqual(response.status_code, 302)
+        writes = [sql for sql, _ in counter.queries if sql.startswith(('INSERT INTO "zakcomapp_visit"',
+                                                                       'UPDATE "zakcomapp_visit"'))]
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(Visit.objects.get().prospect.full_name, 'Jane Doe')
+
+    def test_import_visits_within_budget(self):
+        Prospect.objects.create(full_name='Known', phone='0700000001', address='Plot 1', location='Kololo', added_by=self.rep)
+        rows = ['location,visit_date,visit_time,outcome,feedback,price_concern,full_name,phone,preferred_package']
+        rows += [
+            f'Estate {i % 7},2025-01-{i % 28 + 1:02d},10:00,follow_up,Call back,{i % 2},Person {i},07300{i:05d},{self.package.pk}'
+            for i in range(200)
+        ]
+        rows += [f'Kololo,2025-01-{day:02d},11:00,interested,Again,,Known,0700 000 001,' for day in range(1, 20)]
+        upload = SimpleUploadedFile('visits.csv', '\n'.join(rows).encode(), content_type='text/csv')
+        self.client.force_login(self.rep)
+        # Strict, so going over budget raises
+        report = self.client.post(reverse('import_visits') + '?format=json', {'file': upload}).json()
+        self.assertEqual((report['visits_created'], report['prospects_matched']), (219, 19))
+
+        # Every bucket got its own amounts
+        imported = [
+            list(model.objects.order_by(*ordering).values_list(*ordering, 'visits_count', 'price_concerns'))
+            for model, ordering in [(DailyVisitRollup, ['date', 'outcome']), (DailyObjectionRollup, ['date', 'location'])]
+        ]
+        rollups.rebuild()
+        self.assertEqual(imported, [
+            list(model.objects.order_by(*ordering).values_list(*ordering, 'visits_count', 'price_concerns'))
+            for model, ordering in [(DailyVisitRollup, ['date', 'outcome']), (DailyObjectionRollup, ['date', 'location'])]
+        ])
+
+    def test_assert_max_queries(self):
+        with assert_max_queries(1):
+            Sale.objects.count()
+        with self.assertRaises(AssertionError):
+            with assert_max_queries(1):
+                Sale.objects.count()
+                Visit.objects.count()
+
+
+class InstrumentationTests(TeamTestCase):
+    def setUp(self):
+        samples.clear()
+        dashboard_cache.cache().clear()
+
+    def test_server_timing_header(self):
+        self.client.force_login(self.rep)
+        response = self.client.get(reverse('sales_dashboard'))
+        timing = response['Server-Timing']
+        for metric in ['total;dur=', 'sql;dur=', 'dup;desc=', 'tpl;dur=']:
+            self.assertIn(metric, timing)
+
+    def test_performance_stats_is_staff_only(self):
+        self.client.force_login(self.rep)
+        self.client.get(reverse('sales_dashboard'))
+        self.assertEqual(self.client.get(reverse('performance_stats')).status_code, 302)
+
+        self.client.force_login(self.admin)
+        stats = self.client.get(reverse('performance_stats')).json()['views']
+        self.assertEqual(stats['sales_dashboard']['requests'], 1)
+        self.assertGreater(stats['sales_dashboard']['sql_queries']['p50'], 0)
+        self.assertGreater(stats['sales_dashboard']['template_ms']['max'], 0)
+
+    def test_streamed_body_is_sampled_when_it_ends(self):
+        cursor = live.current_cursor()
+        add_activity(self.rep, self.package, 1)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin_dashboard_stream'), {'cursor': str(cursor)})
+        before_body = int(re.search(r'"(\d+) queries"', response['Server-Timing'])[1])
+        self.assertNotIn('admin_dashboard_stream', samples.summary())
+
+        b''.join(response.streaming_content)
+        stats = samples.summary()['admin_dashboard_stream']
+        self.assertEqual(stats['requests'], 1)
+        # The poll for the new sale and visit ran while the body streamed
+        self.assertGreater(stats['sql_queries']['max'], before_body)
+
+    def test_fingerprint_collapses_parameter_lists(self):
+        self.assertEqual(
+            fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            fingerprint('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+
+@override_settings(DASHBOARD_CACHE='default')
+class DashboardCacheTests(TeamTestCase):
+    def setUp(self):
+        dashboard_cache.cache().clear()
+        dashboard_cache.stats.clear()
+
+    def get(self, user, name):
+        self.client.force_login(user)
+        with count_queries() as counter:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, 200)
+        return response, counter.count
+
+    def test_repeat_requests_are_served_from_cache(self):
+        _, cold = self.get(self.rep, 'sales_dashboard')
+        _, warm = self.get(self.rep, 'sales_dashboard')
+        self.assertLess(warm, cold)
+        self.assertEqual(dashboard_cache.stats.summary()['sales_dashboard'], {
+            'hits': 1, 'misses': 1, 'hit_rate': 0.5,
+        })
+
+    def test_sale_invalidates_owner_and_admin_only(self):
+        self.get(self.rep, 'sales_dashboard')
+        self.get(self.other, 'sales_dashboard')
+        self.get(self.admin, 'admin_dashboard')
+
+        add_activity(self.rep, self.package, 1)
+
+        response, _ = self.get(self.rep, 'sales_dashboard')
+        self.assertEqual(response.context['monthly_sales'], 1)
+        self.assertEqual(self.get(self.admin, 'admin_dashboard')[0].context['monthly_visits'], 1)
+        self.get(self.other, 'sales_dashboard')
+        summary = dashboard_cache.stats.summary()
+        self.assertEqual(summary['sales_dashboard']['hits'], 1)
+        self.assertEqual(summary['admin_dashboard']['hits'], 0)
+
+    def test_reassigned_sale_invalidates_previous_owner(self):
+        add_activity(self.rep, self.package, 1)
+        self.assertEqual(self.get(self.rep, 'sales_dashboard')[0].context['total_sales'], 1)
+
+        sale = Sale.objects.get()
+        sale.sales_person = self.other
+        sale.save()
+        self.assertEqual(self.get(self.rep, 'sales_dashboard')[0].context['total_sales'], 0)
+
+    def test_target_change_is_visible(self):
+        today = timezone.now().date()
+        self.get(self.rep, 'sales_dashboard')
+        self.get(self.admin, 'admin_dashboard')
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            SalesTarget.objects.create(
+                sales_person=self.rep, month=today.replace(day=1), target_amount=1000, target_count=3,
+            )
+        self.assertEqual(len(callbacks), 1)
+
+        self.assertEqual(self.get(self.rep, 'sales_dashboard')[0].context['target'].target_count, 3)
+        self.get(self.admin, 'admin_dashboard')
+        self.assertEqual(dashboard_cache.stats.summary()['admin_dashboard']['hits'], 1)
+
+
+class ExportTests(TeamTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        add_activity(cls.rep, cls.package, 3)
+        add_activity(cls.other, cls.package, 2)
+
+    def download(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_honors_list_filters_and_visibility(self):
+        self.client.force_login(self.rep)
+        lines = self.download('export_sales').decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Customer Phone', lines[0])
+        self.assertIn('rep', lines[1])
+
+        self.client.force_login(self.admin)
+        lines = self.download('export_visits', outcome='follow_up').decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(len(self.download('export_visits', outcome='not_home').splitlines()), 1)
+
+    def test_export_runs_constant_queries(self):
+        self.client.force_login(self.admin)
+        # Loads the cached user, so both counts are for the view alone
+        self.download('export_sales')
+        with count_queries() as few:
+            self.download('export_sales')
+        add_activity(self.rep, self.package, 10)
+        with count_queries() as many:
+            self.download('export_sales')
+        self.assertEqual(few.count, many.count)
+
+    def test_xlsx_is_a_valid_workbook(self):
+        self.client.force_login(self.admin)
+        content = self.download('export_sales', format='xlsx')
+        with zipfile.ZipFile(io.BytesIO(content)) as book:
+            self.assertIsNone(book.testzip())
+            sheet = book.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row '), 6)
+        self.assertIn('Customer 0', sheet)
+
+    def test_formulas_are_not_run(self):
+        Visit.objects.create(sales_person=self.rep, location='=HYPERLINK("http://x","y")', outcome='not_home',
+                             feedback='@SUM(A1)', follow_up_notes='-2+3')
+        self.client.force_login(self.admin)
+        lines = self.download('export_visits', outcome='not_home').decode('utf-8-sig').splitlines()
+        row = next(csv.reader(lines[1:]))
+        self.assertIn("'=HYPERLINK(\"http://x\",\"y\")", row)
+        self.assertIn("'@SUM(A1)", row)
+        self.assertIn("'-2+3", row)
+
+        content = self.download('export_visits', outcome='not_home', format='xlsx')
+        with zipfile.ZipFile(io.BytesIO(content)) as book:
+            sheet = book.read('xl/worksheets/sheet1.xml').decode()
+        self.assertNotIn('<f>', sheet)
+        self.assertIn('<t xml:space="preserve">@SUM(A1)</t>', sheet)
+
+    def test_unknown_format(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get(reverse('export_sales'), {'format': 'pdf'}).status_code, 404)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'visits.csv')
+            call_command('export_data', 'visits', '--user', 'other', '-o', path, stderr=io.StringIO())
+            with open(path, encoding='utf-8-sig') as f:
+                self.assertEqual(len(f.read().splitlines()), 3)
+
+
+class ImportVisitsTests(TeamTestCase):
+    header = 'location,visit_date,visit_time,outcome,feedback,price_concern,full_name,phone,preferred_package\n'
+    reps = ['rep']
+
+    def setUp(self):
+        self.existing = Prospect.objects.create(
+            full_name='Known', phone='0700000001', address='Plot 1', location='Kololo', added_by=self.rep,
+        )
+        self.client.force_login(self.rep)
+
+    def upload(self, body, **params):
+        upload = SimpleUploadedFile('visits.csv', (self.header + body).encode(), content_type='text/csv')
+        return self.client.post(reverse('import_visits') + ('?format=json' if params.get('json') else ''),
+                                {'file': upload})
+
+    def test_rows_are_validated_deduped_and_rolled_up(self):
+        body = (
+            f'Kololo,2025-01-10,10:00,interested,Likes it,yes,Known Again,0700000001,{self.package.pk}\n'
+            'Ntinda,2025-01-10,11:00,follow_up,Call back,no,New Person,0700000002,\n'
+            'Ntinda,2025-01-11,09:00,closed_sale,Signed,0,New Person,0700000002,\n'
+            'Bukoto,2025-01-11,09:30,not_home,,,,,\n'
+            'Bukoto,not-a-date,09:30,bogus,Nobody,,,,\n'
+            'Bugolobi,2025-01-12,08:00,interested,Maybe,,Someone,0700000003,999\n'
+        )
+        report = self.upload(body, json=True).json()
+
+        self.assertEqual(report['rows'], 6)
+        self.assertEqual(report['visits_created'], 3)
+        self.assertEqual(report['prospects_created'], 1)
+        self.assertEqual(report['prospects_matched'], 1)
+        self.assertEqual([error['row'] for error in report['errors']], [5, 6, 7])
+        self.assertEqual(set(report['errors'][0]['errors']), {'feedback'})
+        self.assertEqual(set(report['errors'][1]['errors']), {'visit_date', 'outcome'})
+        self.assertIn('preferred_package', report['errors'][2]['errors'])
+
+        new = Prospect.objects.get(phone='0700000002')
+        self.assertEqual(new.interest_level, 'very_interested')
+        self.assertEqual(new.visits.count(), 2)
+        self.assertEqual(self.existing.visits.count(), 1)
+        self.assertTrue(Visit.objects.get(location='Kololo').price_concern)
+        # Updated from the repeat visit the way log_visit updates it
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.interest_level, 'interested')
+        self.assertEqual(self.existing.preferred_package, self.package)
+
+        imported = list(DailyVisitRollup.objects.values_list(
+            'date', 'sales_person', 'outcome', 'visits_count', 'price_concerns').order_by('date', 'outcome'))
+        rollups.rebuild()
+        self.assertEqual(imported, list(DailyVisitRollup.objects.values_list(
+            'date', 'sales_person', 'outcome', 'visits_count', 'price_concerns').order_by('date', 'outcome')))
+
+    def test_matched_interest_only_goes_up(self):
+        body = (
+            'Kololo,2025-01-10,10:00,follow_up,Call back,,Known,0700 000 001,\n'
+            'Kololo,2025-01-11,10:00,interested,Still keen,,Known,0700000001,\n'
+        )
+        report = self.upload(body, json=True).json()
+        self.assertEqual(report['prospects_matched'], 2)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.interest_level, 'very_interested')
+
+    def test_matched_prospects_are_updated_in_one_write(self):
+        def import_matching(n):
+            for i in range(n):
+                Prospect.objects.create(
+                    full_name=f'Known {n} {i}', phone=f'07200{n:02d}{i:03d}', address='Plot 1', location='Kololo',
+                    added_by=self.rep,
+                )
+            body = ''.join(
+                f'Kololo,2025-01-10,10:00,follow_up,Again,,Known {n} {i},07200{n:02d}{i:03d},{self.package.pk}\n'
+                for i in range(n)
+            )
+            with count_queries() as counter:
+                report = self.upload(body, json=True).json()
+            self.assertEqual(report['prospects_matched'], n)
+            return counter.count
+
+        # The first request also loads the session and user
+        import_matching(1)
+        self.assertEqual(import_matching(10), import_matching(2))
+        self.assertFalse(Prospect.objects.filter(full_name__startswith='Known 10').exclude(
+            interest_level='very_interested', preferred_package=self.package,
+        ).exists())
+        self.assertEqual([document.title for document in search.find(self.rep, 'known 10 9')], ['Known 10 9'])
+
+    def test_writes_are_batched(self):
+        body = ''.join(
+            f'Kololo,2025-01-10,10:00,interested,Ok,,Person {i},07100000{i:02d},\n' for i in range(40)
+        )
+        with count_queries() as counter:
+            report = self.upload(body, json=True).json()
+        self.assertEqual(report['visits_created'], 40)
+        # A fixed number per chunk, including the rollup, target and search index writes
+        self.assertLess(counter.count, 25)
+
+    def test_html_report(self):
+        response = self.upload('Kololo,2025-01-10,10:00,nope,Ok,,,,\n')
+        self.assertContains(response, 'Import Results')
+        self.assertContains(response, 'outcome')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class BenchmarkViewsTests(TestCase):
+    volumes = ['--users', '2', '--prospects', '20', '--visits', '100', '--sales', '20', '--repeat', '2']
+
+    def benchmark(self, *args):
+        call_command('benchmark_views', *self.volumes, *args, stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_every_route_is_benchmarked_or_skipped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            self.benchmark('--output', path)
+            with open(path) as f:
+                report = json.load(f)
+
+        names = {pattern.name for pattern in urlpatterns if pattern.name}
+        self.assertEqual(set(report['views']) | set(report['skipped']), names)
+        for name, view in report['views'].items():
+            self.assertIn(view['status'], (200, 302), name)
+            self.assertGreater(view['p95_ms'], 0)
+        self.assertFalse(User.objects.filter(username__startswith='synthetic_').exists())
+
+    def test_regression_against_baseline_fails(self):
+        # Only the query count is compared; timings vary too much between runs
+        compare = ['--only', 'sale_list', '--min-ms', '60000', '--min-kb', '1000000']
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            self.benchmark('--only', 'sale_list', '--output', path)
+            self.benchmark(*compare, '--baseline', path)
+
+            with open(path) as f:
+                baseline = json.load(f)
+            baseline['views']['sale_list']['queries'] -= 1
+            with open(path, 'w') as f:
+                json.dump(baseline, f)
+            with self.assertRaisesMessage(CommandError, 'sale_list'):
+                self.benchmark(*compare, '--baseline', path)
+
+
+class UserManagementTests(TeamTestCase):
+    reps = []
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_stats_sorting_and_constant_queries(self):
+        busy = User.objects.create_user('busy')
+        quiet = User.objects.create_user('quiet')
+        add_activity(busy, self.package, 3)
+        add_activity(quiet, self.package, 1)
+
+        # Loads the cached user, so both counts are for the view alone
+        self.client.get(reverse('user_management'))
+        with count_queries() as few:
+            response = self.client.get(reverse('user_management'), {'sort': '-sales'})
+        users = list(response.context['users'])
+        self.assertEqual([user.username for user in users[:2]], ['busy', 'quiet'])
+        self.assertEqual((users[0].total_sales, users[0].total_visits), (3, 3))
+        self.assertEqual(users[0].total_revenue, 3 * 1250000)
+        self.assertEqual(response.context['sales_count'], 2)
+
+        response = self.client.get(reverse('user_management'), {'sort': 'sales'})
+        self.assertEqual(response.context['users'][0].username, 'manager')
+
+        for i in range(5):
+            add_activity(User.objects.create_user(f'rep{i}'), self.package, 1)
+        with count_queries() as many:
+            self.client.get(reverse('user_management'), {'sort': '-sales'})
+        self.assertEqual(few.count, many.count)
+
+    def test_pagination_and_bad_sort(self):
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(60)])
+        response = self.client.get(reverse('user_management'), {'sort': 'password', 'page': 2})
+        self.assertEqual(response.context['sort'], '-joined')
+        self.assertEqual(len(response.context['users']), 11)
+        self.assertEqual(response.context['total_users'], 61)
+
+
+class TargetProgressTests(TeamTestCase):
+    def setUp(self):
+        self.month = timezone.now().date().replace(day=1)
+
+    def target(self, user=None):
+        return SalesTarget.objects.get_or_create(
+            sales_person=user or self.rep, month=self.month,
+            defaults={'target_amount': 10000000, 'target_count': 10, 'target_visits': 20},
+        )[0]
+
+    def progress(self, user=None):
+        target = SalesTarget.objects.get(sales_person=user or self.rep, month=self.month)
+        return target.achieved_count, target.achieved_amount, target.achieved_visits
+
+    def test_new_target_starts_from_existing_activity(self):
+        add_activity(self.rep, self.package, 2)
+        self.target()
+        self.assertEqual(self.progress(), (2, 2500000, 2))
+
+    def test_progress_follows_creates_edits_and_deletes(self):
+        self.target()
+        self.target(self.other)
+        add_activity(self.rep, self.package, 3)
+        self.assertEqual(self.progress(), (3, 3750000, 3))
+
+        sale = Sale.objects.filter(sales_person=self.rep).first()
+        sale.status = 'cancelled'
+        sale.save()
+        self.assertEqual(self.progress(), (2, 2500000, 3))
+
+        sale.status = 'active'
+        sale.total_value = 1000000
+        sale.save()
+        self.assertEqual(self.progress(), (3, 3500000, 3))
+
+        sale.sale_date = self.month - timedelta(days=1)
+        sale.save()
+        self.assertEqual(self.progress(), (2, 2500000, 3))
+
+        visit = Visit.objects.filter(sales_person=self.rep).first()
+        visit.sales_person = self.other
+        visit.save()
+        self.assertEqual(self.progress()[2], 2)
+        self.assertEqual(self.progress(self.other)[2], 1)
+
+        Visit.objects.filter(sales_person=self.rep).first().delete()
+        Sale.objects.filter(sales_person=self.rep, sale_date__gte=self.month).first().delete()
+        self.assertEqual(self.progress(), (1, 1250000, 1))
+
+    def test_dashboard_reads_progress_from_target(self):
+        add_activity(self.rep, self.package, 1)
+        self.target()
+        self.client.force_login(self.rep)
+        dashboard_cache.cache().clear()
+        self.assertContains(self.client.get(reverse('sales_dashboard')), '1/10')
+
+    def test_reconcile_repairs_drift(self):
+        self.target()
+        add_activity(self.rep, self.package, 2)
+        SalesTarget.objects.update(achieved_count=7, achieved_visits=0)
+
+        out = io.StringIO()
+        call_command('reconcile_targets', '--dry-run', stdout=out)
+        self.assertIn('achieved_count 7 -> 2', out.getvalue())
+        self.assertEqual(self.progress()[0], 7)
+
+        call_command('reconcile_targets', stdout=io.StringIO())
+        self.assertEqual(self.progress(), (2, 2500000, 2))
+        out = io.StringIO()
+        call_command('reconcile_targets', '--month', self.month.strftime('%Y-%m'), stdout=out)
+        self.assertIn('in sync', out.getvalue())
+
+
+class LiveFeedTests(TeamTestCase):
+    reps = ['rep']
+
+    def setUp(self):
+        dashboard_cache.cache().clear()
+        self.client.force_login(self.admin)
+
+    def events(self, response):
+        """``[(name, data)]`` and the last event id from an SSE response"""
+        body = b''.join(response.streaming_content).decode()
+        events, last_id = [], None
+        for block in body.split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            if 'event' in fields:
+                events.append((fields['event'], json.loads(fields['data'])))
+                last_id = fields['id']
+        return events, last_id
+
+    def test_dashboard_starts_stream_from_its_cursor(self):
+        add_activity(self.rep, self.package, 1)
+        response = self.client.get(reverse('admin_dashboard'))
+        cursor = live.Cursor.parse(response.context['live_cursor'])
+        self.assertEqual(cursor, live.current_cursor())
+        self.assertContains(response, f"{reverse('admin_dashboard_stream')}?cursor={cursor}")
+
+    def test_sends_only_whats_new(self):
+        cursor = live.current_cursor()
+        url = f"{reverse('admin_dashboard_stream')}?cursor={cursor}"
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        with count_queries() as counter:
+            self.assertEqual(self.events(response), ([], None))
+        self.assertEqual(counter.count, 0)
+
+        add_activity(self.rep, self.package, 2)
+        events, last_id = self.events(self.client.get(url))
+        self.assertEqual([name for name, _ in events], ['sale', 'sale', 'visit', 'visit', 'kpi'])
+        self.assertEqual(events[1][1]['customer__full_name'], 'Customer 1')
+        kpi = events[-1][1]
+        self.assertEqual((kpi['total_sales'], kpi['total_visits'], kpi['today']['sales']), (2, 2, 2))
+
+        # A reconnecting browser resumes from the last event id
+        response = self.client.get(url, headers={'Last-Event-ID': last_id})
+        self.assertEqual(self.events(response), ([], None))
+
+        Sale.objects.update(status='active')
+        Sale.objects.first().save()
+        events, _ = self.events(self.client.get(url, headers={'Last-Event-ID': last_id}))
+        self.assertEqual([name for name, _ in events], ['kpi'])
+
+    def test_staff_only(self):
+        self.client.force_login(self.rep)
+        self.assertEqual(self.client.get(reverse('admin_dashboard_stream')).status_code, 302)
+
+    @override_settings(LIVE_FEED_POLL_INTERVAL=0.01, LIVE_FEED_MAX_DURATION=0.1)
+    async def test_streams_over_asgi(self):
+        cursor = await sync_to_async(live.current_cursor)()
+        await sync_to_async(add_activity)(self.rep, self.package, 1)
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('admin_dashboard_stream'), {'cursor': str(cursor)})
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertTrue(body.startswith('retry: 3000'))
+        self.assertEqual(body.count('event: sale'), 1)
+        self.assertEqual(body.count('event: kpi'), 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class AsyncViewsTests(TeamFixture, TransactionTestCase):
+    """Committed data, so the query threads ``concurrency.gather`` uses can see it"""
+    reps = ['rep']
+
+    def setUp(self):
+        self.create_team()
+        add_activity(self.rep, self.package, 3)
+        dashboard_cache.cache().clear()
+
+    def test_gather_matches_run(self):
+        today = timezone.now().date()
+        for queries in [
+            views.admin_dashboard_queries(today),
+            views.sales_dashboard_queries(self.rep, today),
+            views.feedback_analysis_queries(today.replace(day=1), today),
+        ]:
+            self.assertEqual(async_to_sync(concurrency.gather)(queries), concurrency.run(queries))
+
+    @override_settings(DEBUG=True)
+    def test_middleware_stays_async_under_asgi(self):
+        # Django logs each synchronous middleware it has to run in a thread
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    def test_async_requests_are_measured_across_query_threads(self):
+        def queries(response):
+            return int(re.search(r'"(\d+) queries"', response['Server-Timing'])[1])
+
+        middleware = InstrumentationMiddleware(views.admin_dashboard_async)
+        self.assertTrue(iscoroutinefunction(middleware))
+        gathered = async_to_sync(middleware)(make_request(self.admin))
+        dashboard_cache.cache().clear()
+        run = InstrumentationMiddleware(views.admin_dashboard)(make_request(self.admin))
+        self.assertGreater(queries(run), 0)
+        self.assertEqual(queries(gathered), queries(run))
+
+    def test_async_views_render_like_sync(self):
+        for name, user, expected in [
+            ('admin_dashboard', self.admin, 'data-kpi="total_sales">3<'),
+            ('sales_dashboard', self.rep, 'Customer 2'),
+            ('team_performance', self.admin, 'rep'),
+            ('feedback_analysis', self.admin, 'Wants a quote'),
+        ]:
+            with self.subTest(name):
+                request = make_request(user)
+                response = async_to_sync(getattr(views, f'{name}_async'))(request)
+                self.assertContains(response, expected)
+                self.assertContains(getattr(views, name)(make_request(user)), expected)
+
+    def test_benchmark(self):
+        out = io.StringIO()
+        call_command('benchmark_async', '--requests', '2', '--concurrency', '2', '--output', os.devnull, stdout=out)
+        for name in ['admin_dashboard', 'sales_dashboard', 'team_performance', 'feedback_analysis']:
+            self.assertIn(f'{name:<20} async is', out.getvalue())
+
+
+class SearchTests(TeamTestCase):
+    def visit(self, user, location, feedback, **fields):
+        return Visit.objects.create(
+            sales_person=user, location=location, outcome='not_interested', feedback=feedback, **fields,
+        )
+
+    def titles(self, user, text, kinds=None):
+        return [document.title for document in search.find(user, text, kinds)]
+
+    def test_index_follows_saves_and_deletes(self):
+        visit = self.visit(self.rep, 'Kololo', 'Prices are too high for students')
+        self.assertEqual(self.titles(self.rep, 'price'), ['Kololo'])
+
+        visit.feedback = 'Coverage is patchy'
+        visit.save()
+        self.assertEqual(self.titles(self.rep, 'price'), [])
+        self.assertEqual(self.titles(self.rep, 'patchy coverage'), ['Kololo'])
+        self.assertEqual(self.titles(self.rep, 'patchy kampala'), [])
+
+        visit.delete()
+        self.assertFalse(SearchDocument.objects.exists())
+
+    def test_ranks_title_matches_first_and_hides_others_rows(self):
+        self.visit(self.rep, 'Ntinda', 'Moved here from Kololo last year')
+        self.visit(self.rep, 'Kololo', 'Wants fibre')
+        self.visit(self.other, 'Kololo Hill', 'Wants fibre too')
+        self.assertEqual(self.titles(self.rep, 'kololo'), ['Kololo', 'Ntinda'])
+        # Equal ranks come newest first
+        self.assertEqual(self.titles(self.admin, 'kololo'), ['Kololo Hill', 'Kololo', 'Ntinda'])
+
+    def test_customers_are_found_by_their_sales_reps_and_by_phone_digits(self):
+        customer = Customer.objects.create(full_name='Grace Nakato', phone='0772 123-456', address='Plot 9')
+        Customer.objects.create(full_name='Grace Other', phone='0772000000', address='Plot 10')
+        Sale.objects.create(sales_person=self.rep, customer=customer, package=self.package)
+        self.assertEqual(self.titles(self.rep, 'grace', ['customer']), ['Grace Nakato'])
+        self.assertEqual(self.titles(self.rep, '0772123456'), ['Grace Nakato'])
+        self.assertEqual(self.titles(self.other, 'grace'), [])
+        self.assertEqual(len(self.titles(self.admin, 'grace')), 2)
+
+    def test_imported_rows_are_indexed(self):
+        body = (
+            'location,visit_date,visit_time,outcome,feedback,full_name,phone\n'
+            'Bukoto,2025-01-10,10:00,interested,Asked about the router,Joseph Okello,0700000009\n'
+        )
+        imports.import_visits(io.StringIO(body), self.rep)
+        self.assertEqual(self.titles(self.rep, 'router'), ['Bukoto'])
+        self.assertEqual(self.titles(self.rep, 'okello'), ['Joseph Okello'])
+
+    def test_rebuild(self):
+        self.visit(self.rep, 'Kololo', 'Prices are too high')
+        SearchDocument.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 1 documents', out.getvalue())
+        self.assertEqual(self.titles(self.rep, 'price'), ['Kololo'])
+
+    def test_migration_backfills_rows_saved_before_the_index(self):
+        backfill = importlib.import_module('zakcomapp.migrations.0012_backfill_search_index').backfill_search_documents
+        schema_editor = mock.Mock(connection=connection)
+        self.visit(self.rep, 'Kololo', 'Prices are too high')
+        Prospect.objects.create(
+            full_name='Price Watcher', phone='0700 000-001', address='Plot 1', location='Ntinda', added_by=self.rep,
+        )
+        customer = Customer.objects.create(full_name='Grace Nakato', phone='0772123456', address='Plot 9')
+        Sale.objects.create(sales_person=self.rep, customer=customer, package=self.package)
+        indexed = {(document.kind, document.title, document.body) for document in SearchDocument.objects.all()}
+        SearchDocument.objects.exclude(kind='customer').delete()
+
+        backfill(apps, schema_editor)
+        backfill(apps, schema_editor)
+        self.assertEqual({(document.kind, document.title, document.body) for document in SearchDocument.objects.all()}, indexed)
+        self.assertEqual(self.titles(self.rep, 'price'), ['Price Watcher', 'Kololo'])
+        self.assertEqual(self.titles(self.rep, '0700000001'), ['Price Watcher'])
+        self.assertEqual(self.titles(self.rep, 'grace'), ['Grace Nakato'])
+
+    @skipUnless(search.native(), "Postgres full-text search")
+    def test_postgres_query_syntax(self):
+        self.visit(self.rep, 'Kololo', 'Prices are too high for students')
+        self.visit(self.rep, 'Ntinda', 'Too high, moved from Kololo')
+        self.visit(self.rep, 'Bukoto', 'Wants fibre')
+        self.assertEqual(self.titles(self.rep, 'kololo'), ['Kololo', 'Ntinda'])
+        self.assertEqual(self.titles(self.rep, '"too high" -kololo'), [])
+        self.assertCountEqual(self.titles(self.rep, 'student or fibre'), ['Kololo', 'Bukoto'])
+        self.assertEqual(self.titles(self.rep, 'high -student'), ['Ntinda'])
+
+    def test_view_filters_and_paginates(self):
+        for i in range(30):
+            self.visit(self.rep, f'Estate {i}', 'Worried about price')
+        Prospect.objects.create(
+            full_name='Price Watcher', phone='0700000001', address='Plot 1', location='Kololo', added_by=self.rep,
+        )
+        self.client.force_login(self.rep)
+        response = self.client.get(reverse('search'), {'q': 'price'})
+        self.assertEqual(response.context['results'].paginator.count, 31)
+        # The prospect's name matches, so it outranks the feedback
+        self.assertEqual(response.context['results'][0].title, 'Price Watcher')
+        self.assertContains(response, 'page=2')
+
+        response = self.client.get(reverse('search'), {'q': 'price', 'kind': 'prospect'})
+        self.assertEqual(response.context['results'].paginator.count, 1)
+        self.assertIsNone(self.client.get(reverse('search')).context['results'])
+
+
+class ObjectionAnalyticsTests(TeamTestCase):
+    def setUp(self):
+        self.monday = timezone.now().date() - timedelta(days=timezone.now().weekday() + 7)
+
+    def visit(self, user, day, location='Kololo', provider='', **concerns):
+        return Visit.objects.create(
+            sales_person=user, visit_date=self.monday + timedelta(days=day), location=location,
+            outcome='not_interested', has_existing_provider=bool(provider), existing_provider_name=provider,
+            **concerns,
+        )
+
+    def rollup_rows(self):
+        return list(DailyObjectionRollup.objects.exclude(visits_count=0).values_list(
+            'date', 'location', 'provider', 'visits_count', 'price_concerns', 'existing_providers',
+        ).order_by('date', 'location', 'provider'))
+
+    def test_normalization(self):
+        for raw in ['MTN', ' mtn ', 'MTN Uganda Ltd.', 'mtn-uganda']:
+            self.assertEqual(objections.normalize_provider(raw), 'MTN')
+        self.assertEqual(objections.normalize_provider('liquid  TELECOM'), 'Liquid Telecom')
+        self.assertEqual(objections.normalize_provider(''), '')
+        self.assertEqual(objections.normalize_location('  KOLOLO   hill'), 'Kololo Hill')
+
+    def test_summary_merges_spellings(self):
+        self.visit(self.rep, 0, provider='MTN', price_concern=True)
+        self.visit(self.rep, 1, location='kololo ', provider='mtn uganda')
+        self.visit(self.other, 1, location='Ntinda', provider='Airtel', coverage_concern=True)
+        # Unticked, so the leftover name is ignored
+        Visit.objects.create(
+            sales_person=self.rep, visit_date=self.monday, location='Ntinda', outcome='interested',
+            existing_provider_name='Airtel',
+        )
+
+        with count_queries() as counter:
+            summary = objections.summary(self.monday, self.monday + timedelta(days=6))
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(summary['totals'], {
+            'visits': 4, 'price_concern': 1, 'coverage_concern': 1, 'has_existing_provider': 3,
+        })
+        self.assertEqual(summary['rates']['has_existing_provider'], 75.0)
+        self.assertEqual(summary['competitors'], [
+            {'provider': 'MTN', 'mentions': 2, 'share': 66.7},
+            {'provider': 'Airtel', 'mentions': 1, 'share': 33.3},
+        ])
+        self.assertEqual(
+            [(row['name'], row['visits']) for row in objections.by_location(self.monday)],
+            [('Kololo', 2), ('Ntinda', 2)],
+        )
+        self.assertEqual([row['name'] for row in objections.by_rep(self.monday)], ['rep', 'other'])
+
+    def test_weekly_trend(self):
+        self.visit(self.rep, 0, price_concern=True)
+        self.visit(self.rep, 1)
+        self.visit(self.rep, 7, price_concern=True)
+        weeks = objections.weekly_trend(self.monday)
+        self.assertEqual([week['week'] for week in weeks], [self.monday, self.monday + timedelta(days=7)])
+        self.assertEqual([week['rates']['price_concern'] for week in weeks], [50.0, 100.0])
+        self.assertEqual([week['changes']['price_concern'] for week in weeks], [None, 50.0])
+
+    def test_rollup_follows_edits_and_rebuild(self):
+        visit = self.visit(self.rep, 0, provider='mtn', price_concern=True)
+        self.visit(self.other, 0, location='Ntinda')
+        visit.existing_provider_name = 'Airtel'
+        visit.location = 'Bukoto'
+        visit.save()
+        Visit.objects.filter(location='Ntinda').get().delete()
+        imports.import_visits(io.StringIO(
+            'location,visit_date,visit_time,outcome,feedback,has_existing_provider,existing_provider_name\n'
+            f'bukoto,{self.monday},10:00,interested,Happy with Airtel,yes,AIRTEL\n'
+        ), self.rep)
+
+        expected = [(self.monday, 'Bukoto', 'Airtel', 2, 1, 2)]
+        self.assertEqual(self.rollup_rows(), expected)
+        rollups.rebuild()
+        self.assertEqual(self.rollup_rows(), expected)
+
+    def test_view_period(self):
+        self.visit(self.rep, 0, provider='MTN')
+        self.client.force_login(self.admin)
+        start = self.monday.isoformat()
+        response = self.client.get(reverse('feedback_analysis'), {'start': start, 'end': start})
+        self.assertEqual(response.context['objections']['visits'], 1)
+        self.assertEqual(response.context['competitors'][0]['provider'], 'MTN')
+        self.assertContains(response, 'By Sales Person')
+
+        response = self.client.get(reverse('feedback_analysis'), {'start': 'nonsense'})
+        self.assertEqual(response.context['start'], timezone.now().date().replace(day=1))
+
+
+class ProspectDedupeTests(TeamTestCase):
+    reps = ['rep']
+
+    def setUp(self):
+        self.client.force_login(self.rep)
+
+    def log_visit(self, full_name, phone, outcome='interested'):
+        return self.client.post(reverse('log_visit'), {
+            'location': 'Kololo', 'visit_date': '2025-01-10', 'visit_time': '10:00',
+            'outcome': outcome, 'feedback': 'Ok', 'full_name': full_name, 'phone': phone,
+        })
+
+    def prospect(self, full_name, phone, **fields):
+        return Prospect.objects.create(
+            full_name=full_name, phone=phone, address='Plot 1', location='Kololo', added_by=self.rep, **fields,
+        )
+
+    def test_normalize(self):
+        for phone in ['0700 123456', '+256 700-123-456', '256700123456', '00256700123456',
+                      '700123456', '+256 (0)700 123456']:
+            self.assertEqual(phones.normalize(phone), '+256700123456', phone)
+        self.assertEqual(phones.normalize('+44 20 7946 0000'), '+442079460000')
+        self.assertEqual(phones.normalize('n/a'), '')
+
+    def test_repeat_visits_attach_to_one_prospect(self):
+        self.log_visit('Joseph Okello', '0700 123456')
+        self.log_visit('joseph okello', '+256700123456', outcome='follow_up')
+        self.log_visit('Joseph Okello', '256700123456')
+        # A different person sharing the number gets their own
+        self.log_visit('Mary Nakato', '0700123456')
+
+        self.assertEqual(Prospect.objects.count(), 2)
+        okello = Prospect.objects.get(full_name='Joseph Okello')
+        self.assertEqual(okello.visits.count(), 3)
+        self.assertEqual(okello.interest_level, 'very_interested')
+        self.assertEqual(okello.phone_key, '+256700123456')
+
+    def test_import_matches_normalized_phone(self):
+        known = self.prospect('Known Person', '0700000001')
+        report = imports.import_visits(io.StringIO(
+            'location,visit_date,visit_time,outcome,feedback,full_name,phone\n'
+            'Kololo,2025-01-10,10:00,interested,Ok,Known Person,+256 700 000 001\n'
+            'Ntinda,2025-01-10,11:00,interested,Ok,New Person,0700 000 002\n'
+            'Ntinda,2025-01-11,11:00,follow_up,Ok,New Person,256700000002\n'
+        ), self.rep).as_dict()
+        self.assertEqual((report['prospects_matched'], report['prospects_created']), (1, 1))
+        self.assertEqual(known.visits.count(), 1)
+        self.assertEqual(Prospect.objects.get(full_name='New Person').phone_key, '+256700000002')
+
+    def test_dedupe_command(self):
+        oldest = self.prospect('Joseph Okello', '0700123456')
+        converted = self.prospect('Jospeh Okello', '+256 700 123456', interest_level='converted',
+                                  email='jo@example.com')
+        typo = self.prospect('JOSEPH OKELLO', '256700123456', preferred_package=self.package)
+        housemate = self.prospect('Mary Nakato', '0700123456')
+        self.prospect('Someone Else', '0700999999')
+        Customer.objects.create(full_name='Joseph Okello', phone='0700123456', address='Plot 1', prospect=converted)
+        for prospect in [oldest, typo, housemate]:
+            Visit.objects.create(sales_person=self.rep, prospect=prospect, location='Kololo',
+                                 outcome='interested', feedback='Ok')
+
+        out = io.StringIO()
+        call_command('dedupe_prospects', '--dry-run', stdout=out)
+        self.assertIn('1 groups of duplicates found', out.getvalue())
+        self.assertEqual(Prospect.objects.count(), 5)
+
+        call_command('dedupe_prospects', stdout=out)
+        self.assertIn('Merged 1 groups, removing 2 duplicate prospects', out.getvalue())
+        self.assertEqual(Prospect.objects.count(), 3)
+        converted.refresh_from_db()
+        self.assertEqual(converted.visits.count(), 2)
+        self.assertEqual(converted.preferred_package, self.package)
+        self.assertEqual(converted.interest_level, 'converted')
+        self.assertEqual(housemate.visits.count(), 1)
+        self.assertEqual(list(prospects.duplicate_groups()), [])
+
+
+class TerritoryTests(TeamTestCase):
+    reps = ['rep']
+
+    def setUp(self):
+        # Territories rolled back with each test would otherwise stay in the cached Matcher
+        self.addCleanup(dashboard_cache.bump, territories.VERSION_SCOPE)
+        self.kololo = Territory.objects.create(name='Kololo', aliases='Kololo Hill\nKololo Heights')
+        self.ntinda = Territory.objects.create(name='Ntinda')
+        self.village = Territory.objects.create(name="Ministers' Village")
+
+    def visit(self, location, outcome='interested', **fields):
+        return Visit.objects.create(sales_person=self.rep, location=location, outcome=outcome, feedback='Ok', **fields)
+
+    def test_matching(self):
+        for location, territory in [
+            ('Plot 12, KOLOLO hill rd', self.kololo),
+            ('kololo', self.kololo),
+            ('Ntinda, near the market', self.ntinda),
+            # The longer, more specific name wins
+            ('Plot 5 Ntinda Ministers Village', self.village),
+            ('Somewhere else', None),
+        ]:
+            self.assertEqual(territories.match(location), territory and territory.pk, location)
+
+    def test_matcher_is_cached_until_a_territory_changes(self):
+        territories.match('Kololo')
+        with count_queries() as counter:
+            self.assertEqual(self.visit('Kololo').territory_id, self.kololo.pk)
+        self.assertFalse([sql for sql, _ in counter.queries if 'FROM "zakcomapp_territory"' in sql])
+
+        self.ntinda.aliases = 'Kiwatule'
+        self.ntinda.save()
+        self.assertEqual(territories.match('Kiwatule'), self.ntinda.pk)
+        self.village.delete()
+        self.assertEqual(territories.match('Ministers Village'), None)
+
+    def test_unchanged_locations_keep_their_territory(self):
+        prospect = Prospect.objects.create(
+            full_name='Jane', phone='0700000001', address='Plot 1', location='Kira', added_by=self.rep,
+        )
+        visit = self.visit('Kira')
+        kira = Territory.objects.create(name='Kira')
+        for row in [prospect, visit]:
+            # Left for assign_territories, like any row saved before an alias edit
+            row.save()
+            self.assertIsNone(type(row).objects.get(pk=row.pk).territory)
+            row.location = 'Kira Town'
+            row.save()
+            self.assertEqual(type(row).objects.get(pk=row.pk).territory, kira)
+
+    def test_saves_and_imports_are_matched(self):
+        self.assertEqual(self.visit('Kololo Heights Estate').territory, self.kololo)
+        prospect = Prospect.objects.create(
+            full_name='Jane', phone='0700000001', address='Plot 1', location='ntinda', added_by=self.rep,
+        )
+        self.assertEqual(prospect.territory, self.ntinda)
+
+        imports.import_visits(io.StringIO(
+            'location,visit_date,visit_time,outcome,feedback,full_name,phone,prospect_location\n'
+            'Kololo Hill,2025-01-10,10:00,interested,Ok,New Person,0700000002,Ministers Village\n'
+        ), self.rep)
+        self.assertEqual(Visit.objects.get(location='Kololo Hill').territory, self.kololo)
+        self.assertEqual(Prospect.objects.get(full_name='New Person').territory, self.village)
+
+    def test_assign_command_backfills_in_chunks(self):
+        visits = [self.visit(location) for location in ['Kira', 'Kira Town', 'Kololo', 'Nowhere']]
+        kira = Territory.objects.create(name='Kira', aliases='Kira Town')
+        out = io.StringIO()
+        call_command('assign_territories', '--chunk-size', '2', stdout=out)
+        self.assertIn('Visits: 2 moved', out.getvalue())
+        self.assertIn('Nowhere', out.getvalue())
+        self.assertEqual(
+            [Visit.objects.get(pk=visit.pk).territory_id for visit in visits],
+            [kira.pk, kira.pk, self.kololo.pk, None],
+        )
+
+    def test_performance(self):
+        self.visit('Kololo', outcome='closed_sale')
+        self.visit('Kololo', price_concern=True)
+        self.visit('Ntinda', coverage_concern=True)
+        self.visit('Ntinda')
+        self.visit('Nowhere')
+
+        with count_queries() as counter:
+            stats = territories.performance()
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(
+            [(row['territory__name'], row['visits_count'], row['conversion_rate']) for row in stats],
+            [('Kololo', 2, 50.0), ('Ntinda', 2, 0.0)],
+        )
+        self.assertEqual(stats[0]['price_concern_rate'], 50.0)
+        self.assertEqual(stats[1]['coverage_concern_rate'], 50.0)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('territory_performance'))
+        self.assertContains(response, 'Kololo')
+        self.assertContains(response, 'Nowhere')
+
+
+class FollowUpQueueTests(TeamTestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.prospect = Prospect.objects.create(
+            full_name='Jane', phone='0700000001', address='Plot 1', location='Kololo', added_by=self.rep,
+        )
+
+    def visit(self, days, outcome='follow_up', prospect=None, rep=None, **fields):
+        return Visit.objects.create(
+            sales_person=rep or self.rep, prospect=prospect, location='Kololo', outcome=outcome, feedback='Ok',
+            follow_up_date=self.today + timedelta(days=days) if outcome == 'follow_up' else None, **fields,
+        )
+
+    def test_visits_keep_the_queue_in_sync(self):
+        visit = self.visit(2)
+        self.assertEqual(visit.follow_up.due_date, self.today + timedelta(days=2))
+
+        visit.follow_up_date = self.today + timedelta(days=5)
+        visit.save()
+        self.assertEqual(FollowUp.objects.get().due_date, self.today + timedelta(days=5))
+
+        visit.outcome = 'interested'
+        visit.save()
+        self.assertFalse(FollowUp.objects.exists())
+
+    def test_a_later_visit_to_the_prospect_settles_it(self):
+        first = self.visit(1, prospect=self.prospect, visit_date=self.today - timedelta(days=3))
+        callback = self.visit(0, outcome='interested', prospect=self.prospect)
+        follow_up = FollowUp.objects.get(visit=first)
+        self.assertEqual(follow_up.state, FollowUp.DONE)
+        self.assertEqual(follow_up.resolved_by, callback)
+
+    def test_queue_is_bucketed_in_one_query(self):
+        overdue = self.visit(-2)
+        due = self.visit(0)
+        soon = self.visit(3)
+        self.visit(followups.UPCOMING_DAYS + 1)
+        self.visit(-followups.EXPIRE_AFTER_DAYS - 1)
+        self.visit(0, rep=self.other)
+
+        with count_queries() as counter:
+            queue = followups.queue(self.rep, self.today)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(
+            {bucket: [follow_up.visit_id for follow_up in rows] for bucket, rows in queue.items()},
+            {'overdue': [overdue.pk], 'today': [due.pk], 'upcoming': [soon.pk]},
+        )
+
+    def test_done_and_snooze(self):
+        due = self.visit(0)
+        overdue = self.visit(-4)
+        self.client.force_login(self.rep)
+        response = self.client.get(reverse('sales_dashboard'))
+        self.assertContains(response, 'Overdue')
+
+        self.client.post(reverse('complete_follow_up', args=[due.follow_up.pk]))
+        self.client.post(reverse('snooze_follow_up', args=[overdue.follow_up.pk]), {'days': 3})
+        self.assertEqual(FollowUp.objects.get(visit=due).state, FollowUp.DONE)
+        snoozed = FollowUp.objects.get(visit=overdue)
+        self.assertEqual((snoozed.due_date, snoozed.snoozes), (self.today + timedelta(days=3), 1))
+        # The cached dashboard was dropped
+        queue = self.client.get(reverse('sales_dashboard')).context['follow_ups']
+        self.assertEqual([follow_up.pk for follow_up in queue['upcoming']], [snoozed.pk])
+
+        self.client.force_login(self.other)
+        response = self.client.post(reverse('complete_follow_up', args=[snoozed.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_refresh_command_reconciles_and_expires(self):
+        stale = self.visit(-followups.EXPIRE_AFTER_DAYS - 1)
+        settled = self.visit(-1, prospect=self.prospect, visit_date=self.today - timedelta(days=2))
+        callback = Visit.objects.create(sales_person=self.rep, prospect=self.prospect, location='Kololo',
+                                        outcome='interested', feedback='Ok')
+        missing = self.visit(2)
+        FollowUp.objects.all().delete()
+        queued = self.visit(1)
+
+        out = io.StringIO()
+        call_command('refresh_follow_ups', stdout=out)
+        self.assertIn('Queued 3 follow-ups', out.getvalue())
+        self.assertEqual(
+            dict(FollowUp.objects.values_list('visit', 'state')),
+            {stale.pk: FollowUp.MISSED, settled.pk: FollowUp.DONE, missing.pk: FollowUp.OPEN,
+             queued.pk: FollowUp.OPEN},
+        )
+        self.assertIn('dashboards of 1 reps', out.getvalue())
+        self.assertEqual(FollowUp.objects.get(visit=settled).resolved_by, callback)
+
+    def test_imports_are_queued(self):
+        imports.import_visits(io.StringIO(
+            'location,visit_date,visit_time,outcome,feedback,follow_up_date,full_name,phone\n'
+            f'Kololo,{self.today},10:00,follow_up,Call back,{self.today + timedelta(days=2)},Jane,0700000001\n'
+        ), self.rep)
+        follow_up = FollowUp.objects.get()
+        self.assertEqual((follow_up.sales_person, follow_up.due_date), (self.rep, self.today + timedelta(days=2)))
+
+    def test_imports_settle_earlier_follow_ups(self):
+        earlier = self.visit(1, prospect=self.prospect, rep=self.other, visit_date=self.today - timedelta(days=3))
+        version = dashboard_cache.version(self.other.pk)
+        imports.import_visits(io.StringIO(
+            'location,visit_date,visit_time,outcome,feedback,full_name,phone\n'
+            f'Kololo,{self.today},10:00,interested,Called back,Jane,0700000001\n'
+        ), self.rep)
+        follow_up = FollowUp.objects.get(visit=earlier)
+        self.assertEqual(follow_up.state, FollowUp.DONE)
+        self.assertEqual(follow_up.resolved_by, Visit.objects.get(feedback='Called back'))
+        self.assertIsNotNone(follow_up.completed_at)
+        # The other rep's dashboard shows the queue, so it was dropped too
+        self.assertNotEqual(dashboard_cache.version(self.other.pk), version)
+
+
+class TrendTests(TeamTestCase):
+    reps = ['alice', 'bob']
+    monthly_price = 100
+    installation_fee = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.office = InternetPackage.objects.create(name='Office', speed='50 Mbps', monthly_price=500, installation_fee=0)
+
+    def sell(self, rep, package, day, status='active'):
+        return super().sell(rep, package, status=status, sale_date=day, total_value=package.monthly_price)
+
+    def test_buckets(self):
+        self.assertEqual(
+            trends.buckets(date(2025, 1, 30), date(2025, 3, 2), 'month'),
+            [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)],
+        )
+        # Weeks start on Monday
+        self.assertEqual(trends.buckets(date(2025, 1, 8), date(2025, 1, 14), 'week'), [date(2025, 1, 6), date(2025, 1, 13)])
+        self.assertEqual(trends.default_start(date(2025, 3, 15), 'month'), date(2024, 4, 1))
+        self.assertEqual(trends.year_earlier(date(2024, 2, 29)), date(2023, 2, 28))
+
+    def test_monthly_revenue_per_rep_is_gap_filled(self):
+        self.sell(self.alice, self.package, date(2025, 1, 10))
+        self.sell(self.alice, self.office, date(2025, 3, 5))
+        self.sell(self.bob, self.package, date(2025, 3, 20))
+        self.sell(self.bob, self.package, date(2025, 5, 1))
+
+        with count_queries() as counter:
+            trend = trends.trend('revenue', 'month', date(2025, 1, 15), date(2025, 4, 30), by='rep')
+        self.assertEqual(counter.count, 1)
+        # The first month is widened back to the 1st, so January 10 counts
+        self.assertEqual(trend['buckets'], [date(2025, m, 1) for m in range(1, 5)])
+        self.assertEqual(
+            [(line['name'], line['values']) for line in trend['series']],
+            [('alice', [100, 0, 500, 0]), ('bob', [0, 0, 100, 0])],
+        )
+
+        total = trends.trend('sales', 'day', date(2025, 2, 1), date(2025, 2, 3))
+        self.assertEqual(total['series'], [{'key': '', 'name': 'Total', 'values': [0, 0, 0]}])
+
+        by_status = trends.trend('sales', 'month', date(2025, 3, 1), date(2025, 3, 31), by='status')
+        self.assertEqual([line['name'] for line in by_status['series']], ['Active'])
+
+    @skipUnless(connection.vendor == 'postgresql', "Postgres generate_series")
+    def test_database_fills_the_gaps_like_python(self):
+        self.sell(self.alice, self.package, date(2025, 1, 10))
+        self.sell(self.alice, self.office, date(2025, 3, 5))
+        self.sell(self.bob, self.package, date(2025, 3, 20))
+        start, end = date(2025, 1, 1), date(2025, 4, 30)
+        for granularity in trends.GRANULARITIES:
+            for by in [None, 'rep']:
+                with self.subTest(granularity=granularity, by=by):
+                    days = trends.buckets(start, end, granularity)
+                    rows = trends._grouped('revenue', granularity, days[0], end, by)
+                    filled = trends._filled_in_sql(rows, days[0], days[-1], granularity)
+                    # Every bucket of every series, the empty ones as zeros
+                    self.assertEqual(len(filled), len(days) * (2 if by else 1))
+                    self.assertEqual({row[0] for row in filled}, set(days))
+                    self.assertEqual(
+                        sorted(row for row in filled if row[3]),
+                        sorted(row for row in rows.values_list('bucket', 'series', 'name', 'value')),
+                    )
+
+    def test_daily_activity_matches_the_trend(self):
+        today = timezone.now().date()
+        self.sell(self.alice, self.package, today)
+        activity = analytics.daily_activity(today - timedelta(days=2), 3)
+        self.assertEqual([(row['sales'], row['visits']) for row in activity], [(0, 0), (0, 0), (1, 0)])
+
+    def test_api(self):
+        self.sell(self.alice, self.package, date(2024, 3, 5))
+        self.sell(self.alice, self.office, date(2025, 3, 5))
+        self.client.force_login(self.admin)
+        url = reverse('sales_trend')
+
+        data = self.client.get(url, {
+            'metric': 'revenue', 'granularity': 'month', 'start': '2025-01-01', 'end': '2025-03-31',
+            'by': 'package', 'compare': 'year',
+        }).json()
+        self.assertEqual(data['current']['buckets'], ['2025-01-01', '2025-02-01', '2025-03-01'])
+        self.assertEqual(data['current']['series'][0]['name'], 'Office')
+        self.assertEqual(data['current']['series'][0]['values'], [0, 0, 500.0])
+        self.assertEqual(data['previous']['series'][0]['values'], [0, 0, 100.0])
+
+        # Served from the cache until a sale or visit is written
+        with count_queries() as counter:
+            self.client.get(url, {'granularity': 'week'})
+            self.client.get(url, {'granularity': 'week'})
+        cached = counter.count
+        with count_queries() as counter:
+            self.client.get(url, {'granularity': 'week'})
+        self.assertLess(counter.count, cached)
+
+        for params in [{'metric': 'calls'}, {'granularity': 'hour'}, {'metric': 'visits', 'by': 'package'},
+                       {'start': '2000-01-01'}]:
+            self.assertEqual(self.client.get(url, params).status_code, 400, params)
+
+
+class LeaderboardTests(TeamTestCase):
+    reps = ['alice', 'bob', 'carol']
+    monthly_price = 100
+    installation_fee = 0
+
+    def sell(self, rep, day, value=100):
+        return super().sell(rep, sale_date=day, total_value=value)
+
+    def test_periods(self):
+        today = date(2025, 5, 20)
+        self.assertEqual(leaderboard.period('2025-02', today), (date(2025, 2, 1), date(2025, 2, 28)))
+        self.assertEqual(leaderboard.period('2024-Q4', today), (date(2024, 10, 1), date(2024, 12, 31)))
+        self.assertEqual(leaderboard.period('2025-13', today), (date(2025, 5, 1), date(2025, 5, 31)))
+        self.assertEqual(leaderboard.label(date(2024, 10, 1), date(2024, 12, 31)), 'Q4 2024')
+        self.assertEqual(leaderboard.choices(today)[12:14], [('2025-Q2', 'Q2 2025'), ('2025-Q1', 'Q1 2025')])
+
+    def test_ranks_in_one_statement(self):
+        self.sell(self.alice, date(2025, 1, 10), 300)
+        self.sell(self.bob, date(2025, 2, 10), 200)
+        self.sell(self.carol, date(2025, 2, 11), 200)
+
+        with count_queries() as counter:
+            rows = leaderboard.live(date(2025, 2, 1), date(2025, 2, 28))
+        self.assertEqual(counter.count, 1)
+        # bob and carol tie for first in February; alice leads all-time
+        self.assertEqual(
+            [(row['username'], row['rank'], row['total_rank']) for row in rows],
+            [('bob', 1, 2), ('carol', 1, 2), ('alice', 3, 1)],
+        )
+
+        quarter = leaderboard.live(*leaderboard.period('2025-Q1', date(2025, 5, 1)))
+        self.assertEqual([(row['username'], row['period_revenue']) for row in quarter][0], ('alice', 300))
+
+    def test_closed_months_are_read_from_the_snapshot(self):
+        last_month = (timezone.now().date().replace(day=1) - timedelta(days=1)).replace(day=1)
+        self.sell(self.alice, last_month)
+        out = io.StringIO()
+        call_command('close_month', stdout=out)
+        self.assertIn('3 sales people ranked', out.getvalue())
+
+        # A late sale doesn't move the frozen month
+        self.sell(self.bob, last_month, 500)
+        start, end = leaderboard.period(last_month.strftime('%Y-%m'), timezone.now().date())
+        with count_queries() as counter:
+            rows, closed_at = leaderboard.standings(start, end, timezone.now().date())
+        self.assertEqual(counter.count, 1)
+        self.assertIsNotNone(closed_at)
+        self.assertEqual(rows[0]['username'], 'alice')
+
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('team_performance'), {'period': last_month.strftime('%Y-%m')})
+        self.assertContains(response, 'as closed on')
+        self.assertEqual(response.context['team_stats'][0]['username'], 'alice')
+
+        call_command('close_month', '--month', last_month.strftime('%Y-%m'), stdout=io.StringIO())
+        self.assertEqual(leaderboard.frozen(last_month)[0]['username'], 'bob')
+
+    def test_unclosed_months_are_read_live_without_writing(self):
+        self.sell(self.alice, date(2024, 3, 5))
+        rows, closed_at = leaderboard.standings(date(2024, 3, 1), date(2024, 3, 31), timezone.now().date())
+        self.assertIsNone(closed_at)
+        self.assertEqual(rows[0]['username'], 'alice')
+
+        self.client.force_login(self.admin)
+        # Neither a month with sales nor an empty one is closed by reading it
+        for month in ['2024-03', '2024-04']:
+            response = self.client.get(reverse('team_performance'), {'period': month})
+            self.assertNotContains(response, 'as closed on')
+        self.assertFalse(MonthlyStanding.objects.exists())
+
+        call_command('close_month', '--backfill', stdout=io.StringIO())
+        self.assertTrue(MonthlyStanding.objects.filter(month=date(2024, 3, 1), sales_person=self.alice, rank=1).exists())
+
+
+class CommissionTests(TeamTestCase):
+    month = date(2025, 3, 1)
+    reps = ['alice', 'bob']
+    monthly_price = 100
+    installation_fee = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.office = InternetPackage.objects.create(name='Office', speed='50 Mbps', monthly_price=500, installation_fee=0)
+        CommissionRate.objects.create(package=cls.package, valid_from=date(2024, 1, 1), rate=5)
+        # Raised from March, with more for two-year contracts
+        CommissionRate.objects.create(package=cls.package, valid_from=date(2025, 3, 1), rate=10,
+                                      long_contract_months=24, long_contract_rate=15)
+
+    def sell(self, rep, package, day, status='active', value=1000, duration=12):
+        return super().sell(rep, package, status=status, sale_date=day, total_value=value, contract_duration=duration)
+
+    def test_rates_tiers_and_statuses(self):
+        target = SalesTarget.objects.create(sales_person=self.alice, month=self.month, target_amount=2000, target_count=1)
+        CommissionTier.objects.create(attainment=0, multiplier=Decimal('0.5'))
+        CommissionTier.objects.create(attainment=100, multiplier=Decimal('1.2'))
+        SalesTarget.objects.create(sales_person=self.bob, month=self.month, target_amount=10000, target_count=1)
+
+        self.sell(self.alice, self.package, date(2025, 3, 2))
+        self.sell(self.alice, self.package, date(2025, 3, 3), duration=24)
+        self.sell(self.alice, self.package, date(2025, 3, 4), status='pending')
+        self.sell(self.alice, self.office, date(2025, 3, 5))  # no rate for Office
+        self.sell(self.bob, self.package, date(2025, 3, 6), status='installed')
+        self.sell(self.bob, self.package, date(2025, 2, 28))
+
+        target.refresh_from_db()
+        self.assertGreaterEqual(target.achieved_amount, target.target_amount)
+        self.assertEqual(commissions.multipliers(self.month), {self.alice.pk: Decimal('1.2'), self.bob.pk: Decimal('0.5')})
+
+        with count_queries() as counter:
+            result = commissions.run(self.month)
+        self.assertLess(counter.count, 10)
+        self.assertEqual(result['earned'], 3)
+        self.assertEqual(
+            {row['sales_person__username']: row['net'] for row in commissions.payouts(self.month)},
+            # alice: (1000 x 10% + 1000 x 15%) x 1.2; bob: 1000 x 10% x 0.5
+            {'alice': Decimal('300.00'), 'bob': Decimal('50.00')},
+        )
+
+        # Idempotent
+        commissions.run(self.month)
+        self.assertEqual(CommissionEntry.objects.filter(month=self.month).count(), 3)
+
+    def test_cancelled_sales_are_clawed_back_once(self):
+        sale = self.sell(self.alice, self.package, date(2025, 2, 10))
+        commissions.run(date(2025, 2, 1))
+        # Cancelled in March
+        Sale.objects.filter(pk=sale.pk).update(
+            status='cancelled', cancelled_at=timezone.make_aware(datetime(2025, 3, 15)),
+        )
+
+        out = io.StringIO()
+        call_command('run_commissions', '--month', '2025-02', '--through', '2025-04', stdout=out)
+        self.assertIn('1 clawed back', out.getvalue())
+        # February keeps the commission it paid; March takes it back and April has nothing to do
+        ledger = [(date(2025, 2, 1), 'earned', Decimal('50.00')), (date(2025, 3, 1), 'clawback', Decimal('-50.00'))]
+        self.assertEqual(list(CommissionEntry.objects.order_by('month').values_list('month', 'kind', 'amount')), ledger)
+
+        # Editing the cancelled sale later doesn't move its cancellation
+        sale.refresh_from_db()
+        sale.notes = 'Customer moved away'
+        sale.save()
+        self.assertEqual(sale.cancelled_at, timezone.make_aware(datetime(2025, 3, 15)))
+        call_command('run_commissions', '--month', '2025-02', '--through', '2025-04', stdout=io.StringIO())
+        self.assertEqual(list(CommissionEntry.objects.order_by('month').values_list('month', 'kind', 'amount')), ledger)
+
+        # A sale cancelled before anything was paid earns nothing
+        cancelled = self.sell(self.bob, self.package, date(2025, 4, 2), status='cancelled')
+        self.assertIsNotNone(cancelled.cancelled_at)
+        call_command('run_commissions', '--month', '2025-04', stdout=io.StringIO())
+        self.assertFalse(CommissionEntry.objects.filter(month=date(2025, 4, 1)).exists())
+
+    def test_export(self):
+        self.sell(self.alice, self.package, date(2025, 3, 2))
+        commissions.run(self.month)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('export_commissions'), {'period': '2025-Q1'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('alice', lines[1])
+
+
+class RevenueProjectionTests(TeamTestCase):
+    reps = ['rep']
+    monthly_price = 100
+    installation_fee = 50
+    today = date(2025, 3, 20)
+
+    def sell(self, day, duration, status='active', installed=None):
+        return super().sell(status=status, sale_date=day, installation_date=installed, contract_duration=duration)
+
+    def test_curves(self):
+        # 100 a month, billed January to June
+        self.sell(date(2025, 1, 5), 6)
+        # Installed in April, so billed April to September
+        self.sell(date(2025, 3, 1), 6, status='installed', installed=date(2025, 4, 2))
+        # Still running a year on
+        self.sell(date(2024, 6, 1), 24)
+        # Not counted: not yet installed, cancelled, or already over
+        self.sell(date(2025, 3, 1), 12, status='pending')
+        self.sell(date(2025, 3, 1), 12, status='cancelled')
+        self.sell(date(2023, 1, 1), 12)
+
+        with count_queries() as counter:
+            projection = projections.project(self.today, months=8)
+        self.assertEqual(counter.count, 1)
+        self.assertEqual(projection['months'][0], date(2025, 3, 1))
+        self.assertEqual(projection['mrr'], [200, 300, 300, 300, 200, 200, 200, 100])
+        self.assertEqual(projection['expiring'], [0, 0, 0, 100, 0, 0, 100, 0])
+        # Each contract's last two months start a month before its last one
+        self.assertEqual(projection['renewals_due'], [0, 0, 1, 0, 0, 1, 0, 0])
+
+    def test_view_and_json(self):
+        self.sell(timezone.now().date(), 12)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('revenue_projection'))
+        self.assertContains(response, 'UGX 100')
+
+        data = self.client.get(reverse('revenue_projection'), {'format': 'json', 'months': 6}).json()
+        self.assertEqual(len(data['mrr']), 6)
+        self.assertEqual(data['mrr'][0], 100)
+        self.assertEqual(data['months'][0], timezone.now().date().replace(day=1).isoformat())
+
+
+class AuthCacheTests(TeamTestCase):
+    reps = ['rep']
+
+    def setUp(self):
+        auth_cache.cache().clear()
+        auth_cache.local().clear()
+        self.rep_client = self.client_class()
+        self.rep_client.force_login(self.rep)
+
+    def auth_queries(self, name='sales_dashboard'):
+        with count_queries() as counter:
+            response = self.rep_client.get(reverse(name))
+        return response, [sql for sql, _ in counter.queries if is_auth_query(sql)]
+
+    def test_session_and_user_come_from_the_cache(self):
+        self.auth_queries()
+        response, queries = self.auth_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_password_hashes_stay_in_process(self):
+        self.auth_queries()
+        self.assertEqual(self.auth_queries()[1], [])
+        shared = caches[settings.USER_CACHE]
+        self.assertNotEqual(shared, auth_cache.local())
+        self.assertFalse([value for value in shared._cache.values() if self.rep.password.encode() in value])
+
+    def test_edit_profile_refreshes_the_cached_user(self):
+        self.auth_queries()
+        self.rep_client.post(reverse('edit_profile'), {'first_name': 'Renamed', 'last_name': '', 'email': ''})
+        response, queries = self.auth_queries('edit_profile')
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.context['user'].first_name, 'Renamed')
+
+    def test_edit_user_deactivation_logs_the_rep_out(self):
+        self.auth_queries()
+        self.client.force_login(self.admin)
+        self.client.post(reverse('edit_user', args=[self.rep.pk]), {'first_name': 'Rep', 'last_name': '', 'email': ''})
+        response, _ = self.auth_queries()
+        self.assertEqual(response.status_code, 302)
+        self.assertIn(reverse('login'), response['Location'])
+
+    def test_delete_user_logs_the_rep_out(self):
+        self.auth_queries()
+        self.client.force_login(self.admin)
+        self.client.get(reverse('delete_user', args=[self.rep.pk]))
+        self.assertFalse(User.objects.filter(pk=self.rep.pk).exists())
+        response, _ = self.auth_queries()
+        self.assertEqual(response.status_code, 302)
+
+    def test_benchmark_command(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'report.json')
+            call_command('benchmark_auth', '--repeat', '2', '--output', path, stdout=io.StringIO())
+            with open(path) as f:
+                report = json.load(f)
+        before, after = report['variants']['database'], report['variants']['cached']
+        self.assertEqual(after['sales_dashboard']['status'], 200)
+        self.assertGreaterEqual(before['sales_dashboard']['auth_queries'], 2)
+        self.assertEqual(after['sales_dashboard']['auth_queries'], 0)
+
+
+class StaticAssetsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        source, self.root = os.path.join(tmp.name, 'source'), os.path.join(tmp.name, 'root')
+        os.makedirs(os.path.join(source, 'css'))
+        os.makedirs(os.path.join(source, 'img'))
+        with open(os.path.join(source, 'css', 'app.css'), 'w') as f:
+            f.write('.logo { background: url("../img/dot.svg"); }\n' + '.p-4 { padding: 1rem; }\n' * 100)
+        with open(os.path.join(source, 'img', 'dot.svg'), 'w') as f:
+            f.write('<svg xmlns="http://www.w3.org/2000/svg"/>')
+        overrides = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=self.root,
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def collect(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(self.root, 'staticfiles.json')) as f:
+            return json.load(f)['paths']
+
+    def test_collectstatic_hashes_and_compresses(self):
+        paths = self.collect()
+        hashed = paths['css/app.css']
+        self.assertRegex(hashed, r'^css/app\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.root, hashed + '.gz')))
+        self.assertEqual(os.path.exists(os.path.join(self.root, hashed + '.br')), assets.brotli is not None)
+        # Too small to be worth compressing
+        self.assertFalse(os.path.exists(os.path.join(self.root, paths['img/dot.svg'] + '.gz')))
+        # References inside the CSS point at the hashed files
+        with open(os.path.join(self.root, hashed)) as f:
+            self.assertIn(os.path.basename(paths['img/dot.svg']), f.read())
+
+    def test_middleware_serves_precompressed_variants(self):
+        hashed = self.collect()['css/app.css']
+        with open(os.path.join(self.root, hashed), 'rb') as f:
+            content = f.read()
+
+        response = self.client.get('/static/' + hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'], assets.IMMUTABLE)
+        self.assertNotIn('Content-Disposition', response)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), content)
+
+        response = self.client.get('/static/css/app.css')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotEqual(response['Cache-Control'], assets.IMMUTABLE)
+        self.assertIn(b'dot.svg', b''.join(response.streaming_content))
+
+        self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+        self.assertEqual(self.client.get('/static/../source/css/app.css').status_code, 404)
+
+    async def test_middleware_serves_over_asgi(self):
+        hashed = (await sync_to_async(self.collect)())['css/app.css']
+        with open(os.path.join(self.root, hashed), 'rb') as f:
+            content = f.read()
+        response = await self.async_client.get('/static/' + hashed, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(gzip.decompress(body), content)
+        self.assertEqual((await self.async_client.get('/static/css/missing.css')).status_code, 404)
+
+    def test_templates_link_hashed_names(self):
+        hashed = self.collect()['css/app.css']
+        self.assertEqual(staticfiles_storage.url('css/app.css'), '/static/' + hashed)
+        # Files that were never collected still resolve
+        self.assertEqual(staticfiles_storage.url('css/other.css'), '/static/css/other.css')
+
+
+class TemplateStaticFilesTests(TestCase):
+    def test_every_static_path_exists_and_nothing_comes_from_a_cdn(self):
+        templates = os.path.join(os.path.dirname(__file__), 'templates')
+        linked, remote = set(), []
+        for directory, _, files in os.walk(templates):
+            for name in files:
+                with open(os.path.join(directory, name)) as f:
+                    source = f.read()
+                linked.update(re.findall(r"""{%\s*static\s+['"]([^'"]+)['"]\s*%}""", source))
+                remote += re.findall(r"""(?:src|href)=["'](?:https?:)?//[^"']+""", source)
+        self.assertTrue({'css/app.css', 'vendor/chart.umd.js', 'vendor/fontawesome/css/all.min.css'} <= linked)
+        self.assertEqual([path for path in sorted(linked) if not finders.find(path)], [])
+        self.assertEqual(remote, [])
+
+    def test_vendored_fonts_are_committed(self):
+        # all.min.css loads its webfonts relative to itself
+        missing = [name for name in assets.VENDOR if not finders.find(name)]
+        self.assertEqual(missing, [])
@@ -0,0 +1,165 @@
+"""Time-bucketed trends over the daily rollup tables.
+
+``trend`` sums one metric (sales, revenue or visits) per day, week or month
+over any date range, optionally split into one series per rep, package,
+status or outcome. It reads the daily rollups (see rollups.py), so a
+multi-year chart costs one grouped query over a row per day and series
+instead of a scan of every sale. Buckets with no activity are filled in by
+the database with ``generate_series`` on Postgres, and in Python elsewhere.
+"""
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import F, Sum, Value
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .models import DailySalesRollup, DailyVisitRollup, Sale, Visit
+
+METRICS = {
+    'sales': (DailySalesRollup, 'sales_count'),
+    'revenue': (DailySalesRollup, 'revenue'),
+    'visits': (DailyVisitRollup, 'visits_count'),
+}
+# What a metric can be split by: the series id and the name shown for it
+SPLITS = {
+    DailySalesRollup: {
+        'rep': ('sales_person', 'sales_person__username'),
+        'package': ('package', 'package__name'),
+        'status': ('status', 'status'),
+    },
+    DailyVisitRollup: {
+        'rep': ('sales_person', 'sales_person__username'),
+        'outcome': ('outcome', 'outcome'),
+    },
+}
+LABELS = {'status': dict(Sale.STATUS_CHOICES), 'outcome': dict(Visit.OUTCOME_CHOICES)}
+
+GRANULARITIES = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+INTERVALS = {'day': '1 day', 'week': '1 week', 'month': '1 month'}
+# Buckets shown when no start date is given
+DEFAULT_BUCKETS = {'day': 30, 'week': 12, 'month': 12}
+# Longest series served, e.g. about 2.7 years of days
+MAX_BUCKETS = 1000
+
+
+def bucket_start(day, granularity):
+    """The first day of the bucket ``day`` falls in (weeks start on Monday)"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(bucket, granularity):
+    if granularity == 'week':
+        return bucket + timedelta(days=7)
+    if granularity == 'month':
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=1)
+
+
+def buckets(start, end, granularity):
+    """The first days of the buckets covering [start, end]"""
+    bucket, last = bucket_start(start, granularity), bucket_start(end, granularity)
+    days = []
+    while bucket <= last:
+        days.append(bucket)
+        bucket = next_bucket(bucket, granularity)
+    return days
+
+
+def default_start(end, granularity):
+    """Start of the range ending on ``end`` that spans DEFAULT_BUCKETS buckets"""
+    start = bucket_start(end, granularity)
+    for _ in range(DEFAULT_BUCKETS[granularity] - 1):
+        start = bucket_start(start - timedelta(days=1), granularity)
+    return start
+
+
+def year_earlier(day):
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        # 29 February
+        return day.replace(year=day.year - 1, day=28)
+
+
+def validate(metric, granularity, start, end, by=None):
+    """Raise ValueError unless the arguments make a trend ``trend`` can serve"""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r}; use one of {', '.join(METRICS)}")
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity {granularity!r}; use one of {', '.join(GRANULARITIES)}")
+    splits = SPLITS[METRICS[metric][0]]
+    if by and by not in splits:
+        raise ValueError(f"{metric} can be split by {', '.join(splits)}, not {by!r}")
+    if start > end:
+        raise ValueError("start is after end")
+    if len(buckets(start, end, granularity)) > MAX_BUCKETS:
+        raise ValueError(f"At most {MAX_BUCKETS} buckets; use a coarser granularity or a shorter range")
+
+
+def _grouped(metric, granularity, start, end, by=None, sales_person=None):
+    """The rollup rows summed per (bucket, series), without the empty buckets"""
+    model, measure = METRICS[metric]
+    rows = model.objects.filter(date__range=(start, end))
+    if sales_person is not None:
+        rows = rows.filter(sales_person=sales_person)
+    if by:
+        series, name = SPLITS[model][by]
+        split = {'series': F(series), 'name': F(name)}
+    else:
+        split = {'series': Value(''), 'name': Value('Total')}
+    return rows.annotate(bucket=GRANULARITIES[granularity]('date'), **split).values(
+        'bucket', 'series', 'name',
+    ).annotate(value=Sum(measure)).order_by()
+
+
+def _filled_in_sql(rows, first, last, granularity):
+    """
+    ``(bucket, series, name, value)`` for every bucket from ``first`` to
+    ``last`` and every series in ``rows``, zeros included. Postgres only.
+    """
+    sql, params = rows.query.get_compiler(using=rows.db).as_sql()
+    query = f"""
+        WITH r AS ({sql}), s AS (SELECT DISTINCT series, name FROM r)
+        SELECT b.bucket::date, s.series, s.name, COALESCE(r.value, 0)
+        FROM generate_series(%s::date, %s::date, %s::interval) AS b(bucket)
+        CROSS JOIN s
+        LEFT JOIN r ON r.bucket::date = b.bucket::date AND r.series IS NOT DISTINCT FROM s.series
+        ORDER BY 1
+    """
+    with connections[rows.db].cursor() as cursor:
+        cursor.execute(query, (*params, first, last, INTERVALS[granularity]))
+        return cursor.fetchall()
+
+
+def trend(metric, granularity, start, end, by=None, sales_person=None):
+    """
+    ``metric`` per ``granularity`` bucket for days within [start, end], as
+    ``{'buckets': [first day, ...], 'series': [{'key', 'name', 'values'}, ...]}``
+    with one value per bucket and the biggest series first. The first bucket
+    is widened back to its start, so months and weeks are whole. Without
+    ``by`` there is one series, ``'Total'``; ``sales_person`` limits it to
+    one rep. Raises ValueError for arguments ``validate`` rejects.
+    """
+    validate(metric, granularity, start, end, by)
+    days = buckets(start, end, granularity)
+    rows = _grouped(metric, granularity, days[0], end, by, sales_person)
+    if connections[rows.db].vendor == 'postgresql':
+        rows = _filled_in_sql(rows, days[0], days[-1], granularity)
+    else:
+        rows = rows.values_list('bucket', 'series', 'name', 'value')
+
+    index = {day: i for i, day in enumerate(days)}
+    series = {}
+    for bucket, key, name, value in rows:
+        if key not in series:
+            series[key] = {'key': key, 'name': LABELS.get(by, {}).get(name, name), 'values': [0] * len(days)}
+        series[key]['values'][index[bucket]] = value or 0
+    if not by and not series:
+        series[''] = {'key': '', 'name': 'Total', 'values': [0] * len(days)}
+
+    ordered = sorted(series.values(), key=lambda line: (-sum(line['values']), str(line['name'])))
+    return {'buckets': days, 'series': ordered}
@@ -1,6 +1,13 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+
+def maybe_async(name):
+    """View ``name``, or its ``_async`` variant when ASYNC_VIEWS is on"""
+    return getattr(views, f'{name}_async' if getattr(settings, 'ASYNC_VIEWS', False) else name)
+
+
 urlpatterns = [
     # Authentication
     path('login/', views.login_view, name='login'),
@@ -8,23 +15,38 @@ urlpatterns = [
 
     # Dashboards
     path('', views.dashboard, name='dashboard'),
-    path('sales/', views.sales_dashboard, name='sales_dashboard'),
-    path('dashboard/admin/', views.admin_dashboard, name='admin_dashboard'),
+    path('sales/', maybe_async('sales_dashboard'), name='sales_dashboard'),
+    path('dashboard/admin/', maybe_async('admin_dashboard'), name='admin_dashboard'),
+    path('dashboard/admin/stream/', views.admin_dashboard_stream, name='admin_dashboard_stream'),
+    path('dashboard/admin/trend/', views.sales_trend, name='sales_trend'),
 
     # Sales
     path('sale/new/', views.create_sale, name='create_sale'),
     path('sales/list/', views.sale_list, name='sale_list'),
+    path('sales/export/', views.export_sales, name='export_sales'),
 
     # Visits
     path('visit/log/', views.log_visit, name='log_visit'),
+    path('visits/import/', views.import_visits, name='import_visits'),
     path('visits/', views.visit_list, name='visit_list'),
+    path('visits/export/', views.export_visits, name='export_visits'),
+
+    # Follow-ups
+    path('follow-ups/<int:follow_up_id>/done/', views.complete_follow_up, name='complete_follow_up'),
+    path('follow-ups/<int:follow_up_id>/snooze/', views.snooze_follow_up, name='snooze_follow_up'),
 
     # Prospects
     path('prospects/', views.prospect_list, name='prospect_list'),
 
     # Admin views
-    path('team/performance/', views.team_performance, name='team_performance'),
-    path('feedback/analysis/', views.feedback_analysis, name='feedback_analysis'),
+    path('team/performance/', maybe_async('team_performance'), name='team_performance'),
+    path('commissions/export/', views.export_commissions, name='export_commissions'),
+    path('feedback/analysis/', maybe_async('feedback_analysis'), name='feedback_analysis'),
+    path('territories/', views.territory_performance, name='territory_performance'),
+    path('revenue/projection/', views.revenue_projection, name='revenue_projection'),
+
+    # Search
+    path('search/', views.search_view, name='search'),
 
     # User Management
     path('users/', views.user_management, name='user_management'),
@@ -32,4 +54,7 @@ urlpatterns = [
     path('users/<int:user_id>/edit/', views.edit_user, name='edit_user'),
     path('users/<int:user_id>/delete/', views.delete_user, name='delete_user'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
+
+    # Instrumentation
+    path('performance/', views.performance_stats, name='performance_stats'),
 ]
\ No newline at end of file
@@ -1,15 +1,32 @@
+import csv
+import io
+import logging
+
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import AuthenticationForm
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
 from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncDate
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_POST
 from datetime import timedelta
 from django.contrib import messages
-from .models import Sale, Customer, InternetPackage, SalesTarget, Visit, Prospect
+from .models import Sale, CommissionEntry, Customer, FollowUp, InternetPackage, SalesTarget, SearchDocument, Visit, Prospect
 from .forms import SaleForm, CustomerForm, VisitForm, ProspectForm
+from . import (
+    analytics, concurrency, dashboard_cache, exports, filters, followups, imports, leaderboard, live, objections,
+    projections, prospects, search, territories, trends,
+)
+from .instrumentation import samples
+from .pagination import KeysetPaginator
+
+logger = logging.getLogger(__name__)
 
 
 def is_admin(user):
@@ -47,31 +64,53 @@ def logout_view(request):
     return redirect('login')
 
 
+# Sortable user_management columns, as ?sort=<key> or ?sort=-<key>
+USER_SORTS = {
+    'username': 'username',
+    'joined': 'date_joined',
+    'sales': 'total_sales',
+    'visits': 'total_visits',
+    'revenue': 'total_revenue',
+    'conversion': 'conversion_rate',
+}
+
+
 @login_required
 @user_passes_test(is_admin)
 def user_management(request):
     """Admin view to manage users - FIXED"""
-    users = User.objects.all().order_by('-date_joined')
+    # Role counts in one pass
+    counts = User.objects.aggregate(
+        total=Count('id'),
+        admins=Count('id', filter=Q(is_staff=True)),
+    )
 
-    # FIXED: Count admins and sales people correctly
-    admin_count = User.objects.filter(is_staff=True).count()
-    sales_count = User.objects.filter(is_staff=False).count()
+    # Stats from the rollups as correlated subqueries - one query for the page
+    users = analytics.annotate_salesperson_stats(
+        User.objects.all(), sales='total_sales', revenue='total_revenue', visits='total_visits',
+    )
+
+    sort = request.GET.get('sort', '-joined')
+    if sort.lstrip('-') not in USER_SORTS:
+        sort = '-joined'
+    field = USER_SORTS[sort.lstrip('-')]
+    users = users.order_by(f'-{field}' if sort.startswith('-') else field, 'pk')
 
-    # Get stats for each user
-    for user in users:
-        user.total_sales = Sale.objects.filter(sales_person=user).count()
-        user.total_visits = Visit.objects.filter(sales_person=user).count()
+    paginator = Paginator(users, 50)
+    page = paginator.get_page(request.GET.get('page'))
 
-        # Calculate total revenue for each user
-        user.total_revenue = Sale.objects.filter(
-            sales_person=user
-        ).aggregate(total=Sum('total_value'))['total'] or 0
+    # Clicking the current column flips its direction; others start descending
+    sort_links = {
+        key: (key if sort == f'-{key}' else f'-{key}') for key in USER_SORTS
+    }
 
     context = {
-        'users': users,
-        'admin_count': admin_count,
-        'sales_count': sales_count,
-        'total_users': users.count(),
+        'users': page,
+        'sort': sort,
+        'sort_links': sort_links,
+        'admin_count': counts['admins'],
+        'sales_count': counts['total'] - counts['admins'],
+        'total_users': counts['total'],
     }
     return render(request, 'admin/user_management.html', context)
 
@@ -168,221 +207,197 @@ def sales_dashboard(request):
     """Dashboard for sales team members - FIXED"""
     user = request.user
     today = timezone.now().date()
-    month_start = today.replace(day=1)
+    context = cached_sales_dashboard(user, today)
+    return render(request, 'sales/sales_dashboard.html', context)
 
-    # User's sales stats
-    total_sales = Sale.objects.filter(sales_person=user).count()
-    monthly_sales = Sale.objects.filter(
-        sales_person=user,
-        sale_date__gte=month_start
-    ).count()
-
-    monthly_revenue = Sale.objects.filter(
-        sales_person=user,
-        sale_date__gte=month_start
-    ).aggregate(total=Sum('total_value'))['total'] or 0
-
-    # Visit stats
-    total_visits = Visit.objects.filter(sales_person=user).count()
-    monthly_visits = Visit.objects.filter(
-        sales_person=user,
-        visit_date__gte=month_start
-    ).count()
 
-    # FIXED: Conversion rate - count sales that came from visits
-    monthly_sales_from_visits = Sale.objects.filter(
-        sales_person=user,
-        sale_date__gte=month_start
-    ).count()
+def cached_sales_dashboard(user, today):
+    """``user``'s sales_dashboard context, built and cached on a miss"""
+    return dashboard_cache.get_or_build(
+        'sales_dashboard', user.pk, today,
+        lambda: sales_dashboard_context(concurrency.run(sales_dashboard_queries(user, today))),
+    )
 
-    conversion_rate = (monthly_sales_from_visits / monthly_visits * 100) if monthly_visits > 0 else 0
 
-    # Recent visits
-    recent_visits = Visit.objects.filter(sales_person=user).order_by('-visit_date', '-visit_time')[:10]
+@login_required
+async def sales_dashboard_async(request):
+    """sales_dashboard with its queries run concurrently, for ASGI"""
+    user = await request.auser()
+    today = timezone.now().date()
+
+    async def build():
+        return sales_dashboard_context(await concurrency.gather(sales_dashboard_queries(user, today)))
 
-    # Recent sales
-    recent_sales = Sale.objects.filter(sales_person=user).order_by('-sale_date')[:5]
+    context = await dashboard_cache.aget_or_build('sales_dashboard', user.pk, today, build)
+    return await sync_to_async(render)(request, 'sales/sales_dashboard.html', context)
 
-    # Follow-ups needed
-    follow_ups = Visit.objects.filter(
-        sales_person=user,
-        follow_up_date__isnull=False,
-        follow_up_date__gte=today,
-        outcome='follow_up'
-    ).order_by('follow_up_date')[:5]
 
-    # Get monthly target
-    try:
-        target = SalesTarget.objects.get(sales_person=user, month=month_start)
-    except SalesTarget.DoesNotExist:
-        target = None
+def sales_dashboard_queries(user, today):
+    """The independent queries behind sales_dashboard, by name"""
+    month_start = today.replace(day=1)
+    return {
+        # User's sales and visit stats - read from the daily rollups
+        'sale_stats': lambda: analytics.sale_totals(month_start, sales_person=user),
+        'visit_stats': lambda: analytics.visit_totals(month_start, sales_person=user),
+
+        # Recent visits
+        'recent_visits': lambda: list(
+            Visit.objects.filter(sales_person=user).order_by('-visit_date', '-visit_time')[:10]
+        ),
+
+        # Recent sales
+        'recent_sales': lambda: list(Sale.objects.filter(sales_person=user).select_related(
+            'customer', 'package'
+        ).order_by('-sale_date')[:5]),
+
+        # Follow-ups needed, by due date - one read of the queue index
+        'follow_ups': lambda: followups.queue(user, today),
+
+        # Get monthly target - its progress is kept up to date as sales and visits are saved
+        'target': lambda: SalesTarget.objects.filter(sales_person=user, month=month_start).first(),
+    }
 
-    context = {
-        'total_sales': total_sales,
+
+def sales_dashboard_context(results):
+    sale_stats = results['sale_stats']
+    visit_stats = results['visit_stats']
+
+    # FIXED: Conversion rate - count sales that came from visits
+    monthly_sales = sale_stats['monthly_sales']
+    monthly_visits = visit_stats['monthly_visits']
+    conversion_rate = (monthly_sales / monthly_visits * 100) if monthly_visits > 0 else 0
+
+    # Lists rather than querysets, so the context can be cached
+    return {
+        'total_sales': sale_stats['total_sales'],
         'monthly_sales': monthly_sales,
-        'monthly_revenue': monthly_revenue,
-        'total_visits': total_visits,
+        'monthly_revenue': sale_stats['monthly_revenue'],
+        'total_visits': visit_stats['total_visits'],
         'monthly_visits': monthly_visits,
         'conversion_rate': round(conversion_rate, 1),
-        'recent_visits': recent_visits,
-        'recent_sales': recent_sales,
-        'follow_ups': follow_ups,
-        'target': target,
+        'recent_visits': results['recent_visits'],
+        'recent_sales': results['recent_sales'],
+        'follow_ups': results['follow_ups'],
+        'follow_up_buckets': [
+            (bucket, label, results['follow_ups'][bucket])
+            for bucket, label in [('overdue', 'Overdue'), ('today', 'Due Today'), ('upcoming', 'Upcoming')]
+        ],
+        'snooze_days': followups.SNOOZE_DAYS,
+        'target': results['target'],
     }
-    return render(request, 'sales/sales_dashboard.html', context)
 
 
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
     """Dashboard for administrators - COMPLETELY FIXED"""
-    from django.db.models.functions import TruncDate
+    today = timezone.now().date()
+
+    def build():
+        # Read before the data, so the live feed replays anything written
+        # while the context is being built rather than skipping it
+        live_cursor = live.current_cursor()
+        return admin_dashboard_context(concurrency.run(admin_dashboard_queries(today)), live_cursor)
+
+    context = dashboard_cache.get_or_build('admin_dashboard', dashboard_cache.GLOBAL, today, build)
+    return render(request, 'sales/admin_dashboard.html', context)
+
 
+@login_required
+@user_passes_test(is_admin)
+async def admin_dashboard_async(request):
+    """admin_dashboard with its queries run concurrently, for ASGI"""
     today = timezone.now().date()
+
+    async def build():
+        live_cursor = await sync_to_async(live.current_cursor)()
+        return admin_dashboard_context(await concurrency.gather(admin_dashboard_queries(today)), live_cursor)
+
+    context = await dashboard_cache.aget_or_build('admin_dashboard', dashboard_cache.GLOBAL, today, build)
+    return await sync_to_async(render)(request, 'sales/admin_dashboard.html', context)
+
+
+def admin_dashboard_queries(today):
+    """The independent queries behind admin_dashboard, by name"""
     month_start = today.replace(day=1)
+    return {
+        # Overall stats - read from the daily rollups
+        'sale_stats': lambda: analytics.sale_totals(month_start),
+        'visit_stats': lambda: analytics.visit_totals(month_start),
 
-    # Overall stats - FIXED
-    total_sales = Sale.objects.count()
-    monthly_sales = Sale.objects.filter(sale_date__gte=month_start).count()
+        # Sales by status
+        'status_breakdown': lambda: list(analytics.status_breakdown()),
 
-    # FIXED: Revenue calculations
-    total_revenue = Sale.objects.aggregate(total=Sum('total_value'))['total'] or 0
-    monthly_revenue = Sale.objects.filter(
-        sale_date__gte=month_start
-    ).aggregate(total=Sum('total_value'))['total'] or 0
+        # Visit outcomes breakdown
+        'outcome_breakdown': lambda: list(analytics.outcome_breakdown(month_start)),
 
-    # Visit stats
-    total_visits = Visit.objects.count()
-    monthly_visits = Visit.objects.filter(visit_date__gte=month_start).count()
+        # Top performers - ranked and cut to five in the database:
+        # 1. Monthly revenue (highest first)
+        # 2. If revenue is same, monthly visits (highest first)
+        # 3. If visits are same, conversion rate (highest first)
+        'top_performers': lambda: list(analytics.top_performers(month_start, limit=5)),
 
-    # FIXED: Overall conversion rate - sales from visits
-    monthly_sales_count = Sale.objects.filter(sale_date__gte=month_start).count()
-    overall_conversion = (monthly_sales_count / monthly_visits * 100) if monthly_visits > 0 else 0
+        # Sales by package
+        'package_stats': lambda: list(analytics.package_stats()),
 
-    # Sales by status
-    status_breakdown = Sale.objects.values('status').annotate(
-        count=Count('id')
-    )
+        # Common objections
+        'objections': lambda: analytics.objection_counts(month_start),
 
-    # Visit outcomes breakdown
-    outcome_breakdown = Visit.objects.filter(
-        visit_date__gte=month_start
-    ).values('outcome').annotate(
-        count=Count('id')
-    )
+        # Daily sales and visits trend (last 30 days, today included so the
+        # live feed can keep its last point current)
+        'daily_activity': lambda: analytics.daily_activity(today - timedelta(days=29), 30),
+    }
 
-    # FIXED: Top performers - calculate manually to avoid duplicates
-    sales_people = User.objects.filter(is_staff=False, is_active=True)
-    top_performers = []
-
-    for person in sales_people:
-        monthly_sales = Sale.objects.filter(
-            sales_person=person,
-            sale_date__gte=month_start
-        ).count()
-
-        monthly_revenue = Sale.objects.filter(
-            sales_person=person,
-            sale_date__gte=month_start
-        ).aggregate(total=Sum('total_value'))['total'] or 0
-
-        monthly_visits = Visit.objects.filter(
-            sales_person=person,
-            visit_date__gte=month_start
-        ).count()
-
-        # Only include if they have activity
-        if monthly_sales > 0 or monthly_visits > 0:
-            conversion_rate = round((monthly_sales / monthly_visits) * 100, 1) if monthly_visits > 0 else 0
-
-            top_performers.append({
-                'username': person.username,
-                'first_name': person.first_name,
-                'last_name': person.last_name,
-                'sales_count': monthly_sales,
-                'revenue': monthly_revenue,
-                'visits_count': monthly_visits,
-                'conversion_rate': conversion_rate,
-            })
-
-    # Sort by multiple criteria and take top 5:
-    # 1. Monthly revenue (highest first)
-    # 2. If revenue is same, sort by monthly visits (highest first)
-    # 3. If visits are same, sort by conversion rate (highest first)
-    top_performers.sort(key=lambda x: (
-        -(x['revenue'] or 0),  # Primary: Revenue
-        -(x['visits_count'] or 0),  # Secondary: Visits
-        -(x['conversion_rate'] or 0)  # Tertiary: Conversion rate
-    ))
-    top_performers = top_performers[:5]
 
-    # Sales by package - FIXED
-    package_stats = Sale.objects.values('package__name').annotate(
-        count=Count('id'),
-        revenue=Sum('total_value')
-    ).order_by('-count')
+def admin_dashboard_context(results, live_cursor):
+    sale_stats = results['sale_stats']
+    visit_stats = results['visit_stats']
 
-    # Common objections
+    # Overall conversion rate - sales from visits
+    monthly_visits = visit_stats['monthly_visits']
+    overall_conversion = (sale_stats['monthly_sales'] / monthly_visits * 100) if monthly_visits > 0 else 0
+
+    objections = results['objections']
     common_objections = {
-        'price': Visit.objects.filter(visit_date__gte=month_start, price_concern=True).count(),
-        'coverage': Visit.objects.filter(visit_date__gte=month_start, coverage_concern=True).count(),
-        'existing_provider': Visit.objects.filter(visit_date__gte=month_start, has_existing_provider=True).count(),
+        'price': objections['price_concern'],
+        'coverage': objections['coverage_concern'],
+        'existing_provider': objections['has_existing_provider'],
     }
 
-    # Daily sales and visits trend (last 30 days)
-    last_30_days = today - timedelta(days=30)
-
-    # Get sales grouped by date
-    daily_sales = Sale.objects.filter(
-        sale_date__gte=last_30_days
-    ).annotate(
-        date=TruncDate('sale_date')
-    ).values('date').annotate(
-        sales=Count('id')
-    ).order_by('date')
-
-    # Get visits grouped by date
-    daily_visits = Visit.objects.filter(
-        visit_date__gte=last_30_days
-    ).annotate(
-        date=TruncDate('visit_date')
-    ).values('date').annotate(
-        visits=Count('id')
-    ).order_by('date')
-
-    # Create dictionaries for quick lookup
-    sales_dict = {item['date']: item['sales'] for item in daily_sales}
-    visits_dict = {item['date']: item['visits'] for item in daily_visits}
-
-    # Build daily activity with all 30 days
-    daily_activity = []
-    for i in range(30):
-        date = last_30_days + timedelta(days=i)
-        daily_activity.append({
-            'date': date,
-            'sales': sales_dict.get(date, 0),
-            'visits': visits_dict.get(date, 0)
-        })
-
-    context = {
-        'total_sales': total_sales,
-        'monthly_sales': monthly_sales,
-        'total_revenue': total_revenue,
-        'monthly_revenue': monthly_revenue,
-        'total_visits': total_visits,
-        'monthly_visits': monthly_visits,
+    # Lists rather than querysets, so the context can be cached
+    return {
+        **sale_stats,
+        **visit_stats,
         'overall_conversion': round(overall_conversion, 1),
-        'status_breakdown': status_breakdown,
-        'outcome_breakdown': outcome_breakdown,
-        'top_performers': top_performers,
-        'package_stats': package_stats,
+        'status_breakdown': results['status_breakdown'],
+        'outcome_breakdown': results['outcome_breakdown'],
+        'top_performers': results['top_performers'],
+        'package_stats': results['package_stats'],
         'common_objections': common_objections,
-        'daily_activity': daily_activity,
+        'daily_activity': results['daily_activity'],
+        'live_cursor': str(live_cursor),
     }
-    return render(request, 'sales/admin_dashboard.html', context)
 
 
 @login_required
+@user_passes_test(is_admin)
+async def admin_dashboard_stream(request):
+    """Server-sent events that keep an open admin dashboard current (see zakcomapp.live)"""
+    cursor = live.Cursor.parse(request.headers.get('Last-Event-ID') or request.GET.get('cursor'))
+    if cursor is None:
+        cursor = await sync_to_async(live.current_cursor)()
+
+    if isinstance(request, ASGIRequest):
+        events = live.stream(cursor)
+    else:
+        events = live.poll_once(cursor)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def log_visit(request):
     """Sales team logs a visit - FIXED to always save visits regardless of outcome"""
@@ -395,11 +410,9 @@ def log_visit(request):
             visit = visit_form.save(commit=False)
             visit.sales_person = request.user
 
-            # Save the visit FIRST to ensure it's always recorded
-            visit.save()
-
-            # NOW handle prospect creation only for interested outcomes
+            # Handle prospect creation only for interested outcomes
             outcome = visit.outcome
+            message, warning = 'Visit logged successfully!', None
             if outcome in ['interested', 'follow_up', 'closed_sale']:
                 prospect_name = request.POST.get('full_name', '').strip()
                 prospect_phone = request.POST.get('phone', '').strip()
@@ -416,40 +429,51 @@ def log_visit(request):
                             interest_level = 'interested'
 
                         # Get preferred package if provided
-                        preferred_package_id = request.POST.get('preferred_package')
-
-                        # Create prospect
-                        prospect = Prospect.objects.create(
-                            full_name=prospect_name,
-                            phone=prospect_phone,
-                            email=request.POST.get('email', '').strip(),
-                            address=request.POST.get('address', '').strip() or 'Not provided',
-                            location=request.POST.get('prospect_location', '').strip() or visit.location,
-                            added_by=request.user,
-                            interest_level=interest_level,
-                            preferred_package_id=preferred_package_id if preferred_package_id else None
-                        )
+                        preferred_package_id = request.POST.get('preferred_package') or None
+                        email = request.POST.get('email', '').strip()
+
+                        # A household visited before keeps its prospect
+                        prospect = prospects.find(prospect_phone, prospect_name)
+                        visited_before = prospect is not None
+                        if visited_before:
+                            prospects.revisit(prospect, interest_level, email, preferred_package_id)
+                        else:
+                            prospect = Prospect.objects.create(
+                                full_name=prospect_name,
+                                phone=prospect_phone,
+                                email=email,
+                                address=request.POST.get('address', '').strip() or prospects.NO_ADDRESS,
+                                location=request.POST.get('prospect_location', '').strip() or visit.location,
+                                added_by=request.user,
+                                interest_level=interest_level,
+                                preferred_package_id=preferred_package_id
+                            )
 
                         # Link prospect to visit
                         visit.prospect = prospect
-                        visit.save()  # Save again to update the prospect link
 
-                        messages.success(request, 'Visit and prospect information saved successfully!')
+                        if visited_before:
+                            message = f'Visit saved and linked to {prospect.full_name}, who was visited before.'
+                        else:
+                            message = 'Visit and prospect information saved successfully!'
                     except Exception as e:
-                        # Visit is already saved, just notify about prospect issue
-                        messages.warning(request, f'Visit saved but prospect creation failed: {str(e)}')
+                        # The visit is still saved below, just notify about the prospect issue
+                        warning = f'Visit saved but prospect creation failed: {str(e)}'
                 else:
                     # Visit saved, but no prospect data provided
-                    messages.success(request, 'Visit logged successfully! (No prospect details saved)')
+                    message = 'Visit logged successfully! (No prospect details saved)'
+
+            # Saved once, with its prospect already linked, so the rollup,
+            # target, follow-up and search signals run once per visit
+            visit.save()
+            if warning:
+                messages.warning(request, warning)
             else:
-                # For not_interested, not_home, wrong_location outcomes
-                messages.success(request, 'Visit logged successfully!')
+                messages.success(request, message)
 
             return redirect('sales_dashboard')
         else:
-            # Debug: Print form errors
-            print("Form Errors:", visit_form.errors)
-            print("Form Data:", visit_form.data)
+            logger.info("Rejected visit from %s: %s", request.user.username, visit_form.errors.as_json())
 
             # Show validation errors
             for field, errors in visit_form.errors.items():
@@ -465,33 +489,94 @@ def log_visit(request):
     }
     return render(request, 'sales/log_visit.html', context)
 
+
+def _own_follow_up(request, follow_up_id):
+    follow_up = get_object_or_404(FollowUp, id=follow_up_id)
+    if follow_up.sales_person_id != request.user.pk and not is_admin(request.user):
+        raise Http404("No such follow-up")
+    return follow_up
+
+
 @login_required
-def visit_list(request):
-    """View all visits"""
-    if request.user.is_staff:
-        visits = Visit.objects.all()
-    else:
-        visits = Visit.objects.filter(sales_person=request.user)
+@require_POST
+def complete_follow_up(request, follow_up_id):
+    """Take a follow-up off the queue"""
+    follow_up = _own_follow_up(request, follow_up_id)
+    followups.complete(follow_up)
+    messages.success(request, f"Follow-up at {follow_up.visit.location} marked done.")
+    return redirect('sales_dashboard')
 
-    outcome = request.GET.get('outcome')
-    if outcome:
-        visits = visits.filter(outcome=outcome)
 
-    date_from = request.GET.get('date_from')
-    if date_from:
-        visits = visits.filter(visit_date__gte=date_from)
+@login_required
+@require_POST
+def snooze_follow_up(request, follow_up_id):
+    """Push a follow-up back by the posted ``days`` (one of followups.SNOOZE_DAYS)"""
+    follow_up = _own_follow_up(request, follow_up_id)
+    days = request.POST.get('days', '')
+    if not days.isdigit() or int(days) not in followups.SNOOZE_DAYS:
+        messages.error(request, "Pick how many days to snooze for.")
+        return redirect('sales_dashboard')
+    followups.snooze(follow_up, int(days), timezone.now().date())
+    messages.success(request, f"Follow-up at {follow_up.visit.location} moved to {follow_up.due_date:%b %d}.")
+    return redirect('sales_dashboard')
 
-    date_to = request.GET.get('date_to')
-    if date_to:
-        visits = visits.filter(visit_date__lte=date_to)
+
+@login_required
+def import_visits(request):
+    """Sales team uploads a CSV batch of visits collected offline"""
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, "Choose a CSV file to upload.")
+        else:
+            try:
+                lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+                result = imports.import_visits(lines, request.user)
+            except (UnicodeDecodeError, csv.Error) as e:
+                messages.error(request, f"Could not read the file: {e}")
+            else:
+                logger.info(
+                    "%s imported %d of %d visits", request.user.username,
+                    result.visits_created, result.rows,
+                )
+        if request.GET.get('format') == 'json':
+            if result is None:
+                return JsonResponse({'error': "Upload a UTF-8 CSV file as 'file'."}, status=400)
+            return JsonResponse(result.as_dict())
 
     context = {
-        'visits': visits,
+        'result': result,
+        'columns': imports.COLUMNS,
+    }
+    return render(request, 'sales/import_visits.html', context)
+
+
+@login_required
+def visit_list(request):
+    """View all visits"""
+    visits = filters.visits_for(request.user, request.GET).select_related('prospect', 'sales_person')
+
+    # Keyset pagination - constant cost per page however deep
+    paginator = KeysetPaginator(visits, ['-visit_date', '-visit_time', '-id'], count='approximate')
+
+    context = {
+        'visits': paginator.page_from_request(request),
         'outcome_choices': Visit.OUTCOME_CHOICES,
     }
     return render(request, 'sales/visit_list.html', context)
 
 
+@login_required
+def export_visits(request):
+    """Stream the visits matching the visit_list filters as CSV or XLSX"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        raise Http404("Unknown export format")
+    visits = filters.visits_for(request.user, request.GET)
+    return exports.export_response(visits, exports.VISIT_COLUMNS, fmt, 'visits')
+
+
 @login_required
 def prospect_list(request):
     """View all prospects"""
@@ -499,13 +584,17 @@ def prospect_list(request):
         prospects = Prospect.objects.all()
     else:
         prospects = Prospect.objects.filter(added_by=request.user)
+    prospects = prospects.select_related('preferred_package').annotate(visit_count=Count('visits'))
 
     interest = request.GET.get('interest')
     if interest:
         prospects = prospects.filter(interest_level=interest)
 
+    # Keyset pagination - constant cost per page however deep
+    paginator = KeysetPaginator(prospects, ['-created_at', '-id'], count='approximate')
+
     context = {
-        'prospects': prospects,
+        'prospects': paginator.page_from_request(request),
         'interest_choices': Prospect.INTEREST_LEVEL_CHOICES,
     }
     return render(request, 'sales/prospect_list.html', context)
@@ -540,31 +629,23 @@ def create_sale(request):
 @login_required
 def sale_list(request):
     """View all sales - FIXED"""
-    if request.user.is_staff:
-        sales = Sale.objects.all()
-    else:
-        sales = Sale.objects.filter(sales_person=request.user)
-
-    status = request.GET.get('status')
-    if status:
-        sales = sales.filter(status=status)
-
-    date_from = request.GET.get('date_from')
-    if date_from:
-        sales = sales.filter(sale_date__gte=date_from)
+    sales = filters.sales_for(request.user, request.GET)
 
-    date_to = request.GET.get('date_to')
-    if date_to:
-        sales = sales.filter(sale_date__lte=date_to)
-
-    # FIXED: Calculate totals properly
-    total_revenue = sales.aggregate(total=Sum('total_value'))['total'] or 0
-    sales_count = sales.count()
+    # FIXED: Calculate totals properly - count and revenue in one query
+    totals = sales.aggregate(count=Count('id'), total=Sum('total_value'))
+    total_revenue = totals['total'] or 0
+    sales_count = totals['count']
     average_sale = total_revenue / sales_count if sales_count > 0 else 0
 
+    # Keyset pagination - constant cost per page however deep
+    paginator = KeysetPaginator(
+        sales.select_related('customer', 'package', 'sales_person'), ['-created_at', '-id']
+    )
+
     context = {
-        'sales': sales,
+        'sales': paginator.page_from_request(request),
         'status_choices': Sale.STATUS_CHOICES,
+        'sales_count': sales_count,
         'total_revenue': total_revenue,
         'average_sale': average_sale,
     }
@@ -572,116 +653,273 @@ def sale_list(request):
 
 
 @login_required
-@user_passes_test(is_admin)
-def team_performance(request):
-    """Detailed team performance view for admins - COMPLETELY FIXED"""
-    from django.db.models import Prefetch
-
-    month_start = timezone.now().date().replace(day=1)
+def export_sales(request):
+    """Stream the sales matching the sale_list filters as CSV or XLSX"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        raise Http404("Unknown export format")
+    sales = filters.sales_for(request.user, request.GET)
+    return exports.export_response(sales, exports.SALE_COLUMNS, fmt, 'sales')
 
-    # Get all sales people (not admins)
-    sales_people = User.objects.filter(
-        is_active=True,
-        is_staff=False
-    )
 
-    # Build team stats manually to avoid duplicate counting issues
-    team_stats = []
-    for person in sales_people:
-        # Count sales correctly
-        total_sales = Sale.objects.filter(sales_person=person).count()
-        monthly_sales = Sale.objects.filter(
-            sales_person=person,
-            sale_date__gte=month_start
-        ).count()
-
-        # Calculate revenue correctly
-        total_revenue = Sale.objects.filter(
-            sales_person=person
-        ).aggregate(total=Sum('total_value'))['total'] or 0
-
-        monthly_revenue = Sale.objects.filter(
-            sales_person=person,
-            sale_date__gte=month_start
-        ).aggregate(total=Sum('total_value'))['total'] or 0
-
-        # Count visits correctly
-        total_visits = Visit.objects.filter(sales_person=person).count()
-        monthly_visits = Visit.objects.filter(
-            sales_person=person,
-            visit_date__gte=month_start
-        ).count()
-
-        # Calculate conversion rate
-        if monthly_visits > 0:
-            conversion_rate = round((monthly_sales / monthly_visits) * 100, 1)
-        else:
-            conversion_rate = 0
-
-        # Create stat object
-        stat = {
-            'id': person.id,
-            'username': person.username,
-            'first_name': person.first_name,
-            'last_name': person.last_name,
-            'email': person.email,
-            'total_sales': total_sales,
-            'monthly_sales': monthly_sales,
-            'total_revenue': total_revenue,
-            'monthly_revenue': monthly_revenue,
-            'total_visits': total_visits,
-            'monthly_visits': monthly_visits,
-            'conversion_rate': conversion_rate,
-        }
+@login_required
+@user_passes_test(is_admin)
+def team_performance(request):
+    """Team leaderboard for a month or quarter (see zakcomapp.leaderboard)"""
+    today = timezone.now().date()
+    start, end = leaderboard.period(request.GET.get('period'), today)
+    team_stats, closed_at = leaderboard.standings(start, end, today)
+    return render(request, 'sales/team_performance.html', team_performance_context(
+        team_stats, closed_at, start, end, today,
+    ))
 
-        team_stats.append(stat)
 
-    # Sort by multiple criteria:
-    # 1. Monthly revenue (highest first)
-    # 2. If revenue is same, sort by monthly visits (highest first)
-    # 3. If visits are same, sort by conversion rate (highest first)
-    team_stats.sort(key=lambda x: (
-        -(x['monthly_revenue'] or 0),  # Negative for descending order
-        -(x['monthly_visits'] or 0),  # Then by visits
-        -(x['conversion_rate'] or 0)  # Then by conversion rate
+@login_required
+@user_passes_test(is_admin)
+async def team_performance_async(request):
+    """team_performance for ASGI - it is a single query, so nothing to overlap"""
+    today = timezone.now().date()
+    start, end = leaderboard.period(request.GET.get('period'), today)
+    team_stats, closed_at = await sync_to_async(leaderboard.standings)(start, end, today)
+    return await sync_to_async(render)(request, 'sales/team_performance.html', team_performance_context(
+        team_stats, closed_at, start, end, today,
     ))
 
-    context = {
+
+def team_performance_context(team_stats, closed_at, start, end, today):
+    """
+    Ranked by the database:
+    1. Period revenue (highest first)
+    2. If revenue is same, by period visits (highest first)
+    3. If visits are same, by conversion rate (highest first)
+    """
+    return {
         'team_stats': team_stats,
+        'closed_at': closed_at,
+        'period': leaderboard.value(start, end),
+        'period_label': leaderboard.label(start, end),
+        'period_choices': leaderboard.choices(today),
     }
-    return render(request, 'sales/team_performance.html', context)
 
 
+@login_required
+@user_passes_test(is_admin)
+def export_commissions(request):
+    """Stream the commission ledger of a month or quarter (``?period=``) as CSV or XLSX"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        raise Http404("Unknown export format")
+    start, end = leaderboard.period(request.GET.get('period'), timezone.now().date())
+    entries = CommissionEntry.objects.filter(month__gte=start, month__lte=end)
+    return exports.export_response(
+        entries, exports.COMMISSION_COLUMNS, fmt, f'commissions-{leaderboard.value(start, end)}',
+    )
+
+
+# Recent visits listed with their feedback on feedback_analysis
+FEEDBACK_SHOWN = 50
+
 
 @login_required
 @user_passes_test(is_admin)
 def feedback_analysis(request):
     """Analyze customer feedback and objections"""
-    month_start = timezone.now().date().replace(day=1)
+    start, end = report_period(request.GET)
+    results = concurrency.run(feedback_analysis_queries(start, end))
+    return render(request, 'sales/feedback_analysis.html', feedback_analysis_context(results, start, end))
+
+
+@login_required
+@user_passes_test(is_admin)
+async def feedback_analysis_async(request):
+    """feedback_analysis with its queries run concurrently, for ASGI"""
+    start, end = report_period(request.GET)
+    results = await concurrency.gather(feedback_analysis_queries(start, end))
+    return await sync_to_async(render)(
+        request, 'sales/feedback_analysis.html', feedback_analysis_context(results, start, end),
+    )
+
+
+def report_period(params):
+    """The ``start``/``end`` dates a report asked for, defaulting to this month so far"""
+    today = timezone.now().date()
+    start = _parse_date(params.get('start')) or today.replace(day=1)
+    end = _parse_date(params.get('end')) or today
+    if start > end:
+        start, end = end, start
+    return start, end
 
-    visits_with_feedback = Visit.objects.filter(
-        visit_date__gte=month_start
-    ).exclude(feedback='')
 
-    objections = {
-        'price_concern': Visit.objects.filter(visit_date__gte=month_start, price_concern=True).count(),
-        'coverage_concern': Visit.objects.filter(visit_date__gte=month_start, coverage_concern=True).count(),
-        'has_existing_provider': Visit.objects.filter(visit_date__gte=month_start, has_existing_provider=True).count(),
+def _parse_date(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def feedback_analysis_queries(start, end):
+    """The independent queries behind feedback_analysis, by name"""
+    return {
+        'summary': lambda: objections.summary(start, end),
+        'by_location': lambda: objections.by_location(start, end, limit=10),
+        'by_rep': lambda: objections.by_rep(start, end),
+        'weekly_trend': lambda: objections.weekly_trend(start, end),
+
+        # The newest only; the rest are a search away
+        'visits_with_feedback': lambda: list(Visit.objects.filter(
+            visit_date__gte=start, visit_date__lte=end,
+        ).exclude(feedback='').select_related('prospect', 'sales_person').order_by(
+            '-visit_date', '-visit_time', '-pk'
+        )[:FEEDBACK_SHOWN]),
     }
 
-    existing_providers = Visit.objects.filter(
-        visit_date__gte=month_start,
-        has_existing_provider=True
-    ).exclude(existing_provider_name='').values('existing_provider_name').annotate(
-        count=Count('id')
-    ).order_by('-count')[:5]
+
+def feedback_analysis_context(results, start, end):
+    """Template context from the results of feedback_analysis_queries"""
+    summary = results['summary']
+    return {
+        **results,
+        'objections': summary['totals'],
+        'objection_rates': summary['rates'],
+        'competitors': summary['competitors'],
+        'breakdowns': [
+            ('By Location', 'fa-map-marker-alt', results['by_location'], 'Location'),
+            ('By Sales Person', 'fa-users', results['by_rep'], 'Sales Person'),
+        ],
+        'start': start,
+        'end': end,
+        'feedback_shown': FEEDBACK_SHOWN,
+    }
+
+
+@login_required
+@user_passes_test(is_admin)
+def territory_performance(request):
+    """Conversion and objections per territory (see zakcomapp.territories)"""
+    start, end = report_period(request.GET)
+    stats = territories.performance(start, end)
+    prospects_in = territories.prospect_counts()
+    for row in stats:
+        row['prospects'] = prospects_in.get(row['territory'], 0)
 
     context = {
-        'visits_with_feedback': visits_with_feedback,
-        'objections': objections,
-        'existing_providers': existing_providers,
+        'territory_stats': stats,
+        'unmatched': territories.unmatched(Visit, limit=10, visit_date__gte=start, visit_date__lte=end),
+        'start': start,
+        'end': end,
     }
-    return render(request, 'sales/feedback_analysis.html', context)
+    return render(request, 'sales/territory_performance.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+def sales_trend(request):
+    """
+    Sales, revenue or visits per day, week or month as JSON, for charts (see
+    zakcomapp.trends). Query parameters: ``metric``, ``granularity``,
+    ``start``, ``end``, ``by`` (rep, package, status or outcome), ``rep`` (a
+    user id) and ``compare=year`` for the same range a year earlier.
+    """
+    params = request.GET
+    metric = params.get('metric', 'sales')
+    granularity = params.get('granularity', 'day')
+    by = params.get('by') or None
+    rep = params.get('rep') or None
+    if granularity not in trends.GRANULARITIES:
+        return JsonResponse({'error': f"Unknown granularity {granularity!r}"}, status=400)
+    if rep is not None and not rep.isdigit():
+        return JsonResponse({'error': "rep must be a user id"}, status=400)
+    end = _parse_date(params.get('end')) or timezone.now().date()
+    start = _parse_date(params.get('start')) or trends.default_start(end, granularity)
+    compare = params.get('compare') == 'year'
+    try:
+        trends.validate(metric, granularity, start, end, by)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    def build():
+        result = {'current': trends.trend(metric, granularity, start, end, by, rep)}
+        if compare:
+            result['previous'] = trends.trend(
+                metric, granularity, trends.year_earlier(start), trends.year_earlier(end), by, rep,
+            )
+        return result
+
+    # Cached until the next sale or visit is written
+    name = f'trend:{metric}:{granularity}:{by}:{rep}:{start}:{end}:{compare}'
+    result = dashboard_cache.get_or_build(name, dashboard_cache.GLOBAL, timezone.now().date(), build)
+
+    def as_json(trend):
+        return {
+            'buckets': [day.isoformat() for day in trend['buckets']],
+            'series': [
+                {**line, 'values': [float(value) if metric == 'revenue' else value for value in line['values']]}
+                for line in trend['series']
+            ],
+        }
+
+    return JsonResponse({
+        'metric': metric,
+        'granularity': granularity,
+        'by': by,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        **{period: as_json(trend) for period, trend in result.items()},
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+def revenue_projection(request):
+    """
+    Recurring revenue, expiring revenue and renewals due for the coming
+    months (see zakcomapp.projections); ``?format=json`` for the curves as
+    JSON, ``?months=`` for a longer or shorter horizon.
+    """
+    today = timezone.now().date()
+    try:
+        months = int(request.GET.get('months', projections.HORIZON_MONTHS))
+    except ValueError:
+        months = projections.HORIZON_MONTHS
+    months = min(max(months, 1), projections.MAX_HORIZON_MONTHS)
+
+    # Contracts only change with sales, which bump the global version
+    projection = dashboard_cache.get_or_build(
+        f'revenue_projection:{months}', dashboard_cache.GLOBAL, today, lambda: projections.project(today, months),
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({**projection, 'months': [month.isoformat() for month in projection['months']]})
+
+    rows = list(zip(projection['months'], projection['mrr'], projection['expiring'], projection['renewals_due']))
+    context = {
+        'projection': projection,
+        'rows': rows,
+        'horizon': months,
+        'renewal_lead_months': projections.RENEWAL_LEAD_MONTHS,
+    }
+    return render(request, 'sales/revenue_projection.html', context)
+
+
+@login_required
+def search_view(request):
+    """Ranked full-text search over visits, prospects and customers (see zakcomapp.search)"""
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind', '')
+    if kind not in dict(SearchDocument.KIND_CHOICES):
+        kind = ''
+
+    results = None
+    if query:
+        documents = search.find(request.user, query, kinds=[kind] if kind else None)
+        results = Paginator(documents, 25).get_page(request.GET.get('page'))
+
+    context = {
+        'query': query,
+        'kind': kind,
+        'kind_choices': SearchDocument.KIND_CHOICES,
+        'results': results,
+    }
+    return render(request, 'sales/search.html', context)
 
 
 @login_required
@@ -717,4 +955,14 @@ def edit_profile(request):
     context = {
         'user': request.user,
     }
-    return render(request, 'sales/edit_profile.html', context)
\ No newline at end of file
+    return render(request, 'sales/edit_profile.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+def performance_stats(request):
+    """Per-view latency, SQL and template percentiles and dashboard cache hit rates for this process"""
+    return JsonResponse({
+        'views': samples.summary(),
+        'dashboard_cache': dashboard_cache.stats.summary(),
+    })